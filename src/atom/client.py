@@ -80,6 +80,24 @@ class AtomPubClient(object):
       The results of calling self.http_client.request. With the default
       http_client, this is an HTTP response object.
     """
+    http_request = self._prepare_request(method=method, uri=uri,
+        auth_token=auth_token, http_request=http_request, **kwargs)
+    # Perform the fully specified request using the http_client instance.
+    # Sends the request to the server and returns the server's response.
+    return self.http_client.request(http_request)
+
+  Request = request
+
+  def _prepare_request(self, method=None, uri=None, auth_token=None,
+                       http_request=None, **kwargs):
+    """Builds the complete HTTP request which request would send.
+
+    Takes the same arguments as request. Applies this client's settings, the
+    URI, any request modifying arguments and finally the auth token.
+
+    Returns:
+      An atom.http_core.HttpRequest which is ready to be sent.
+    """
     # Modify the request based on the AtomPubClient settings and parameters
     # passed in to the request.
     http_request = self.modify_request(http_request)
@@ -112,11 +130,7 @@ class AtomPubClient(object):
     if http_request.uri.host is None:
       raise MissingHost('No host provided in request %s %s' % (
           http_request.method, str(http_request.uri)))
-    # Perform the fully specified request using the http_client instance.
-    # Sends the request to the server and returns the server's response.
-    return self.http_client.request(http_request)
-
-  Request = request
+    return http_request
 
   def get(self, uri=None, auth_token=None, http_request=None, **kwargs):
     """Performs a request using the GET method, returns an HTTP response."""
@@ -37,11 +37,11 @@ __author__ = 'api.jscudder (Jeff Scudder)'
 
 import types
 import os
+import sys
 import httplib
 import atom.url
+import atom.instrumentation
 import atom.http_interface
-import socket
-import base64
 import atom.http_core
 ssl_imported = False
 ssl = None
@@ -68,6 +68,11 @@ class HttpClient(atom.http_interface.GenericHttpClient):
   # Added to allow old v1 HttpClient objects to use the new 
   # http_code.HttpClient. Used in unit tests to inject a mock client.
   v2_http_client = None
+  # Set to an atom.http_core.ConnectionPool to reuse keep-alive connections.
+  connection_pool = None
+  # Set to an object with a request_finished method, for example an
+  # atom.instrumentation.TimingCollector, to receive request timings.
+  observer = None
 
   def __init__(self, headers=None):
     self.debug = False
@@ -129,8 +134,48 @@ class HttpClient(atom.http_interface.GenericHttpClient):
         raise atom.http_interface.UnparsableUrlObject('Unable to parse url '
             'parameter because it was not a string or atom.url.Url')
     
-    connection = self._prepare_connection(url, all_headers)
-
+    timer = None
+    if self.observer is not None:
+      timer = atom.instrumentation.RequestTimer(self.observer, operation,
+                                                url.to_string(), url.host)
+
+    def open_connection():
+      if timer is not None:
+        return timer.open(lambda: self._prepare_connection(url, all_headers))
+      return self._prepare_connection(url, all_headers)
+
+    def send(connection):
+      if timer is not None:
+        return timer.send(connection, lambda c: self._send_request(
+            c, operation, url, all_headers, data))
+      return self._send_request(connection, operation, url, all_headers, data)
+
+    pool = self._get_pool(url)
+    key = None
+    if pool is not None:
+      key = self._get_pool_key(url)
+    if isinstance(data, list):
+      can_retry = atom.http_core._can_resend(data)
+    else:
+      can_retry = atom.http_core._can_resend([data])
+    try:
+      if key is None:
+        response = send(open_connection())
+      else:
+        response = pool.request(key, open_connection, send,
+                                can_retry=can_retry)
+    except Exception:
+      if timer is None:
+        raise
+      exc_info = sys.exc_info()
+      timer.failed(exc_info[1])
+      raise exc_info[0], exc_info[1], exc_info[2]
+    if timer is not None:
+      return timer.wrap_response(response)
+    return response
+
+  def _send_request(self, connection, operation, url, headers, data):
+    """Sends the request on the connection and returns the response."""
     if self.debug:
       connection.debuglevel = 1
 
@@ -158,8 +203,8 @@ class HttpClient(atom.http_interface.GenericHttpClient):
         pass
 
     # Send the HTTP headers.
-    for header_name in all_headers:
-      connection.putheader(header_name, all_headers[header_name])
+    for header_name in headers:
+      connection.putheader(header_name, headers[header_name])
     connection.endheaders()
 
     # If there is data, send it in the request.
@@ -172,7 +217,15 @@ class HttpClient(atom.http_interface.GenericHttpClient):
 
     # Return the HTTP Response from the server.
     return connection.getresponse()
-    
+
+  def _get_pool(self, url):
+    """Returns the atom.http_core.ConnectionPool for a request, or None."""
+    return self.connection_pool
+
+  def _get_pool_key(self, url):
+    """Returns the key for pooled connections to url's server, or None."""
+    return (url.protocol, url.host, url.port)
+
   def _prepare_connection(self, url, headers):
     if not isinstance(url, atom.url.Url):
       if isinstance(url, types.StringTypes):
@@ -204,63 +257,48 @@ class ProxiedHttpClient(HttpClient):
   'proxy-password' or 'proxy_password' variable.
   
   After connecting to the proxy server, the request is completed as in 
-  HttpClient.request.
+  HttpClient.request. HTTPS tunnels are kept open and reused for later
+  requests to the same host until they have been idle for
+  atom.http_core.DEFAULT_TUNNEL_IDLE_TIMEOUT seconds.
   """
+  tunnel_pool = None
+
+  def _get_pool(self, url):
+    if self.connection_pool is not None:
+      return self.connection_pool
+    if url.protocol == 'https' and os.environ.get('https_proxy'):
+      return atom.http_core._get_tunnel_pool(self)
+    return None
+
+  def _get_pool_key(self, url):
+    if url.protocol == 'https':
+      proxy = os.environ.get('https_proxy')
+      if proxy:
+        # Each tunnel leads to a single host.
+        return ('https', url.host, url.port, proxy)
+    elif os.environ.get('http_proxy'):
+      # The Proxy-Authorization header is added when the connection is made.
+      return None
+    return HttpClient._get_pool_key(self, url)
+
   def _prepare_connection(self, url, headers):
     proxy_auth = _get_proxy_auth()
     if url.protocol == 'https':
       # destination is https
       proxy = os.environ.get('https_proxy')
       if proxy:
-        # Set any proxy auth headers 
-        if proxy_auth:
-          proxy_auth = 'Proxy-authorization: %s' % proxy_auth
-          
-        # Construct the proxy connect command.
-        port = url.port
-        if not port:
-          port = '443'
-        proxy_connect = 'CONNECT %s:%s HTTP/1.0\r\n' % (url.host, port)
-        
-        # Set the user agent to send to the proxy
-        if headers and 'User-Agent' in headers:
-          user_agent = 'User-Agent: %s\r\n' % (headers['User-Agent'])
-        else:
-          user_agent = ''
-        
-        proxy_pieces = '%s%s%s\r\n' % (proxy_connect, proxy_auth, user_agent)
-        
         # Find the proxy host and port.
         proxy_url = atom.url.parse_url(proxy)
         if not proxy_url.port:
           proxy_url.port = '80'
-        
-        # Connect to the proxy server, very simple recv and error checking
-        p_sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
-        p_sock.connect((proxy_url.host, int(proxy_url.port)))
-        p_sock.sendall(proxy_pieces)
-        response = ''
-
-        # Wait for the full response.
-        while response.find("\r\n\r\n") == -1:
-          response += p_sock.recv(8192)
-       
-        p_status = response.split()[1]
-        if p_status != str(200):
-          raise ProxyError('Error status=%s' % str(p_status))
-
-        # Trivial setup for ssl socket.
-        sslobj = None
-        if ssl_imported:
-          sslobj = ssl.wrap_socket(p_sock, None, None)
-        else:
-          sock_ssl = socket.ssl(p_sock, None, None)
-          sslobj = httplib.FakeSocket(p_sock, sock_ssl)
- 
-        # Initalize httplib and replace with the proxy socket.
-        connection = httplib.HTTPConnection(proxy_url.host)
-        connection.sock = sslobj
-        return connection
+        user_agent = None
+        if headers:
+          user_agent = headers.get('User-Agent')
+        try:
+          return atom.http_core.open_tunnel(proxy_url.host, proxy_url.port,
+              url.host, url.port or '443', proxy_auth, user_agent)
+        except atom.http_core.ProxyError, e:
+          raise ProxyError(str(e))
       else:
         # The request was HTTPS, but there was no https_proxy set.
         return HttpClient._prepare_connection(self, url, headers)
@@ -285,18 +323,7 @@ class ProxiedHttpClient(HttpClient):
 
 
 def _get_proxy_auth():
-  proxy_username = os.environ.get('proxy-username')
-  if not proxy_username:
-    proxy_username = os.environ.get('proxy_username')
-  proxy_password = os.environ.get('proxy-password')
-  if not proxy_password:
-    proxy_password = os.environ.get('proxy_password')
-  if proxy_username:
-    user_auth = base64.encodestring('%s:%s' % (proxy_username,
-                                               proxy_password))
-    return 'Basic %s\r\n' % (user_auth.strip())
-  else:
-    return ''
+  return atom.http_core._get_proxy_auth()
 
 
 def _send_data_part(data, connection):
@@ -0,0 +1,638 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+# This module is used for version 2 of the Google Data APIs.
+
+
+"""Non-blocking HTTP requests driven by an asyncore event loop.
+
+The HttpClient in atom.http_core blocks the calling thread until the server
+responds. The AsyncHttpClient in this module instead returns immediately
+with an AsyncResult and performs the request as the event loop runs, so a
+single thread can keep a large number of requests in flight.
+
+  AsyncResult: The eventual outcome of a request which has not completed.
+  AsyncHttpClient: Sends atom.http_core.HttpRequest objects over pooled
+      keep-alive connections without blocking.
+
+Requests are not sent through a proxy and host names are resolved with a
+blocking lookup when a new connection is opened. HTTPS connections check
+the server's certificate and host name, which needs the ssl module of
+Python 2.7.9 or later; without it HTTPS requests fail.
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import asyncore
+import errno
+import socket
+import sys
+import time
+import atom.http_core
+ssl = None
+try:
+  import ssl
+except ImportError:
+  pass
+
+
+# Requests with these methods are sent again if a kept alive connection
+# closes before any response arrives. Other requests may already have been
+# acted on by the server, so they fail instead.
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class Error(Exception):
+  pass
+
+
+class ConnectionClosed(Error):
+  pass
+
+
+class Timeout(Error):
+  pass
+
+
+class AsyncResult(object):
+  """Holds the result of an operation which is performed by an event loop.
+
+  The interface follows the futures used by thread pools: callers can
+  register functions to be called when the operation is done, or call
+  result to run the event loop until the value is available.
+  """
+
+  def __init__(self, loop=None):
+    """Creates a pending result.
+
+    Args:
+      loop: An object with a loop_once method, usually an AsyncHttpClient,
+            which is run by result and exception while waiting.
+    """
+    self._loop = loop
+    self._done = False
+    self._value = None
+    self._exc_info = None
+    self._callbacks = []
+
+  def done(self):
+    return self._done
+
+  def set_result(self, value):
+    self._value = value
+    self._finish()
+
+  def set_exception(self, exc_info):
+    """Completes the operation with an error.
+
+    Args:
+      exc_info: The (type, value, traceback) tuple from sys.exc_info or an
+                exception instance.
+    """
+    if not isinstance(exc_info, tuple):
+      exc_info = (exc_info.__class__, exc_info, None)
+    self._exc_info = exc_info
+    self._finish()
+
+  def _finish(self):
+    self._done = True
+    callbacks = self._callbacks
+    self._callbacks = []
+    for callback in callbacks:
+      callback(self)
+
+  def add_done_callback(self, callback):
+    """Calls the function with this object once the operation is done."""
+    if self._done:
+      callback(self)
+    else:
+      self._callbacks.append(callback)
+
+  def _wait(self):
+    while not self._done:
+      self._loop.loop_once()
+
+  def exception(self):
+    self._wait()
+    if self._exc_info is not None:
+      return self._exc_info[1]
+    return None
+
+  def result(self):
+    """Runs the event loop until done and returns or raises the outcome."""
+    self._wait()
+    if self._exc_info is not None:
+      raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+    return self._value
+
+
+def chain(source, target, transform=None):
+  """Completes target when source is done, optionally transforming the value.
+
+  Exceptions raised by source, or by the transform function, are passed on
+  to target. If the transform returns another AsyncResult, target is
+  completed with the outcome of that operation instead.
+  """
+  def on_done(finished):
+    if finished._exc_info is not None:
+      target.set_exception(finished._exc_info)
+      return
+    if transform is None:
+      target.set_result(finished._value)
+      return
+    try:
+      value = transform(finished._value)
+    except Exception:
+      target.set_exception(sys.exc_info())
+      return
+    if isinstance(value, AsyncResult):
+      # The transform started another operation, finish when it does.
+      chain(value, target)
+    else:
+      target.set_result(value)
+  source.add_done_callback(on_done)
+  return target
+
+
+class AsyncHttpResponse(atom.http_core.HttpResponse):
+  """An HTTP response whose header lookups ignore case like httplib's."""
+
+  def getheader(self, name, default=None):
+    return self._headers.get(name.lower(), default)
+
+  def getheaders(self):
+    return self._header_list
+
+
+def _serialize_request(http_request):
+  """Converts the request line, headers and body into a single string."""
+  uri = http_request.uri
+  headers = http_request.headers.copy()
+  if 'Host' not in headers:
+    if uri.port is None or (uri.scheme == 'https' and int(uri.port) == 443) or (
+        uri.scheme != 'https' and int(uri.port) == 80):
+      headers['Host'] = uri.host
+    else:
+      headers['Host'] = '%s:%s' % (uri.host, uri.port)
+  body = []
+  for part in http_request._body_parts:
+    if isinstance(part, (str, unicode)):
+      body.append(part)
+    elif hasattr(part, 'read'):
+      body.append(part.read())
+    else:
+      body.append(str(part))
+  body = ''.join(body)
+  if body and 'Content-Length' not in headers:
+    headers['Content-Length'] = str(len(body))
+  lines = ['%s %s HTTP/1.1' % (http_request.method or 'GET',
+                               uri._get_relative_path())]
+  for name, value in headers.iteritems():
+    lines.append('%s: %s' % (name, value))
+  lines.append('')
+  lines.append('')
+  return '\r\n'.join(lines) + body
+
+
+def _is_want_error(error):
+  """Returns True if the SSL error only asks the caller to retry later."""
+  return (ssl is not None and isinstance(error, ssl.SSLError)
+          and error.args[0] in (ssl.SSL_ERROR_WANT_READ,
+                                ssl.SSL_ERROR_WANT_WRITE))
+
+
+class _HttpConnection(asyncore.dispatcher):
+  """A keep-alive connection to one server which sends one request at a time.
+  """
+
+  def __init__(self, client, key):
+    asyncore.dispatcher.__init__(self, map=client._socket_map)
+    self.client = client
+    self.key = key
+    self.reused = False
+    self._handshaking = False
+    self._connecting = True
+    self._pending = None
+    self._out = ''
+    self.last_activity = time.time()
+    scheme, host, port = key
+    self._ssl_context = None
+    if scheme == 'https':
+      self._ssl_context = client._get_ssl_context()
+    self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+      self.connect((host, port))
+    except socket.error:
+      self.close()
+      raise
+
+  def start(self, http_request, result):
+    self._pending = (http_request, result)
+    self._out = _serialize_request(http_request)
+    self._reset_parser()
+    self.last_activity = time.time()
+    if not self._connecting and not self._handshaking:
+      self._flush()
+
+  def _reset_parser(self):
+    self._in = ''
+    self._received = False
+    self._state = 'status'
+    self._status = None
+    self._reason = None
+    self._headers = {}
+    self._header_list = []
+    self._body = []
+    self._remaining = None
+    self._chunked = False
+    self._keep_alive = True
+
+  # asyncore callbacks.
+
+  def handle_connect(self):
+    self._connecting = False
+    if self._ssl_context is not None:
+      self.socket = self._ssl_context.wrap_socket(
+          self.socket, server_hostname=self.key[1],
+          do_handshake_on_connect=False)
+      self._handshaking = True
+      self._do_handshake()
+    else:
+      self._flush()
+
+  def readable(self):
+    return True
+
+  def writable(self):
+    return self._connecting or self._handshaking or bool(self._out)
+
+  def handle_write(self):
+    if self._handshaking:
+      self._do_handshake()
+    else:
+      self._flush()
+
+  def handle_read(self):
+    if self._handshaking:
+      self._do_handshake()
+      return
+    while True:
+      try:
+        data = self.socket.recv(self.client.read_size)
+      except socket.error, e:
+        if _is_want_error(e):
+          return
+        if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+          return
+        raise
+      if not data:
+        self._on_server_close()
+        return
+      self.last_activity = time.time()
+      self._received = True
+      self._in += data
+      self._parse()
+      # SSL sockets may have decrypted data waiting which select will not
+      # report.
+      if not (hasattr(self.socket, 'pending') and self.socket.pending()):
+        return
+
+  def handle_close(self):
+    self._on_server_close()
+
+  def handle_error(self):
+    exc_info = sys.exc_info()
+    self.close()
+    self.client._connection_failed(self, exc_info)
+
+  # Helpers.
+
+  def _do_handshake(self):
+    try:
+      self.socket.do_handshake()
+    except socket.error, e:
+      if _is_want_error(e):
+        return
+      raise
+    self._handshaking = False
+    self._flush()
+
+  def _flush(self):
+    if not self._out:
+      return
+    try:
+      sent = self.socket.send(self._out)
+    except socket.error, e:
+      if _is_want_error(e) or e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK):
+        return
+      raise
+    self._out = self._out[sent:]
+    self.last_activity = time.time()
+
+  def _on_server_close(self):
+    self.close()
+    if self._pending is None:
+      self.client._connection_closed(self)
+    elif self._state == 'body' and self._remaining is None and not self._chunked:
+      # The body is delimited by the server closing the connection.
+      self._keep_alive = False
+      self._complete()
+    else:
+      self.client._connection_failed(self, (ConnectionClosed,
+          ConnectionClosed('Server closed the connection before responding'),
+          None))
+
+  def _parse(self):
+    while True:
+      if self._state == 'status':
+        line = self._read_line()
+        if line is None:
+          return
+        parts = line.split(None, 2)
+        self._status = int(parts[1])
+        if len(parts) > 2:
+          self._reason = parts[2]
+        else:
+          self._reason = ''
+        if parts[0] == 'HTTP/1.0':
+          self._keep_alive = False
+        self._state = 'headers'
+      elif self._state == 'headers':
+        line = self._read_line()
+        if line is None:
+          return
+        if line:
+          name, value = line.split(':', 1)
+          value = value.strip()
+          self._header_list.append((name, value))
+          self._headers[name.lower()] = value
+          continue
+        if self._status == 100:
+          # Ignore the interim response and wait for the real one.
+          self._state = 'status'
+          self._headers = {}
+          self._header_list = []
+          continue
+        self._start_body()
+      elif self._state == 'body':
+        if self._chunked:
+          if not self._parse_chunk():
+            return
+        elif self._remaining is None:
+          self._body.append(self._in)
+          self._in = ''
+          return
+        else:
+          data = self._in[:self._remaining]
+          self._in = self._in[self._remaining:]
+          self._body.append(data)
+          self._remaining -= len(data)
+          if self._remaining == 0:
+            self._complete()
+          return
+      elif self._state == 'chunk_trailer':
+        line = self._read_line()
+        if line is None:
+          return
+        if not line:
+          self._complete()
+          return
+      else:
+        return
+
+  def _read_line(self):
+    index = self._in.find('\r\n')
+    if index < 0:
+      return None
+    line = self._in[:index]
+    self._in = self._in[index + 2:]
+    return line
+
+  def _start_body(self):
+    if self._headers.get('connection', '').lower() == 'close':
+      self._keep_alive = False
+    http_request = self._pending[0]
+    if (http_request.method == 'HEAD' or self._status in (204, 304)
+        or 100 <= self._status < 200):
+      self._complete()
+      return
+    self._state = 'body'
+    if 'chunked' in self._headers.get('transfer-encoding', '').lower():
+      self._chunked = True
+      self._remaining = None
+    elif 'content-length' in self._headers:
+      self._remaining = int(self._headers['content-length'])
+      if self._remaining == 0:
+        self._complete()
+    else:
+      self._keep_alive = False
+
+  def _parse_chunk(self):
+    """Consumes one chunk of a chunked body, returns False if incomplete."""
+    if self._remaining is None:
+      line = self._read_line()
+      if line is None:
+        return False
+      size = int(line.split(';', 1)[0], 16)
+      if size == 0:
+        self._state = 'chunk_trailer'
+        return True
+      self._remaining = size
+    if len(self._in) < self._remaining + 2:
+      return False
+    self._body.append(self._in[:self._remaining])
+    self._in = self._in[self._remaining + 2:]
+    self._remaining = None
+    return True
+
+  def _complete(self):
+    http_request, result = self._pending
+    response = AsyncHttpResponse(status=self._status, reason=self._reason,
+                                 headers=self._headers,
+                                 body=''.join(self._body))
+    response._header_list = self._header_list
+    self._pending = None
+    self._state = 'done'
+    if not self._keep_alive:
+      self.close()
+    self.client._request_finished(self, self._keep_alive)
+    result.set_result(response)
+
+
+class AsyncHttpClient(object):
+  """Performs many HTTP requests concurrently from a single thread.
+
+  Each call to request returns an AsyncResult immediately. Requests are sent
+  and responses are read whenever the event loop runs, either through
+  loop_once, run, or by calling result on one of the AsyncResult objects.
+  Connections are kept open after a response and reused for later requests
+  to the same scheme, host and port. At most max_connections_per_host are
+  opened to any one server, further requests wait in a queue.
+
+  The loop uses poll where it is available, so the number of open
+  connections is not limited by the size of a select file descriptor set.
+
+  HTTPS connections are made with ssl_context, which defaults to
+  ssl.create_default_context() and so checks the server's certificate and
+  host name. Set it to another ssl.SSLContext to trust other certificates.
+  """
+  max_connections_per_host = 10
+  timeout = 60
+  read_size = 65536
+  ssl_context = None
+
+  def __init__(self, max_connections_per_host=None, timeout=None):
+    if max_connections_per_host is not None:
+      self.max_connections_per_host = max_connections_per_host
+    if timeout is not None:
+      self.timeout = timeout
+    self._socket_map = {}
+    self._idle = {}
+    self._active = {}
+    self._waiting = {}
+    self._in_flight = 0
+
+  def request(self, http_request):
+    """Queues the request and returns an AsyncResult for the response.
+
+    The result's value is an AsyncHttpResponse whose body has been read in
+    full.
+    """
+    result = AsyncResult(self)
+    uri = http_request.uri
+    if isinstance(uri, (str, unicode)):
+      uri = atom.http_core.Uri.parse_uri(uri)
+      http_request.uri = uri
+    scheme = uri.scheme or 'http'
+    if uri.port:
+      port = int(uri.port)
+    elif scheme == 'https':
+      port = 443
+    else:
+      port = 80
+    key = (scheme, uri.host, port)
+    self._in_flight += 1
+    self._waiting.setdefault(key, []).append((http_request, result, False))
+    self._dispatch(key)
+    return result
+
+  Request = request
+
+  def pending(self):
+    """Returns the number of requests which have not yet completed."""
+    return self._in_flight
+
+  def loop_once(self, timeout=0.05):
+    """Runs one pass of the event loop and expires stalled requests."""
+    if self._socket_map:
+      asyncore.loop(timeout, hasattr(asyncore, 'poll2'), self._socket_map, 1)
+    else:
+      time.sleep(timeout)
+    self._expire()
+
+  def run(self):
+    """Runs the event loop until every queued request has completed."""
+    while self._in_flight:
+      self.loop_once()
+
+  def close(self):
+    """Closes all idle connections."""
+    for connections in self._idle.values():
+      for connection in connections:
+        connection.close()
+    self._idle = {}
+
+  def _get_ssl_context(self):
+    if self.ssl_context is None:
+      if ssl is None or not hasattr(ssl, 'create_default_context'):
+        raise Error('HTTPS needs the ssl module of Python 2.7.9 or later, '
+                    'which can verify certificates')
+      self.ssl_context = ssl.create_default_context()
+    return self.ssl_context
+
+  def _dispatch(self, key):
+    waiting = self._waiting.get(key)
+    while waiting:
+      idle = self._idle.get(key)
+      active = self._active.setdefault(key, [])
+      if idle:
+        connection = idle.pop()
+        connection.reused = True
+      elif len(active) < self.max_connections_per_host:
+        try:
+          connection = _HttpConnection(self, key)
+        except (socket.error, Error):
+          http_request, result, retried = waiting.pop(0)
+          self._in_flight -= 1
+          result.set_exception(sys.exc_info())
+          continue
+      else:
+        return
+      http_request, result, retried = waiting.pop(0)
+      connection.retried = retried
+      active.append(connection)
+      connection.start(http_request, result)
+
+  def _deactivate(self, connection):
+    active = self._active.get(connection.key, [])
+    if connection in active:
+      active.remove(connection)
+
+  def _request_finished(self, connection, keep_alive):
+    self._in_flight -= 1
+    self._deactivate(connection)
+    if keep_alive:
+      self._idle.setdefault(connection.key, []).append(connection)
+    self._dispatch(connection.key)
+
+  def _connection_closed(self, connection):
+    """Forgets an idle connection which the server has closed."""
+    idle = self._idle.get(connection.key, [])
+    if connection in idle:
+      idle.remove(connection)
+
+  def _connection_failed(self, connection, exc_info):
+    self._connection_closed(connection)
+    self._deactivate(connection)
+    pending = connection._pending
+    connection._pending = None
+    if pending is not None:
+      http_request, result = pending
+      if (connection.reused and not connection._received
+          and not connection.retried
+          and http_request.method in IDEMPOTENT_METHODS):
+        # The server closed a kept alive connection before it saw this
+        # request, so send it again on a new connection.
+        self._waiting.setdefault(connection.key, []).insert(
+            0, (http_request, result, True))
+      else:
+        self._in_flight -= 1
+        result.set_exception(exc_info)
+    self._dispatch(connection.key)
+
+  def _expire(self):
+    now = time.time()
+    for connections in self._active.values():
+      for connection in connections[:]:
+        if now - connection.last_activity > self.timeout:
+          connection.close()
+          connection.retried = True
+          self._connection_failed(connection, (Timeout,
+              Timeout('No response from %s within %s seconds' % (
+                  connection.key[1], self.timeout)), None))
@@ -23,10 +23,16 @@ __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
 import os
+import socket
 import StringIO
+import tempfile
+import threading
+import time
 import urlparse
 import urllib
 import httplib
+import sys
+import atom.instrumentation
 ssl = None
 try:
   import ssl
@@ -48,6 +54,13 @@ class ProxyError(Error):
 
 
 MIME_BOUNDARY = 'END_OF_PART'
+# Response bodies larger than this many bytes are spooled to a temporary file
+# instead of being held in memory.
+DEFAULT_SPOOL_SIZE = 1048576  # 1MB
+# The number of idle keep-alive connections a ConnectionPool keeps per host.
+DEFAULT_MAX_IDLE_PER_HOST = 10
+# Seconds a CONNECT tunnel through a proxy may be idle before it is closed.
+DEFAULT_TUNNEL_IDLE_TIMEOUT = 60
 
 
 def get_headers(http_response):
@@ -394,6 +407,112 @@ class HttpResponse(object):
       return self._body.read(amt)
 
 
+class SpooledBody(object):
+  """Stores an HTTP response body in memory until it becomes too large.
+
+  Behaves much like tempfile.SpooledTemporaryFile: bytes are written to a
+  StringIO buffer until more than max_size bytes have been stored, at which
+  point the contents are moved to an anonymous temporary file on disk. The
+  body can be read like a file or iterated over in chunks of chunk_size
+  bytes.
+  """
+  chunk_size = 65536
+
+  def __init__(self, max_size=DEFAULT_SPOOL_SIZE, chunk_size=None):
+    """Constructs an empty body.
+
+    Args:
+      max_size: int The largest number of bytes which will be kept in
+                memory. Writing past this limit moves the body to disk.
+      chunk_size: int (optional) The number of bytes returned by each step
+                  when iterating over the body.
+    """
+    self.max_size = max_size
+    if chunk_size is not None:
+      self.chunk_size = chunk_size
+    self.size = 0
+    self.rolled_over = False
+    self._file = StringIO.StringIO()
+
+  def write(self, data):
+    self._file.write(data)
+    position = self._file.tell()
+    if position > self.size:
+      self.size = position
+    if not self.rolled_over and self.size > self.max_size:
+      self.rollover()
+
+  def rollover(self):
+    """Moves the contents of the in memory buffer to a temporary file."""
+    if self.rolled_over:
+      return
+    position = self._file.tell()
+    disk_file = tempfile.TemporaryFile()
+    disk_file.write(self._file.getvalue())
+    disk_file.seek(position)
+    self._file.close()
+    self._file = disk_file
+    self.rolled_over = True
+
+  def read(self, amt=None):
+    if amt is None or amt < 0:
+      return self._file.read()
+    return self._file.read(amt)
+
+  def readline(self, limit=-1):
+    return self._file.readline(limit)
+
+  def seek(self, offset, whence=0):
+    self._file.seek(offset, whence)
+
+  def tell(self):
+    return self._file.tell()
+
+  def copy_to(self, file_handle):
+    """Writes the remaining contents of the body to a file-like object."""
+    for chunk in self:
+      file_handle.write(chunk)
+
+  def close(self):
+    self._file.close()
+
+  def __iter__(self):
+    return self
+
+  def next(self):
+    chunk = self._file.read(self.chunk_size)
+    if not chunk:
+      raise StopIteration
+    return chunk
+
+  def __len__(self):
+    return self.size
+
+
+def spool_response(http_response, max_size=DEFAULT_SPOOL_SIZE):
+  """Reads the body of an HTTP response into a SpooledBody.
+
+  The response is read one chunk at a time so that at most max_size bytes
+  of the body are ever held in memory.
+
+  Args:
+    http_response: An HTTP response object with a read method which accepts
+                   the number of bytes to read.
+    max_size: int The largest body which will be kept in memory.
+
+  Returns:
+    A SpooledBody containing the response body, positioned at the start.
+  """
+  body = SpooledBody(max_size)
+  while True:
+    data = http_response.read(body.chunk_size)
+    if not data:
+      break
+    body.write(data)
+  body.seek(0)
+  return body
+
+
 def _dump_response(http_response):
   """Converts to a string for printing debug messages.
   
@@ -411,9 +530,211 @@ def _dump_response(http_response):
   return output
 
 
+class ConnectionPool(object):
+  """Holds idle keep-alive connections so that later requests can reuse them.
+
+  Connections are grouped by a key, usually the scheme, host and port of the
+  server. A pool may be shared by several HttpClients and used from several
+  threads at once.
+
+  If idle_timeout is set, connections which have been idle for longer than
+  that many seconds are closed instead of being reused, since servers and
+  proxies drop idle connections after a while. They are closed whenever a
+  connection is taken from or returned to the pool, for any key, or when
+  close_idle is called.
+  """
+
+  def __init__(self, max_idle_per_host=DEFAULT_MAX_IDLE_PER_HOST,
+               idle_timeout=None):
+    self.max_idle_per_host = max_idle_per_host
+    self.idle_timeout = idle_timeout
+    self._idle = {}
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    """Removes and returns an idle connection for key, or None."""
+    expired = []
+    self._lock.acquire()
+    try:
+      expired = self._remove_expired()
+      connections = self._idle.get(key)
+      if connections:
+        return connections.pop()[0]
+      return None
+    finally:
+      self._lock.release()
+      for connection in expired:
+        connection.close()
+
+  def put(self, key, connection):
+    """Stores a connection whose last response has been read completely."""
+    self._lock.acquire()
+    try:
+      expired = self._remove_expired()
+      connections = self._idle.setdefault(key, [])
+      if len(connections) < self.max_idle_per_host:
+        connections.append((connection, time.time()))
+      else:
+        expired.append(connection)
+    finally:
+      self._lock.release()
+    for connection in expired:
+      connection.close()
+
+  def close_idle(self):
+    """Closes the connections which have been idle for too long."""
+    self._lock.acquire()
+    try:
+      expired = self._remove_expired()
+    finally:
+      self._lock.release()
+    for connection in expired:
+      connection.close()
+
+  def _remove_expired(self):
+    """Takes the expired connections out of the pool, with _lock held.
+
+    Returns:
+      A list of the connections, which the caller closes once the lock has
+      been released.
+    """
+    if self.idle_timeout is None:
+      return []
+    expired = []
+    oldest_allowed = self._oldest_allowed()
+    for key, connections in self._idle.items():
+      fresh = [pair for pair in connections if pair[1] >= oldest_allowed]
+      if len(fresh) == len(connections):
+        continue
+      expired.extend([pair[0] for pair in connections
+                      if pair[1] < oldest_allowed])
+      if fresh:
+        self._idle[key] = fresh
+      else:
+        del self._idle[key]
+    return expired
+
+  def clear(self):
+    """Closes all idle connections."""
+    self._lock.acquire()
+    try:
+      idle = self._idle
+      self._idle = {}
+    finally:
+      self._lock.release()
+    for connections in idle.itervalues():
+      for connection, released in connections:
+        connection.close()
+
+  def _oldest_allowed(self):
+    if self.idle_timeout is None:
+      return 0
+    return time.time() - self.idle_timeout
+
+  def request(self, key, open_connection, send, can_retry=True):
+    """Sends a request on a pooled connection, opening one if needed.
+
+    Args:
+      key: The pool key for the server receiving the request.
+      open_connection: function which takes no arguments and returns a new
+          connection to the server.
+      send: function which takes a connection, sends the request on it and
+          returns the httplib response.
+      can_retry: boolean If an idle connection turns out to have been closed
+          by the server, the request is sent again on a new connection only
+          if this is True. Pass False if the request body cannot be re-read.
+
+    Returns:
+      A response which returns the connection to this pool once it has been
+      read or closed.
+    """
+    connection = self.get(key)
+    if connection is not None:
+      try:
+        return _PooledResponse(send(connection), self, key, connection)
+      except (socket.error, httplib.HTTPException):
+        connection.close()
+        if not can_retry:
+          raise
+    connection = open_connection()
+    return _PooledResponse(send(connection), self, key, connection)
+
+  Get = get
+  Put = put
+  CloseIdle = close_idle
+  Clear = clear
+  Request = request
+
+
+class _PooledResponse(object):
+  """Wraps an httplib response to return its connection to the pool.
+
+  The connection is released once the body has been read to the end or the
+  response is closed, whichever happens first.
+  """
+
+  def __init__(self, response, pool, key, connection):
+    self._response = response
+    self._pool = pool
+    self._key = key
+    self._connection = connection
+    if response.isclosed():
+      self._release()
+
+  def __getattr__(self, name):
+    return getattr(self._response, name)
+
+  def read(self, amt=None):
+    if amt is None:
+      data = self._response.read()
+    else:
+      data = self._response.read(amt)
+    if self._response.isclosed():
+      self._release()
+    return data
+
+  def close(self):
+    if self._connection is not None and not self._response.isclosed():
+      # Unread body data is still on the socket, so the connection cannot be
+      # used for another request.
+      self._connection.close()
+      self._connection = None
+    self._response.close()
+    self._release()
+
+  def _release(self):
+    connection = self._connection
+    self._connection = None
+    if connection is None:
+      return
+    if self._response.will_close or connection.sock is None:
+      connection.close()
+    else:
+      self._pool.put(self._key, connection)
+
+
+def _can_resend(body_parts):
+  """Returns True if none of the body parts are files which were read."""
+  for part in body_parts or ():
+    if hasattr(part, 'read'):
+      return False
+  return True
+
+
 class HttpClient(object):
-  """Performs HTTP requests using httplib."""
+  """Performs HTTP requests using httplib.
+
+  If connection_pool is set to a ConnectionPool, connections are kept open
+  and reused for later requests to the same server once each response has
+  been read.
+
+  If observer is set, for example to an
+  atom.instrumentation.TimingCollector, its request_finished method is
+  called with the timings of each request.
+  """
   debug = None
+  connection_pool = None
+  observer = None
 
   def request(self, http_request):
     return self._http_request(http_request.method, http_request.uri,
@@ -442,6 +763,17 @@ class HttpClient(object):
         connection = httplib.HTTPConnection(uri.host, int(uri.port))
     return connection
 
+  def _get_pool(self, uri):
+    """Returns the ConnectionPool to use for a request to uri, or None."""
+    return self.connection_pool
+
+  def _get_pool_key(self, uri):
+    """Returns the key for pooled connections to uri's server, or None.
+
+    Requests for which this returns None always use a new connection.
+    """
+    return (uri.scheme, uri.host, uri.port)
+
   def _http_request(self, method, uri, headers=None, body_parts=None):
     """Makes an HTTP request using httplib.
 
@@ -457,8 +789,44 @@ class HttpClient(object):
     if isinstance(uri, (str, unicode)):
       uri = Uri.parse_uri(uri)
 
-    connection = self._get_connection(uri, headers=headers)
-
+    timer = None
+    if self.observer is not None:
+      timer = atom.instrumentation.RequestTimer(self.observer, method,
+                                                str(uri), uri.host)
+
+    def open_connection():
+      if timer is not None:
+        return timer.open(lambda: self._get_connection(uri, headers=headers))
+      return self._get_connection(uri, headers=headers)
+
+    def send(connection):
+      if timer is not None:
+        return timer.send(connection, lambda c: self._send_request(
+            c, method, uri, headers, body_parts))
+      return self._send_request(connection, method, uri, headers, body_parts)
+
+    pool = self._get_pool(uri)
+    key = None
+    if pool is not None:
+      key = self._get_pool_key(uri)
+    try:
+      if key is None:
+        response = send(open_connection())
+      else:
+        response = pool.request(key, open_connection, send,
+                                can_retry=_can_resend(body_parts))
+    except Exception:
+      if timer is None:
+        raise
+      exc_info = sys.exc_info()
+      timer.failed(exc_info[1])
+      raise exc_info[0], exc_info[1], exc_info[2]
+    if timer is not None:
+      return timer.wrap_response(response)
+    return response
+
+  def _send_request(self, connection, method, uri, headers, body_parts):
+    """Sends the request on the connection and returns the response."""
     if self.debug:
       connection.debuglevel = 1
 
@@ -518,80 +886,169 @@ def _send_data_part(data, connection):
 
 
 class ProxiedHttpClient(HttpClient):
+  """Performs HTTP requests through the proxy named in the environment.
+
+  The proxy URLs are read from the https_proxy and http_proxy environment
+  variables and the proxy credentials from proxy_username and
+  proxy_password. HTTPS requests are sent through a CONNECT tunnel. Tunnels
+  are kept open and reused for later requests to the same host, either in
+  connection_pool if one is set or in a pool belonging to this client, and
+  are closed after DEFAULT_TUNNEL_IDLE_TIMEOUT seconds without use. Expired
+  tunnels are closed the next time this client sends a request through a
+  tunnel; a client which stops making requests should call clear on its
+  tunnel_pool to close them.
+  """
+  tunnel_pool = None
 
-  def _get_connection(self, uri, headers=None):
-    # Check to see if there are proxy settings required for this request.
-    proxy = None
+  def _get_proxy(self, uri):
     if uri.scheme == 'https':
-      proxy = os.environ.get('https_proxy')
+      return os.environ.get('https_proxy')
     elif uri.scheme == 'http':
-      proxy = os.environ.get('http_proxy')
+      return os.environ.get('http_proxy')
+    return None
+
+  def _get_pool(self, uri):
+    if self.connection_pool is not None:
+      return self.connection_pool
+    if uri.scheme == 'https' and self._get_proxy(uri):
+      return _get_tunnel_pool(self)
+    return None
+
+  def _get_pool_key(self, uri):
+    proxy = self._get_proxy(uri)
     if not proxy:
-      return HttpClient._get_connection(self, uri, headers=headers)
-    # Now we have the URL of the appropriate proxy server.
-    # Get a username and password for the proxy if required.
-    proxy_auth = _get_proxy_auth()
+      return HttpClient._get_pool_key(self, uri)
     if uri.scheme == 'https':
-      import socket
-      if proxy_auth:
-        proxy_auth = 'Proxy-authorization: %s' % proxy_auth
-      # Construct the proxy connect command.
-      port = uri.port
-      if not port:
-        port = 443
-      proxy_connect = 'CONNECT %s:%s HTTP/1.0\r\n' % (uri.host, port)
-      # Set the user agent to send to the proxy
-      user_agent = ''
-      if headers and 'User-Agent' in headers:
-        user_agent = 'User-Agent: %s\r\n' % (headers['User-Agent'])
-      proxy_pieces = '%s%s%s\r\n' % (proxy_connect, proxy_auth, user_agent)
-      # Find the proxy host and port.
-      proxy_uri = Uri.parse_uri(proxy)
-      if not proxy_uri.port:
-        proxy_uri.port = '80'
-      # Connect to the proxy server, very simple recv and error checking
-      p_sock = socket.socket(socket.AF_INET,socket.SOCK_STREAM)
-      p_sock.connect((proxy_uri.host, int(proxy_uri.port)))
-      p_sock.sendall(proxy_pieces)
-      response = ''
-      # Wait for the full response.
-      while response.find("\r\n\r\n") == -1:
-        response += p_sock.recv(8192)
-      p_status = response.split()[1]
-      if p_status != str(200):
-        raise ProxyError('Error status=%s' % str(p_status))
-      # Trivial setup for ssl socket.
-      sslobj = None
-      if ssl is not None:
-        sslobj = ssl.wrap_socket(p_sock, None, None)
-      else:
-        sock_ssl = socket.ssl(p_sock, None, Nonesock_)
-        sslobj = httplib.FakeSocket(p_sock, sock_ssl)
-      # Initalize httplib and replace with the proxy socket.
-      connection = httplib.HTTPConnection(proxy_uri.host)
-      connection.sock = sslobj
-      return connection
-    elif uri.scheme == 'http':
-      proxy_uri = Uri.parse_uri(proxy)
-      if not proxy_uri.port:
-        proxy_uri.port = '80'
+      # Each tunnel leads to a single host.
+      return ('https', uri.host, uri.port, proxy)
+    # Plain HTTP requests to any host may share a connection to the proxy.
+    return ('http', proxy)
+
+  def _http_request(self, method, uri, headers=None, body_parts=None):
+    if isinstance(uri, (str, unicode)):
+      uri = Uri.parse_uri(uri)
+    if uri.scheme == 'http' and self._get_proxy(uri):
+      proxy_auth = _get_proxy_auth()
       if proxy_auth:
         headers['Proxy-Authorization'] = proxy_auth.strip()
-      return httplib.HTTPConnection(proxy_uri.host, int(proxy_uri.port))
-    return None
+    return HttpClient._http_request(self, method, uri, headers, body_parts)
+
+  def _get_connection(self, uri, headers=None):
+    # Check to see if there are proxy settings required for this request.
+    proxy = self._get_proxy(uri)
+    if not proxy:
+      return HttpClient._get_connection(self, uri, headers=headers)
+    # Now we have the URL of the appropriate proxy server.
+    proxy_uri = Uri.parse_uri(proxy)
+    if not proxy_uri.port:
+      proxy_uri.port = '80'
+    if uri.scheme == 'https':
+      user_agent = None
+      if headers:
+        user_agent = headers.get('User-Agent')
+      return open_tunnel(proxy_uri.host, proxy_uri.port, uri.host,
+                         uri.port or 443, _get_proxy_auth(), user_agent)
+    return httplib.HTTPConnection(proxy_uri.host, int(proxy_uri.port))
+
+
+def open_tunnel(proxy_host, proxy_port, host, port, proxy_auth='',
+                user_agent=None):
+  """Opens an SSL connection to host through a proxy using CONNECT.
+
+  Args:
+    proxy_host: str The proxy server's host name.
+    proxy_port: int or str The proxy server's port.
+    host: str The host at the other end of the tunnel.
+    port: int or str The port at the other end of the tunnel.
+    proxy_auth: str (optional) The Proxy-Authorization header value, as
+        returned by _get_proxy_auth.
+    user_agent: str (optional) The User-Agent to send to the proxy.
+
+  Returns:
+    An httplib.HTTPConnection whose socket is the SSL wrapped tunnel.
+
+  Raises:
+    ProxyError if the proxy refuses the tunnel.
+  """
+  proxy_pieces = 'CONNECT %s:%s HTTP/1.0\r\n' % (host, port)
+  if proxy_auth:
+    proxy_pieces += 'Proxy-authorization: %s' % proxy_auth
+  if user_agent:
+    proxy_pieces += 'User-Agent: %s\r\n' % user_agent
+  proxy_pieces += '\r\n'
+  # Connect to the proxy server, very simple recv and error checking
+  p_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+  p_sock.connect((proxy_host, int(proxy_port)))
+  p_sock.sendall(proxy_pieces)
+  response = ''
+  # Wait for the full response.
+  while response.find('\r\n\r\n') == -1:
+    data = p_sock.recv(8192)
+    if not data:
+      p_sock.close()
+      raise ProxyError('Proxy closed the connection')
+    response += data
+  p_status = response.split()[1]
+  if p_status != str(200):
+    p_sock.close()
+    raise ProxyError('Error status=%s' % str(p_status))
+  # Trivial setup for ssl socket.
+  sslobj = None
+  if ssl is not None:
+    sslobj = ssl.wrap_socket(p_sock, None, None)
+  else:
+    sock_ssl = socket.ssl(p_sock, None, None)
+    sslobj = httplib.FakeSocket(p_sock, sock_ssl)
+  # Initalize httplib and replace with the proxy socket.
+  connection = httplib.HTTPConnection(proxy_host)
+  connection.sock = sslobj
+  return connection
+
+
+# Guards the creation of tunnel pools, since several threads may share a
+# client.
+_tunnel_pool_lock = threading.Lock()
+
+
+def _get_tunnel_pool(client):
+  """Returns the client's tunnel_pool, creating it on first use."""
+  if client.tunnel_pool is None:
+    _tunnel_pool_lock.acquire()
+    try:
+      if client.tunnel_pool is None:
+        client.tunnel_pool = ConnectionPool(
+            idle_timeout=DEFAULT_TUNNEL_IDLE_TIMEOUT)
+    finally:
+      _tunnel_pool_lock.release()
+  return client.tunnel_pool
+
+
+# The username, password and Proxy-Authorization value from the last call
+# to _get_proxy_auth.
+_cached_proxy_auth = (None, None, '')
 
 
 def _get_proxy_auth():
-  import base64
-  proxy_username = os.environ.get('proxy-username')
+  """Returns the Proxy-Authorization value for the proxy credentials.
+
+  The credentials are looked up in the environment on each call, so that
+  changes to them take effect, but the value is only built again when they
+  have changed.
+  """
+  global _cached_proxy_auth
+  environ = os.environ
+  proxy_username = (environ.get('proxy-username') or
+                    environ.get('proxy_username'))
   if not proxy_username:
-    proxy_username = os.environ.get('proxy_username')
-  proxy_password = os.environ.get('proxy-password')
-  if not proxy_password:
-    proxy_password = os.environ.get('proxy_password')
-  if proxy_username:
-    user_auth = base64.b64encode('%s:%s' % (proxy_username,
-                                            proxy_password))
-    return 'Basic %s\r\n' % (user_auth.strip())
-  else:
     return ''
+  proxy_password = (environ.get('proxy-password') or
+                    environ.get('proxy_password'))
+  username, password, proxy_auth = _cached_proxy_auth
+  if username == proxy_username and password == proxy_password:
+    return proxy_auth
+  import base64
+  user_auth = base64.b64encode('%s:%s' % (proxy_username,
+                                          proxy_password))
+  proxy_auth = 'Basic %s\r\n' % (user_auth.strip())
+  _cached_proxy_auth = (proxy_username, proxy_password, proxy_auth)
+  return proxy_auth
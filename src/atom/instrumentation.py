@@ -0,0 +1,393 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Reports how long each phase of an HTTP request takes.
+
+Both atom.http_core.HttpClient and atom.http.HttpClient have an observer
+member which is None by default, in which case no timing is done at all. To
+see timings set it to an object with a request_finished method, such as a
+TimingCollector:
+
+  collector = atom.instrumentation.TimingCollector()
+  client.http_client.observer = collector
+  ...
+  print collector.to_json()
+
+The phases of a request are:
+  dns: resolving the server's host name.
+  connect: opening the TCP connection. For a connection through a proxy
+      tunnel this covers the whole tunnel setup.
+  tls: the SSL handshake.
+  send: sending the request line, headers and body.
+  wait: from the end of the request until the response headers arrive,
+      mostly the server's think time.
+  receive: reading the response body.
+The first three are missing when a pooled connection is reused.
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import httplib
+import socket
+import threading
+import time
+try:
+  import simplejson
+except ImportError:
+  try:
+    # Try to import from django, should work on App Engine
+    from django.utils import simplejson
+  except ImportError:
+    # Should work for Python2.6 and higher.
+    import json as simplejson
+
+
+PHASES = ('dns', 'connect', 'tls', 'send', 'wait', 'receive')
+
+
+class RequestTiming(object):
+  """What happened during one HTTP request.
+
+  Attributes:
+    method: str The HTTP method.
+    url: str The requested URL.
+    host: str The server's host name.
+    status: int The response status, None if no response was received.
+    reused: boolean True if the request was sent on a pooled connection.
+    bytes_sent: int The number of bytes in the request, including headers.
+    bytes_received: int The number of bytes of response body which were
+        read.
+    phases: dict mapping phase names from PHASES to the seconds spent in
+        each.
+    error: The exception which ended the request, or None.
+  """
+
+  def __init__(self, method, url, host):
+    self.method = method
+    self.url = url
+    self.host = host
+    self.status = None
+    self.reused = None
+    self.bytes_sent = 0
+    self.bytes_received = 0
+    self.phases = {}
+    self.error = None
+    self.start = time.time()
+    self.end = None
+
+  def _get_total(self):
+    if self.end is None:
+      return None
+    return self.end - self.start
+
+  total = property(_get_total)
+
+  def to_dict(self):
+    return {'method': self.method, 'url': self.url, 'host': self.host,
+            'status': self.status, 'reused': self.reused,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'phases': self.phases.copy(), 'total': self.total,
+            'error': self.error and repr(self.error)}
+
+  ToDict = to_dict
+
+
+class Observer(object):
+  """The interface for objects which receive request timings.
+
+  request_finished is called once per request, when the response body has
+  been read completely or the response is closed, or when the request fails.
+  It may be called from several threads at once.
+  """
+
+  def request_finished(self, timing):
+    pass
+
+  RequestFinished = request_finished
+
+
+class _Stats(object):
+
+  def __init__(self):
+    self.requests = 0
+    self.errors = 0
+    self.reused = 0
+    self.bytes_sent = 0
+    self.bytes_received = 0
+    self.statuses = {}
+    self.phases = {}
+
+  def add(self, timing):
+    self.requests += 1
+    if timing.error is not None:
+      self.errors += 1
+    if timing.reused:
+      self.reused += 1
+    self.bytes_sent += timing.bytes_sent
+    self.bytes_received += timing.bytes_received
+    if timing.status is not None:
+      status = str(timing.status)
+      self.statuses[status] = self.statuses.get(status, 0) + 1
+    phases = timing.phases.items()
+    if timing.total is not None:
+      phases.append(('total', timing.total))
+    for name, seconds in phases:
+      stats = self.phases.get(name)
+      if stats is None:
+        self.phases[name] = [1, seconds, seconds]
+      else:
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+
+  def to_dict(self):
+    phases = {}
+    for name, (count, total, longest) in self.phases.iteritems():
+      phases[name] = {'count': count, 'total': total, 'mean': total / count,
+                      'max': longest}
+    return {'requests': self.requests, 'errors': self.errors,
+            'reused_connections': self.reused,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'status': self.statuses.copy(), 'phases': phases}
+
+
+class TimingCollector(Observer):
+  """Aggregates request timings overall and per host.
+
+  If keep_timings is True, every RequestTiming is also kept in the timings
+  list.
+  """
+
+  def __init__(self, keep_timings=False):
+    self.keep_timings = keep_timings
+    self._lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    self._lock.acquire()
+    try:
+      self.timings = []
+      self._overall = _Stats()
+      self._hosts = {}
+    finally:
+      self._lock.release()
+
+  def request_finished(self, timing):
+    self._lock.acquire()
+    try:
+      self._overall.add(timing)
+      if timing.host not in self._hosts:
+        self._hosts[timing.host] = _Stats()
+      self._hosts[timing.host].add(timing)
+      if self.keep_timings:
+        self.timings.append(timing)
+    finally:
+      self._lock.release()
+
+  def to_dict(self):
+    """Returns the totals as a dict of numbers, strings, lists and dicts."""
+    self._lock.acquire()
+    try:
+      summary = self._overall.to_dict()
+      summary['hosts'] = {}
+      for host, stats in self._hosts.iteritems():
+        summary['hosts'][host] = stats.to_dict()
+      if self.keep_timings:
+        summary['timings'] = [timing.to_dict() for timing in self.timings]
+      return summary
+    finally:
+      self._lock.release()
+
+  def to_json(self, indent=None):
+    return simplejson.dumps(self.to_dict(), indent=indent, sort_keys=True)
+
+  def dump(self, file_handle, indent=None):
+    """Writes the totals to an open file as JSON."""
+    file_handle.write(self.to_json(indent=indent))
+
+  Reset = reset
+  RequestFinished = request_finished
+  ToDict = to_dict
+  ToJson = to_json
+  Dump = dump
+
+
+class _SendCounter(object):
+  """Replaces a connection's send method to count bytes and note the time."""
+
+  def __init__(self, send):
+    self._send = send
+    self.count = 0
+    self.last_send = None
+
+  def __call__(self, data):
+    result = self._send(data)
+    self.count += len(data)
+    self.last_send = time.time()
+    return result
+
+
+class RequestTimer(object):
+  """Times one request for an HTTP client and reports it to the observer.
+
+  The HTTP clients call open to create a connection, send to make the
+  request on it and wrap_response once the response headers have arrived,
+  or failed if an exception was raised.
+  """
+
+  def __init__(self, observer, method, url, host):
+    self.observer = observer
+    self.timing = RequestTiming(method, url, host)
+    self._finished = False
+
+  def open(self, open_connection):
+    """Calls open_connection and connects the result, timing each step."""
+    timing = self.timing
+    timing.reused = False
+    start = time.time()
+    connection = open_connection()
+    if connection.sock is not None:
+      # The connection was set up elsewhere, as for proxy tunnels.
+      timing.phases['connect'] = time.time() - start
+      return connection
+    _timed_connect(connection, timing)
+    return connection
+
+  def send(self, connection, send):
+    """Calls send(connection) and returns the response it returns."""
+    timing = self.timing
+    if timing.reused is None:
+      timing.reused = True
+    start = time.time()
+    counter = _SendCounter(connection.send)
+    connection.send = counter
+    try:
+      response = send(connection)
+    finally:
+      del connection.send
+    received = time.time()
+    sent = counter.last_send or received
+    timing.bytes_sent += counter.count
+    timing.phases['send'] = sent - start
+    timing.phases['wait'] = received - sent
+    timing.status = response.status
+    return response
+
+  def wrap_response(self, response):
+    return _TimedResponse(response, self)
+
+  def failed(self, error):
+    self.timing.error = error
+    self._finish()
+
+  def _finish(self):
+    if self._finished:
+      return
+    self._finished = True
+    self.timing.end = time.time()
+    self.observer.request_finished(self.timing)
+
+
+def _timed_connect(connection, timing):
+  """Connects an httplib connection, recording dns, connect and tls times.
+
+  The connection's own connect method is called, so a tunnel set with
+  set_tunnel, the source_address and the SSL context are used as they are
+  without an observer. The connection's _create_connection is replaced
+  during the call to time the host lookup and TCP connect separately. Time
+  spent setting up a tunnel counts as connect and the rest of an HTTPS
+  connect as tls. If the connection does not use _create_connection the
+  whole connect is recorded as connect.
+  """
+  create_connection = getattr(connection, '_create_connection', None)
+  if create_connection is not None:
+    def timed_create_connection(address, *args):
+      host, port = address
+      start = time.time()
+      addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+      resolved = time.time()
+      timing.phases['dns'] = resolved - start
+      error = socket.error('getaddrinfo returned no addresses')
+      for family, socktype, proto, canonname, sockaddr in addresses:
+        try:
+          sock = create_connection(sockaddr[:2], *args)
+        except socket.error, error:
+          continue
+        timing.phases['connect'] = time.time() - resolved
+        return sock
+      raise error
+    connection._create_connection = timed_create_connection
+  tunnel = None
+  if getattr(connection, '_tunnel_host', None):
+    tunnel = connection._tunnel
+    def timed_tunnel():
+      start = time.time()
+      tunnel()
+      timing.phases['connect'] = (timing.phases.get('connect', 0) +
+                                  time.time() - start)
+    connection._tunnel = timed_tunnel
+  start = time.time()
+  try:
+    connection.connect()
+  finally:
+    if create_connection is not None:
+      connection._create_connection = create_connection
+    if tunnel is not None:
+      del connection._tunnel
+  elapsed = time.time() - start
+  if 'dns' not in timing.phases:
+    timing.phases['connect'] = elapsed
+  elif isinstance(connection, httplib.HTTPSConnection):
+    timing.phases['tls'] = (elapsed - timing.phases['dns'] -
+                            timing.phases['connect'])
+
+
+class _TimedResponse(object):
+  """Wraps a response to time reading the body and report the request."""
+
+  def __init__(self, response, timer):
+    self._response = response
+    self._timer = timer
+    self._start = time.time()
+    if response.isclosed():
+      self._finish()
+
+  def __getattr__(self, name):
+    return getattr(self._response, name)
+
+  def read(self, amt=None):
+    if amt is None:
+      data = self._response.read()
+    else:
+      data = self._response.read(amt)
+    self._timer.timing.bytes_received += len(data)
+    if self._response.isclosed():
+      self._finish()
+    return data
+
+  def close(self):
+    self._response.close()
+    self._finish()
+
+  def _finish(self):
+    if not self._timer._finished:
+      self._timer.timing.phases['receive'] = time.time() - self._start
+      self._timer._finish()
@@ -44,6 +44,8 @@ class MockRequest(object):
 
 class MockResponse(atom.http_interface.HttpResponse):
   """Simulates an httplib.HTTPResponse object."""
+  _position = 0
+
   def __init__(self, body=None, status=None, reason=None, headers=None):
     if body and hasattr(body, 'read'):
       self.body = body.read()
@@ -56,8 +58,14 @@ class MockResponse(atom.http_interface.HttpResponse):
     self.reason = reason
     self._headers = headers or {}
 
-  def read(self):
-    return self.body
+  def read(self, amt=None):
+    # Reading the whole body is repeatable, partial reads advance through the
+    # stored string.
+    if amt is None or self.body is None:
+      return self.body
+    data = self.body[self._position:self._position + amt]
+    self._position += len(data)
+    return data
 
 
 class MockHttpClient(atom.http_interface.GenericHttpClient):
@@ -304,6 +304,7 @@ class SettableHttpClient(object):
 
 
 class MockHttpResponse(atom.http_core.HttpResponse):
+  _position = 0
 
   def __init__(self, status=None, reason=None, headers=None, body=None):
     self._headers = headers or {}
@@ -319,5 +320,11 @@ class MockHttpResponse(atom.http_core.HttpResponse):
       else:
         self._body = body
 
-  def read(self):
-    return self._body
+  def read(self, amt=None):
+    # Reading the whole body is repeatable, partial reads advance through the
+    # stored string.
+    if amt is None or self._body is None:
+      return self._body
+    data = self._body[self._position:self._position + amt]
+    self._position += len(data)
+    return data
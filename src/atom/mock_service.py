@@ -220,6 +220,7 @@ def _ConstructFullUrlBase(uri, host=None, ssl=False):
 
 class MockHttpResponse(object):
   """Returned from MockService crud methods as the server's response."""
+  _position = 0
 
   def __init__(self, body=None, status=None, reason=None, headers=None):
     """Construct a mock HTTPResponse and set members.
@@ -235,8 +236,14 @@ class MockHttpResponse(object):
     self.reason = reason
     self.headers = headers or {}
 
-  def read(self):
-    return self.body
+  def read(self, amt=None):
+    # Reading the whole body is repeatable, partial reads advance through the
+    # stored string.
+    if amt is None or self.body is None:
+      return self.body
+    data = self.body[self._position:self._position + amt]
+    self._position += len(data)
+    return data
 
   def getheader(self, header_name):
     return self.headers[header_name]
@@ -465,6 +465,92 @@ def GDataFeedFromString(xml_string):
   return atom.CreateClassFromXMLString(GDataFeed, xml_string)
 
 
+# The scheme of the category which identifies the kind of a feed or entry.
+KIND_SCHEME = 'http://schemas.google.com/g/2005#kind'
+
+
+class RootRegistry(object):
+  """Chooses the class for an XML document from its root element.
+
+  The document is parsed once, and the class is chosen by looking at the
+  root element's tag and at the term of its kind category, if it has one,
+  such as http://schemas.google.com/g/2005#event. A class registered for a
+  kind is preferred over a class registered for the tag alone.
+
+  A registry consults its parent for documents it has no class for, so a
+  service can add its own classes to the default ROOT_REGISTRY.
+  """
+
+  def __init__(self, parent=None):
+    self.parent = parent
+    self._classes = {}
+
+  def Register(self, target_class, kind=None):
+    """Uses target_class for roots with its tag and namespace.
+
+    Args:
+      target_class: class An atom.AtomBase subclass with _tag and _namespace
+          members.
+      kind: str (optional) The term of the kind category which the root
+          element must have. If None, target_class is used for any root with
+          its tag and namespace which no kind-specific class matches.
+    """
+    tag = '{%s}%s' % (target_class._namespace, target_class._tag)
+    self._classes[(tag, kind)] = target_class
+
+  def FindClass(self, tree):
+    """Returns the registered class for an ElementTree root, or None."""
+    keys = []
+    for category in tree.findall('{%s}category' % atom.ATOM_NAMESPACE):
+      if category.get('scheme') == KIND_SCHEME:
+        keys.append((tree.tag, category.get('term')))
+    keys.append((tree.tag, None))
+    for key in keys:
+      registry = self
+      while registry is not None:
+        if key in registry._classes:
+          return registry._classes[key]
+        registry = registry.parent
+    return None
+
+  def Parse(self, xml_string, string_encoding=None):
+    """Creates an instance of the class registered for the document's root.
+
+    Args:
+      xml_string: str A string which contains valid XML.
+      string_encoding: str (optional) The encoding to convert a unicode
+          xml_string to, defaults to atom.XML_STRING_ENCODING.
+
+    Returns:
+      An instance of the registered class, or None if no class is registered
+      for the root element.
+    """
+    encoding = string_encoding or atom.XML_STRING_ENCODING
+    if encoding and isinstance(xml_string, unicode):
+      xml_string = xml_string.encode(encoding)
+    tree = ElementTree.fromstring(xml_string)
+    target_class = self.FindClass(tree)
+    if target_class is None:
+      return None
+    target = target_class()
+    target._HarvestElementTree(tree)
+    return target
+
+
+ROOT_REGISTRY = RootRegistry()
+ROOT_REGISTRY.Register(GDataFeed)
+ROOT_REGISTRY.Register(GDataEntry)
+
+
+def GDataFromString(xml_string):
+  """Creates a GDataFeed or GDataEntry, whichever the XML contains.
+
+  Returns:
+    The GDataFeed or GDataEntry, or None if the root element is neither.
+  """
+  return ROOT_REGISTRY.Parse(xml_string)
+
+
 class BatchId(atom.AtomBase):
   _tag = 'id'
   _namespace = BATCH_NAMESPACE
@@ -0,0 +1,118 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Crawls a paged Apps feed in parallel by splitting its keys into ranges.
+
+The provisioning and groups feeds list their entries in order of a key,
+such as the user name, and each page begins at a start parameter which is
+carried in the next link of the page before. Following the next links
+means waiting for every page before asking for the one after it.
+
+A RangeCrawler instead splits the keys into ranges at a list of boundary
+keys, starts a crawl at the first key of each range, and stops each crawl
+when it reaches the start of the next range. The ranges are crawled at the
+same time and their entries are merged in order. An entry which is found
+in more than one range, which happens if the server orders keys a little
+differently than Python does, is only returned once.
+
+  RangeCrawler: crawls the ranges of one feed on a pool of threads.
+  MakeRanges: turns a list of boundary keys into (low, high) ranges.
+"""
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import gdata.executor
+
+
+# Ranges which begin at each digit and letter. The first range also holds
+# the keys before '1', such as those beginning with '0', '-' or '_'.
+DEFAULT_BOUNDARIES = tuple('123456789abcdefghijklmnopqrstuvwxyz')
+
+DEFAULT_MAX_WORKERS = gdata.executor.DEFAULT_MAX_WORKERS
+
+
+def MakeRanges(boundaries):
+  """Returns the (low, high) key ranges which the boundaries divide.
+
+  The ranges cover every key: the low of the first range and the high of
+  the last are None, meaning unbounded.
+  """
+  boundaries = sorted(set(boundaries))
+  return zip([None] + boundaries, boundaries + [None])
+
+
+class RangeCrawler(object):
+  """Crawls the entries of a paged feed, one range of keys per thread.
+
+  Args:
+    first_page: A function which takes a start key, or None for the start
+        of the feed, and returns the page of the feed beginning there.
+    next_page: A function which takes the href of a next link and returns
+        that page.
+    key: A function which returns the key of an entry, by which the feed
+        is ordered.
+    boundaries: The keys, in lower case, at which ranges begin.
+    max_workers: int The most ranges to crawl at the same time.
+  """
+
+  def __init__(self, first_page, next_page, key,
+               boundaries=DEFAULT_BOUNDARIES, max_workers=DEFAULT_MAX_WORKERS):
+    self.first_page = first_page
+    self.next_page = next_page
+    self.key = key
+    self.boundaries = boundaries
+    self.max_workers = max_workers
+
+  def CrawlRange(self, low, high):
+    """Returns the entries from the page at low up to the key high.
+
+    Keys are compared with high without regard to case. If high is None
+    every page up to the end of the feed is read.
+    """
+    entries = []
+    feed = self.first_page(low)
+    while True:
+      for entry in feed.entry:
+        if high is not None and self.key(entry).lower() >= high:
+          return entries
+        entries.append(entry)
+      next = feed.GetNextLink()
+      if next is None:
+        return entries
+      feed = self.next_page(next.href)
+
+  def _CrawlRange(self, key_range):
+    return self.CrawlRange(*key_range)
+
+  def Crawl(self):
+    """Yields every entry in the feed once, in order of range.
+
+    The entries of a range are yielded once it has been crawled, while
+    later ranges are still being crawled. If crawling a range raises an
+    exception, it is raised here when that range's turn comes.
+    """
+    pool = gdata.executor.ThreadPool(self.max_workers)
+    seen = set()
+    try:
+      for result in pool.map(self._CrawlRange, MakeRanges(self.boundaries)):
+        for entry in result.get():
+          key = self.key(entry)
+          if key not in seen:
+            seen.add(key)
+            yield entry
+    finally:
+      pool.shutdown()
@@ -0,0 +1,410 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Applies email settings to many users at once.
+
+  Setting: an EmailSettingsService call, such as UpdateSignature, to make
+      for a user.
+  BulkUpdater: applies (username, Setting) pairs on a pool of threads.
+  Journal: a file listing the changes which have been applied, so that a
+      run which is repeated skips them.
+  Progress: counts of the changes made so far, which may be read while the
+      changes are being applied.
+
+For example, to set everyone's signature and give them a label:
+
+  updater = gdata.apps.emailsettings.bulk.BulkUpdater(
+      service, max_workers=16, journal_path='rollout.journal')
+  signature = Setting('UpdateSignature', signature='Example Corp.')
+  label = Setting('CreateLabel', label='Announcements')
+  changes = [(user, setting) for user in users
+             for setting in (signature, label)]
+  for result in updater.Run(changes):
+    if not result.Succeeded():
+      print result.username, result.error
+
+The workers share the service, its keep-alive connections and its
+gdata.throttle.Throttler, which lowers the number of requests in flight
+when the server shows signs of overload. Requests refused because of
+overload are retried with exponential backoff. Creating something which
+already exists, such as a label, counts as applied so that a repeated run
+does not fail where an earlier one succeeded.
+"""
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import sys
+import threading
+import time
+import urllib
+import atom.http_core
+import gdata.apps.emailsettings.service
+import gdata.apps.service
+import gdata.executor
+import gdata.service
+import gdata.throttle
+
+
+DEFAULT_MAX_WORKERS = gdata.executor.DEFAULT_MAX_WORKERS
+
+# The statuses of a ChangeResult.
+APPLIED = 'applied'
+EXISTED = 'existed'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+class Setting(object):
+  """A call to an EmailSettingsService method for one user.
+
+  Args:
+    method_name: str The name of the method, such as 'UpdateSignature'.
+    **kwargs: The arguments to pass to the method after the username.
+  """
+
+  def __init__(self, method_name, **kwargs):
+    if not (method_name[:1].isupper() and hasattr(
+        gdata.apps.emailsettings.service.EmailSettingsService, method_name)):
+      raise ValueError('EmailSettingsService has no method %s' % method_name)
+    self.method_name = method_name
+    self.kwargs = kwargs
+
+  def _GetKey(self):
+    return '%s(%s)' % (self.method_name, ', '.join(
+        ['%s=%r' % item for item in sorted(self.kwargs.items())]))
+
+  key = property(_GetKey,
+                 doc='A string which identifies the method and arguments.')
+
+  def Apply(self, service, username):
+    return getattr(service, self.method_name)(username, **self.kwargs)
+
+  def __repr__(self):
+    return 'Setting(%s)' % self.key
+
+
+class ChangeResult(object):
+  """The outcome of applying a Setting to a user.
+
+  Attributes:
+    index: int The position of the change in the changes which were given.
+    username: The user.
+    setting: The Setting.
+    status: One of APPLIED, EXISTED (the thing to be created already
+        existed), SKIPPED (the journal shows it was applied by an earlier
+        run) or FAILED.
+    value: The dict returned by the EmailSettingsService method, if it was
+        applied.
+    attempts: int The number of requests which were made.
+    exc_info: The (type, value, traceback) of the error, if it failed.
+  """
+
+  def __init__(self, index, username, setting):
+    self.index = index
+    self.username = username
+    self.setting = setting
+    self.status = None
+    self.value = None
+    self.attempts = 0
+    self.exc_info = None
+
+  def _GetError(self):
+    if self.exc_info is None:
+      return None
+    return self.exc_info[1]
+
+  error = property(_GetError)
+
+  def Succeeded(self):
+    return self.status != FAILED
+
+
+class Journal(object):
+  """Records which settings have been applied to which users.
+
+  Each applied change is appended to the file as a line, so the journal of
+  an interrupted run is complete up to the last change it made.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._done = set()
+    self._lock = threading.Lock()
+    try:
+      journal_file = open(path, 'r')
+    except IOError:
+      journal_file = None
+    if journal_file is not None:
+      try:
+        for line in journal_file:
+          fields = line.rstrip('\n').split('\t')
+          if len(fields) == 2:
+            self._done.add(tuple([urllib.unquote(field) for field in fields]))
+      finally:
+        journal_file.close()
+    self._file = open(path, 'a')
+
+  def Contains(self, username, setting):
+    self._lock.acquire()
+    try:
+      return (username, setting.key) in self._done
+    finally:
+      self._lock.release()
+
+  def Record(self, username, setting):
+    self._lock.acquire()
+    try:
+      self._done.add((username, setting.key))
+      self._file.write('%s\t%s\n' % (urllib.quote(username),
+                                     urllib.quote(setting.key)))
+      self._file.flush()
+    finally:
+      self._lock.release()
+
+  def Close(self):
+    self._file.close()
+
+
+class Progress(object):
+  """Counts the changes which a BulkUpdater has finished.
+
+  Attributes:
+    total: int The number of changes to make, if known, otherwise None.
+    done: int The changes which have finished, in any way.
+    applied, existed, skipped, failed: int The changes with each status.
+    retries: int The requests which were repeated after overload.
+    started: float The time at which the run began.
+  """
+
+  _time = staticmethod(time.time)
+
+  def __init__(self, total=None):
+    self.total = total
+    self.done = 0
+    self.applied = 0
+    self.existed = 0
+    self.skipped = 0
+    self.failed = 0
+    self.retries = 0
+    self.started = self._time()
+    self._lock = threading.Lock()
+
+  def _Add(self, result):
+    self._lock.acquire()
+    try:
+      self.done += 1
+      setattr(self, result.status, getattr(self, result.status) + 1)
+      self.retries += max(0, result.attempts - 1)
+    finally:
+      self._lock.release()
+
+  def Elapsed(self):
+    return self._time() - self.started
+
+  def Rate(self):
+    """Returns the number of changes finished per second so far."""
+    elapsed = self.Elapsed()
+    if elapsed <= 0:
+      return 0.0
+    return self.done / elapsed
+
+  def ToDict(self):
+    self._lock.acquire()
+    try:
+      return {'total': self.total, 'done': self.done,
+              'applied': self.applied, 'existed': self.existed,
+              'skipped': self.skipped, 'failed': self.failed,
+              'retries': self.retries, 'elapsed': self.Elapsed()}
+    finally:
+      self._lock.release()
+
+  def __str__(self):
+    counts = self.ToDict()
+    total = counts['total']
+    if total is None:
+      total = '?'
+    return ('%s/%s done: %i applied, %i existed, %i skipped, %i failed, '
+            '%i retries in %.1fs' % (
+                counts['done'], total, counts['applied'], counts['existed'],
+                counts['skipped'], counts['failed'], counts['retries'],
+                counts['elapsed']))
+
+
+def _IsOverload(error):
+  if not isinstance(error, gdata.apps.service.AppsForYourDomainException):
+    return False
+  response = error.args[0]
+  return (isinstance(response, dict) and
+          response.get('status') in gdata.throttle.DEFAULT_OVERLOAD_STATUSES)
+
+
+class BulkUpdater(object):
+  """Applies email settings to many users using a pool of threads.
+
+  If the service has no connection pool or throttler, then for the length
+  of each run it is given a connection pool which keeps up to max_workers
+  connections to each host and a Throttler which starts at max_workers
+  requests in flight and halves that each time the server is overloaded.
+  Both are removed from the service when the run ends.
+
+  Args:
+    service: A gdata.apps.emailsettings.service.EmailSettingsService which
+        is logged in as a domain administrator.
+    max_workers: int The most changes to apply at the same time.
+    journal_path: str (optional) The file in which to record the changes
+        which are applied. Changes which it lists are skipped. It is opened
+        by each run and closed when the run ends.
+    rate: float (optional) The most requests per second, used if the
+        service has no throttler.
+    num_retries: int How many times to retry a request refused because
+        of overload.
+    delay: float The seconds to wait before the first retry.
+    backoff: float The factor by which the wait grows for each retry.
+    on_result: (optional) A function called with each ChangeResult and the
+        Progress as each change finishes, from the worker threads.
+  """
+
+  _sleep = staticmethod(time.sleep)
+
+  def __init__(self, service, max_workers=DEFAULT_MAX_WORKERS,
+               journal_path=None, rate=None,
+               num_retries=gdata.service.DEFAULT_NUM_RETRIES,
+               delay=gdata.service.DEFAULT_DELAY,
+               backoff=gdata.service.DEFAULT_BACKOFF, on_result=None):
+    self.service = service
+    self.max_workers = max_workers
+    self.journal_path = journal_path
+    # The Journal of the run in progress, if there is a journal_path.
+    self.journal = None
+    self.rate = rate
+    self.num_retries = num_retries
+    self.delay = delay
+    self.backoff = backoff
+    self.on_result = on_result
+    self.progress = None
+
+  def Apply(self, changes):
+    """Applies the changes, yielding a ChangeResult as each finishes.
+
+    Args:
+      changes: An iterable of (username, Setting) pairs. It may be a
+          generator; pairs are taken from it as workers become free.
+
+    Yields:
+      A ChangeResult for each change, in the order they finish. The
+      progress member is updated before each is yielded. The journal is
+      closed once every change has finished, or once the generator is
+      closed.
+    """
+    total = None
+    if hasattr(changes, '__len__'):
+      total = len(changes)
+    self.progress = Progress(total)
+    journal = None
+    if self.journal_path is not None:
+      journal = Journal(self.journal_path)
+    self.journal = journal
+    connection_pool, throttler = self._InstallPoolAndThrottler()
+    pool = gdata.executor.ThreadPool(self.max_workers)
+    def ApplyChange(indexed_change):
+      return self._ApplyChange(indexed_change, journal)
+    try:
+      for outcome in pool.Map(ApplyChange, enumerate(changes),
+                              ordered=False):
+        yield outcome.Get()
+    finally:
+      # Changes already started are finished, and journaled, before the
+      # journal is closed.
+      pool.Shutdown(wait=True)
+      self._RemovePoolAndThrottler(connection_pool, throttler)
+      self.journal = None
+      if journal is not None:
+        journal.Close()
+
+  def Run(self, changes):
+    """Applies the changes and returns their ChangeResults in order."""
+    results = list(self.Apply(changes))
+    results.sort(key=lambda result: result.index)
+    return results
+
+  def _InstallPoolAndThrottler(self):
+    """Gives the service a pool and throttler for a run if it has none.
+
+    Returns:
+      The (connection_pool, throttler) which were installed, None for each
+      which the service already had.
+    """
+    http_client = self.service.http_client
+    connection_pool = None
+    if getattr(http_client, 'connection_pool', False) is None:
+      connection_pool = atom.http_core.ConnectionPool(
+          max_idle_per_host=self.max_workers)
+      http_client.connection_pool = connection_pool
+    throttler = None
+    if self.service.throttler is None:
+      throttler = gdata.throttle.Throttler(default={
+          'rate': self.rate, 'initial_concurrency': self.max_workers,
+          'max_concurrency': self.max_workers})
+      self.service.throttler = throttler
+    return connection_pool, throttler
+
+  def _RemovePoolAndThrottler(self, connection_pool, throttler):
+    """Undoes _InstallPoolAndThrottler and closes the pool's connections."""
+    if connection_pool is not None:
+      http_client = self.service.http_client
+      if http_client.connection_pool is connection_pool:
+        http_client.connection_pool = None
+      connection_pool.clear()
+    if throttler is not None and self.service.throttler is throttler:
+      self.service.throttler = None
+
+  def _ApplyChange(self, indexed_change, journal):
+    index, (username, setting) = indexed_change
+    result = ChangeResult(index, username, setting)
+    if journal is not None and journal.Contains(username, setting):
+      result.status = SKIPPED
+    else:
+      self._ApplyWithRetries(result)
+      if result.status != FAILED and journal is not None:
+        journal.Record(username, setting)
+    self.progress._Add(result)
+    if self.on_result is not None:
+      self.on_result(result, self.progress)
+    return result
+
+  def _ApplyWithRetries(self, result):
+    delay = self.delay
+    while True:
+      result.attempts += 1
+      try:
+        result.value = result.setting.Apply(self.service, result.username)
+        result.status = APPLIED
+        return
+      except gdata.apps.service.AppsForYourDomainException, e:
+        if e.error_code == gdata.apps.service.ENTITY_EXISTS:
+          result.status = EXISTED
+          return
+        if not _IsOverload(e) or result.attempts > self.num_retries:
+          result.status = FAILED
+          result.exc_info = sys.exc_info()
+          return
+      except Exception:
+        result.status = FAILED
+        result.exc_info = sys.exc_info()
+        return
+      self._sleep(delay)
+      delay *= self.backoff
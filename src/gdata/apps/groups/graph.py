@@ -0,0 +1,259 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Answers group membership questions from a local copy of a domain's groups.
+
+  MembershipGraph: the members of every group in a domain, indexed by group
+      and by member, with the nested memberships of each worked out once
+      and remembered.
+
+Asking a GroupsService whether someone is in a group, or which groups they
+are in, costs a request each time, and following nested groups costs one
+for each level. A MembershipGraph reads the members of every group once,
+with several groups read at a time, and then answers from memory:
+
+  graph = gdata.apps.groups.graph.MembershipGraph(service)
+  graph.Load()
+  if graph.IsMember('liz@example.com', 'staff@example.com'):
+    ...
+  graph.GetAllGroups('liz@example.com')   # Includes groups within groups.
+  graph.RefreshGroup('staff@example.com') # After its members change.
+
+Ids are compared without regard to case and are returned in lower case. A
+member is taken to be a group if it is the id of a group in the graph.
+"""
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import threading
+import gdata.apps.service
+import gdata.executor
+
+
+DEFAULT_MAX_WORKERS = gdata.executor.DEFAULT_MAX_WORKERS
+
+_EMPTY = frozenset()
+
+
+class MembershipGraph(object):
+  """The direct and nested members of each group in a domain.
+
+  The graph may be queried from several threads while it is refreshed.
+
+  Args:
+    service: gdata.apps.groups.service.GroupsService (optional) The service
+        to read groups and members from. Without one, the graph is built
+        with SetMembers.
+    suspended_users: bool Whether to include suspended users as members.
+    max_workers: int The most groups to read members of at the same time.
+  """
+
+  def __init__(self, service=None, suspended_users=False,
+               max_workers=DEFAULT_MAX_WORKERS):
+    self.service = service
+    self.suspended_users = suspended_users
+    self.max_workers = max_workers
+    # Maps each group id to the frozenset of its direct members.
+    self._members = {}
+    # Maps each member id to the set of groups it is directly in.
+    self._groups = {}
+    # Remember the nested members and groups of ids which were asked about,
+    # keyed by (group_id, include_groups) and by member_id.
+    self._all_members = {}
+    self._all_groups = {}
+    self._lock = threading.Lock()
+
+  def Load(self):
+    """Reads every group and its members, replacing what the graph held."""
+    group_ids = [group['groupId'] for group in self.service.RetrieveAllGroups()]
+    pool = gdata.executor.ThreadPool(self.max_workers)
+    try:
+      members = {}
+      for result in pool.Map(self._RetrieveMemberIds, group_ids):
+        members[result.item] = result.Get()
+    finally:
+      pool.Shutdown()
+    self._lock.acquire()
+    try:
+      self._members = {}
+      self._groups = {}
+      self._all_members = {}
+      self._all_groups = {}
+      for group_id, member_ids in members.iteritems():
+        self._SetMembers(group_id.lower(), member_ids)
+    finally:
+      self._lock.release()
+
+  def _RetrieveMemberIds(self, group_id):
+    return [member['memberId'] for member in self.service.RetrieveAllMembers(
+        group_id, suspended_users=self.suspended_users)]
+
+  def RefreshGroup(self, group_id):
+    """Reads the members of one group again.
+
+    If the group no longer exists, it is removed from the graph.
+    """
+    try:
+      member_ids = self._RetrieveMemberIds(group_id)
+    except gdata.apps.service.AppsForYourDomainException, e:
+      if e.error_code != gdata.apps.service.ENTITY_DOES_NOT_EXIST:
+        raise
+      self.RemoveGroup(group_id)
+    else:
+      self.SetMembers(group_id, member_ids)
+
+  def SetMembers(self, group_id, member_ids):
+    """Replaces the direct members of a group, adding the group if needed."""
+    self._lock.acquire()
+    try:
+      self._SetMembers(group_id.lower(), member_ids)
+    finally:
+      self._lock.release()
+
+  def RemoveGroup(self, group_id):
+    """Removes a group, its members and its place in other groups."""
+    self._lock.acquire()
+    try:
+      self._SetMembers(group_id.lower(), None)
+    finally:
+      self._lock.release()
+
+  def _SetMembers(self, group_id, member_ids):
+    """Replaces or, if member_ids is None, removes a group's members."""
+    old = self._members.get(group_id, _EMPTY)
+    if member_ids is None:
+      new = _EMPTY
+    else:
+      new = frozenset([member_id.lower() for member_id in member_ids])
+    # The nested members change for the group and every group it is in,
+    # and the nested groups change for everything below it, before or after.
+    stale_groups = self._Reachable(group_id, self._groups)
+    stale_groups.add(group_id)
+    stale_members = self._Reachable(group_id, self._members)
+    stale_members.add(group_id)
+    for member_id in old - new:
+      groups = self._groups[member_id]
+      groups.discard(group_id)
+      if not groups:
+        del self._groups[member_id]
+    for member_id in new - old:
+      self._groups.setdefault(member_id, set()).add(group_id)
+    if member_ids is None:
+      self._members.pop(group_id, None)
+      # A removed group is no longer a member of the groups it was in.
+      removed = frozenset([group_id])
+      for parent_id in self._groups.pop(group_id, _EMPTY):
+        self._members[parent_id] = self._members[parent_id] - removed
+    else:
+      self._members[group_id] = new
+    stale_members.update(self._Reachable(group_id, self._members))
+    for stale_id in stale_groups:
+      self._all_members.pop((stale_id, True), None)
+      self._all_members.pop((stale_id, False), None)
+    for stale_id in stale_members:
+      self._all_groups.pop(stale_id, None)
+
+  def _Reachable(self, start, edges):
+    """Returns the set of ids reachable from start through edges.
+
+    The start is only included if it can be reached from itself, as when
+    groups are members of each other.
+    """
+    reached = set()
+    pending = [start]
+    while pending:
+      for next_id in edges.get(pending.pop(), _EMPTY):
+        if next_id not in reached:
+          reached.add(next_id)
+          pending.append(next_id)
+    return reached
+
+  def GetGroupIds(self):
+    """Returns the ids of the groups in the graph."""
+    self._lock.acquire()
+    try:
+      return frozenset(self._members)
+    finally:
+      self._lock.release()
+
+  def GetMembers(self, group_id):
+    """Returns the direct members of a group, or nothing if it is unknown."""
+    self._lock.acquire()
+    try:
+      return self._members.get(group_id.lower(), _EMPTY)
+    finally:
+      self._lock.release()
+
+  def GetGroups(self, member_id):
+    """Returns the groups which member_id is directly in."""
+    self._lock.acquire()
+    try:
+      return frozenset(self._groups.get(member_id.lower(), _EMPTY))
+    finally:
+      self._lock.release()
+
+  def GetAllMembers(self, group_id, include_groups=False):
+    """Returns the members of a group and of the groups within it.
+
+    Args:
+      group_id: The ID of the group (e.g. us-sales@example.com).
+      include_groups: bool Whether to include the ids of the nested groups
+          as well as their members.
+
+    Returns:
+      A frozenset of member ids.
+    """
+    key = (group_id.lower(), include_groups)
+    self._lock.acquire()
+    try:
+      all_members = self._all_members.get(key)
+      if all_members is None:
+        all_members = self._Reachable(key[0], self._members)
+        if not include_groups:
+          all_members = [member_id for member_id in all_members
+                         if member_id not in self._members]
+        all_members = frozenset(all_members)
+        self._all_members[key] = all_members
+      return all_members
+    finally:
+      self._lock.release()
+
+  def GetAllGroups(self, member_id):
+    """Returns the groups which member_id is in, directly or through others."""
+    member_id = member_id.lower()
+    self._lock.acquire()
+    try:
+      all_groups = self._all_groups.get(member_id)
+      if all_groups is None:
+        all_groups = frozenset(self._Reachable(member_id, self._groups))
+        self._all_groups[member_id] = all_groups
+      return all_groups
+    finally:
+      self._lock.release()
+
+  def IsMember(self, member_id, group_id, direct_only=False):
+    """Returns whether member_id is in the group.
+
+    Args:
+      member_id: The member's email address (e.g. member@example.com).
+      group_id: The ID of the group (e.g. us-sales@example.com).
+      direct_only: bool If True, membership through a nested group does not
+          count.
+    """
+    if direct_only:
+      return member_id.lower() in self.GetMembers(group_id)
+    return group_id.lower() in self.GetAllGroups(member_id)
@@ -24,6 +24,7 @@ __author__ = 'google-apps-apis@googlegroups.com'
 
 import urllib
 import gdata.apps
+import gdata.apps.crawl
 import gdata.apps.service
 import gdata.service
 
@@ -160,8 +161,34 @@ class GroupsService(gdata.apps.service.PropertyService):
     Returns:
       A list containing the result of the retrieve operation.
     """
+    return list(self.GetGeneratorForAllGroups())
+
+  def CrawlAllGroups(self, boundaries=gdata.apps.crawl.DEFAULT_BOUNDARIES,
+                     max_workers=gdata.apps.crawl.DEFAULT_MAX_WORKERS):
+    """Retrieve all groups in the domain, several ranges at a time.
+
+    Args:
+      boundaries: The group ids at which the ranges begin.
+      max_workers: The most ranges to retrieve at once.
+
+    Returns:
+      The same list as RetrieveAllGroups. See gdata.apps.crawl.
+    """
+    uri = self._ServiceUrl('group', True, '', '', '')
+    return self._CrawlPropertiesList(uri, 'groupId', boundaries, max_workers)
+
+  def GetGeneratorForAllGroups(
+      self, prefetch=gdata.apps.service.DEFAULT_PREFETCH):
+    """Retrieve a generator for all groups in the domain.
+
+    Args:
+      prefetch: The number of pages to download ahead of the one being read.
+
+    Returns:
+      A generator which yields a dict for each group, page by page.
+    """
     uri = self._ServiceUrl('group', True, '', '', '')
-    return self._GetPropertiesList(uri)
+    return self._GetPropertiesGenerator(uri, prefetch=prefetch)
 
   def RetrievePageOfGroups(self, start_group=None):
     """Retrieve one page of groups in the domain.
@@ -188,8 +215,23 @@ class GroupsService(gdata.apps.service.PropertyService):
     Returns:
       A list containing the result of the retrieve operation.
     """
+    return list(self.GetGeneratorForGroups(member_id, direct_only=direct_only))
+
+  def GetGeneratorForGroups(
+      self, member_id, direct_only=False,
+      prefetch=gdata.apps.service.DEFAULT_PREFETCH):
+    """Retrieve a generator for the groups that the given member_id is in.
+
+    Args:
+      member_id: The member's email address (e.g. member@example.com).
+      direct_only: Boolean whether only return groups that this member directly belongs to.
+      prefetch: The number of pages to download ahead of the one being read.
+
+    Returns:
+      A generator which yields a dict for each group, page by page.
+    """
     uri = self._ServiceUrl('group', True, '', member_id, '', direct_only=direct_only)
-    return self._GetPropertiesList(uri)
+    return self._GetPropertiesGenerator(uri, prefetch=prefetch)
 
   def DeleteGroup(self, group_id):
     """Delete a group based on its ID.
@@ -255,10 +297,46 @@ class GroupsService(gdata.apps.service.PropertyService):
     Returns:
       A list containing the result of the retrieve operation.
     """
+    return list(self.GetGeneratorForAllMembers(
+        group_id, suspended_users=suspended_users))
+
+  def CrawlAllMembers(self, group_id, suspended_users=False,
+                      boundaries=gdata.apps.crawl.DEFAULT_BOUNDARIES,
+                      max_workers=gdata.apps.crawl.DEFAULT_MAX_WORKERS):
+    """Retrieve all members in the given group, several ranges at a time.
+
+    Args:
+      group_id: The ID of the group (e.g. us-sales).
+      suspended_users: A boolean; should we include any suspended users in
+        the membership list returned?
+      boundaries: The member ids at which the ranges begin.
+      max_workers: The most ranges to retrieve at once.
+
+    Returns:
+      The same list as RetrieveAllMembers. See gdata.apps.crawl.
+    """
     uri = self._ServiceUrl('member', True, group_id, '', '',
                            suspended_users=suspended_users)
-    return self._GetPropertiesList(uri)
+    return self._CrawlPropertiesList(uri, 'memberId', boundaries, max_workers)
     
+  def GetGeneratorForAllMembers(
+      self, group_id, suspended_users=False,
+      prefetch=gdata.apps.service.DEFAULT_PREFETCH):
+    """Retrieve a generator for all members in the given group.
+
+    Args:
+      group_id: The ID of the group (e.g. us-sales).
+      suspended_users: A boolean; should we include any suspended users in
+        the membership list returned?
+      prefetch: The number of pages to download ahead of the one being read.
+
+    Returns:
+      A generator which yields a dict for each member, page by page.
+    """
+    uri = self._ServiceUrl('member', True, group_id, '', '',
+                           suspended_users=suspended_users)
+    return self._GetPropertiesGenerator(uri, prefetch=prefetch)
+
   def RetrievePageOfMembers(self, group_id, suspended_users=False, start=None):
     """Retrieve one page of members of a given group.
     
@@ -347,10 +425,27 @@ class GroupsService(gdata.apps.service.PropertyService):
     Returns:
       A list containing the result of the retrieve operation.
     """
+    return list(self.GetGeneratorForAllOwners(
+        group_id, suspended_users=suspended_users))
+    
+  def GetGeneratorForAllOwners(
+      self, group_id, suspended_users=False,
+      prefetch=gdata.apps.service.DEFAULT_PREFETCH):
+    """Retrieve a generator for all owners of the given group.
+
+    Args:
+      group_id: The ID of the group (e.g. us-sales).
+      suspended_users: A boolean; should we include any suspended users in
+        the ownership list returned?
+      prefetch: The number of pages to download ahead of the one being read.
+
+    Returns:
+      A generator which yields a dict for each owner, page by page.
+    """
     uri = self._ServiceUrl('owner', True, group_id, '', '',
                            suspended_users=suspended_users)
-    return self._GetPropertiesList(uri)
-    
+    return self._GetPropertiesGenerator(uri, prefetch=prefetch)
+
   def RetrievePageOfOwners(self, group_id, suspended_users=False, start=None):
     """Retrieve one page of owners of the given group.
     
@@ -0,0 +1,277 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Imports mbox files and Maildir trees for many users at once.
+
+  ImportJob: one mailbox to import to one user.
+  MailImporter: imports jobs in parallel through a MigrationService.
+  Checkpoint: a file recording how far each job has got, so that an import
+      which is run again resumes where it stopped.
+
+Messages are read from disk one at a time and added to a MailBatchBuilder
+for each user, which submits a batch once it is full while the next one is
+built. Up to max_workers users are imported at the same time, and a shared
+gdata.throttle.TokenBucket limits the batch requests per second across all
+of them. For example:
+
+  importer = gdata.apps.migration.importer.MailImporter(
+      service, checkpoint_path='import.checkpoint', max_workers=8, rate=2)
+  for result in importer.Import([ImportJob('liz', '/mail/liz.mbox'),
+                                 ImportJob('joe', '/mail/joe/Maildir')]):
+    print result.user_name, result.imported, result.error
+
+A mailbox must not change between an interrupted import and the run which
+resumes it, since the checkpoint counts messages in mailbox order.
+"""
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import mailbox
+import os
+import sys
+import tempfile
+import threading
+import urllib
+import gdata.apps.migration.service
+import gdata.executor
+import gdata.throttle
+
+
+DEFAULT_MAX_WORKERS = 4
+
+# The batch statuses of messages which were imported.
+_SUCCESS_CODES = ('200', '201')
+
+
+def OpenMailbox(path):
+  """Opens a Maildir directory or an mbox file for reading."""
+  if os.path.isdir(path):
+    return mailbox.Maildir(path, factory=None, create=False)
+  if not os.path.exists(path):
+    raise IOError('No mailbox at %s' % path)
+  return mailbox.mbox(path, factory=None, create=False)
+
+
+def IterMessageFiles(path, skip=0):
+  """Yields a file-like object for each message in a mailbox, in order.
+
+  Messages in an mbox file are in the order of the file, and those in a
+  Maildir are in order of their unique names, which begin with the time
+  they were delivered. Only one message is read at a time.
+
+  Args:
+    path: The path of a Maildir directory or an mbox file.
+    skip: The number of messages at the start of the mailbox to leave out.
+  """
+  box = OpenMailbox(path)
+  try:
+    keys = box.keys()
+    if isinstance(box, mailbox.Maildir):
+      keys.sort()
+    for key in keys[skip:]:
+      message_file = box.get_file(key)
+      try:
+        yield message_file
+      finally:
+        message_file.close()
+  finally:
+    box.close()
+
+
+class ImportJob(object):
+  """A mailbox to import to one user's account.
+
+  Args:
+    user_name: The username to import messages to.
+    path: The path of a Maildir directory or an mbox file.
+    mail_item_properties: A list of Gmail properties to apply to every
+        message, IS_INBOX for example.
+    mail_labels: A list of labels to apply to every message.
+  """
+
+  def __init__(self, user_name, path, mail_item_properties=None,
+               mail_labels=None):
+    self.user_name = user_name
+    self.path = path
+    self.mail_item_properties = mail_item_properties or []
+    self.mail_labels = mail_labels or []
+
+
+class ImportResult(object):
+  """What happened to the messages of one ImportJob.
+
+  Attributes:
+    job: The ImportJob.
+    skipped: int Messages left out because an earlier run had sent them.
+    imported: int Messages which the server accepted.
+    failed: int Messages which the server rejected. These are not retried.
+    exc_info: The (type, value, traceback) tuple of the error which stopped
+        the job, or None if every message was sent.
+  """
+
+  def __init__(self, job, skipped=0):
+    self.job = job
+    self.user_name = job.user_name
+    self.skipped = skipped
+    self.imported = 0
+    self.failed = 0
+    self.exc_info = None
+
+  def _GetError(self):
+    if self.exc_info is None:
+      return None
+    return self.exc_info[1]
+
+  error = property(_GetError)
+
+  def Succeeded(self):
+    return self.exc_info is None
+
+
+class Checkpoint(object):
+  """Records how many messages of each job have been submitted.
+
+  The counts are kept in a text file with a line for each job, which is
+  replaced as a whole each time a count changes so that it is never left
+  half written.
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self._counts = {}
+    self._lock = threading.Lock()
+    if os.path.exists(path):
+      checkpoint_file = open(path, 'r')
+      try:
+        for line in checkpoint_file:
+          count, user_name, source = line.rstrip('\n').split('\t')
+          self._counts[(urllib.unquote(user_name),
+                        urllib.unquote(source))] = int(count)
+      finally:
+        checkpoint_file.close()
+
+  def Get(self, job):
+    """Returns the number of messages of the job which have been submitted."""
+    self._lock.acquire()
+    try:
+      return self._counts.get((job.user_name, job.path), 0)
+    finally:
+      self._lock.release()
+
+  def Set(self, job, count):
+    self._lock.acquire()
+    try:
+      self._counts[(job.user_name, job.path)] = count
+      self._Save()
+    finally:
+      self._lock.release()
+
+  def _Save(self):
+    lines = ['%i\t%s\t%s\n' % (count, urllib.quote(user_name),
+                               urllib.quote(source))
+             for (user_name, source), count in sorted(self._counts.items())]
+    directory = os.path.dirname(os.path.abspath(self.path))
+    handle, temp_name = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    temp_file = os.fdopen(handle, 'w')
+    try:
+      temp_file.writelines(lines)
+    finally:
+      temp_file.close()
+    if os.name == 'nt' and os.path.exists(self.path):
+      os.remove(self.path)
+    os.rename(temp_name, self.path)
+
+
+class MailImporter(object):
+  """Imports the mailboxes of many users through a MigrationService.
+
+  Args:
+    service: A gdata.apps.migration.service.MigrationService which is logged
+        in as a domain administrator. It is shared by the worker threads.
+    checkpoint_path: str (optional) The file in which to record progress.
+        If the file exists, each job resumes after the messages it records.
+    max_workers: int The most users to import at the same time.
+    rate: float (optional) The most batch requests per second, across all
+        users.
+    max_bytes: int The largest batch request to send, in bytes.
+    max_entries: int The most messages to send in one batch.
+  """
+
+  def __init__(self, service, checkpoint_path=None,
+               max_workers=DEFAULT_MAX_WORKERS, rate=None,
+               max_bytes=gdata.apps.migration.service.MAX_BATCH_BYTES,
+               max_entries=gdata.apps.migration.service.MAX_BATCH_ENTRIES):
+    self.service = service
+    self.checkpoint = None
+    if checkpoint_path is not None:
+      self.checkpoint = Checkpoint(checkpoint_path)
+    self.max_workers = max_workers
+    self.rate_limiter = None
+    if rate is not None:
+      self.rate_limiter = gdata.throttle.TokenBucket(rate)
+    self.max_bytes = max_bytes
+    self.max_entries = max_entries
+
+  def Import(self, jobs):
+    """Imports the jobs and returns an ImportResult for each, in order.
+
+    An error in one job, such as a batch which the server refuses, stops
+    that job but not the others. Its checkpoint records the messages which
+    were sent before the error.
+    """
+    pool = gdata.executor.ThreadPool(self.max_workers)
+    try:
+      return [result.Get() for result in pool.Map(self.RunJob, jobs)]
+    finally:
+      pool.Shutdown()
+
+  def RunJob(self, job):
+    """Imports one job on the calling thread and returns its ImportResult."""
+    skip = 0
+    if self.checkpoint is not None:
+      skip = self.checkpoint.Get(job)
+    result = ImportResult(job, skipped=skip)
+    progress = [skip]
+
+    def OnBatch(batch_result, count):
+      for entry in batch_result.entry:
+        if entry.batch_status is not None and (
+            entry.batch_status.code not in _SUCCESS_CODES):
+          result.failed += 1
+        else:
+          result.imported += 1
+      progress[0] += count
+      if self.checkpoint is not None:
+        self.checkpoint.Set(job, progress[0])
+
+    builder = self.service.CreateBatchBuilder(
+        job.user_name, max_bytes=self.max_bytes,
+        max_entries=self.max_entries, rate_limiter=self.rate_limiter,
+        on_batch=OnBatch)
+    try:
+      for message_file in IterMessageFiles(job.path, skip=skip):
+        builder.AddMailFile(message_file, job.mail_item_properties,
+                            job.mail_labels)
+      builder.Close()
+    except Exception:
+      result.exc_info = sys.exc_info()
+      # Let a batch in flight finish so that its messages are counted.
+      try:
+        builder.Abandon()
+      except Exception:
+        pass
+    return result
@@ -17,12 +17,17 @@
 """Contains the methods to import mail via Google Apps Email Migration API.
 
   MigrationService: Provides methids to import mail.
+  MailBatchBuilder: Collects messages into batches no larger than the server
+      accepts and submits each batch while the next is being built.
 """
 
 __author__ = 'google-apps-apis@googlegroups.com'
 
 
 import base64
+import sys
+import threading
+import atom
 import gdata
 import gdata.apps.service
 import gdata.service
@@ -31,6 +36,17 @@ from gdata.apps import migration
 
 API_VER = '2.0'
 
+# The largest batch request, in bytes, and the most messages in one batch
+# which a MailBatchBuilder sends by default.
+MAX_BATCH_BYTES = 32 * 1024 * 1024
+MAX_BATCH_ENTRIES = 100
+
+# The number of bytes of a message file to read and encode at a time.
+ENCODE_CHUNK_SIZE = 3 * 64 * 1024
+
+_BATCH_FEED_START = '<feed xmlns="%s">' % atom.ATOM_NAMESPACE
+_BATCH_FEED_END = '</feed>'
+
 
 class MigrationService(gdata.apps.service.AppsService):
   """Client for the EMAPI migration service.  Use either ImportMail to import
@@ -65,14 +81,9 @@ class MigrationService(gdata.apps.service.AppsService):
     """
     uri = '%s/%s/mail' % (self._BaseURL(), user_name)
 
-    mail_entry = migration.MailEntry()
-    mail_entry.rfc822_msg = migration.Rfc822Msg(text=(base64.b64encode(
-        mail_message)))
-    mail_entry.rfc822_msg.encoding = 'base64'
-    mail_entry.mail_item_property = map(
-        lambda x: migration.MailItemProperty(value=x), mail_item_properties)
-    mail_entry.label = map(lambda x: migration.Label(label_name=x),
-                           mail_labels)
+    mail_entry = _MakeMailEntry(migration.MailEntry,
+                                base64.b64encode(mail_message),
+                                mail_item_properties, mail_labels)
 
     try:
       return migration.MailEntryFromString(str(self.Post(mail_entry, uri)))
@@ -91,14 +102,9 @@ class MigrationService(gdata.apps.service.AppsService):
     Returns:
       The length of the MailEntry representing the message.
     """
-    mail_entry = migration.BatchMailEntry()
-    mail_entry.rfc822_msg = migration.Rfc822Msg(text=(base64.b64encode(
-        mail_message)))
-    mail_entry.rfc822_msg.encoding = 'base64'
-    mail_entry.mail_item_property = map(
-        lambda x: migration.MailItemProperty(value=x), mail_item_properties)
-    mail_entry.label = map(lambda x: migration.Label(label_name=x),
-                           mail_labels)
+    mail_entry = _MakeMailEntry(migration.BatchMailEntry,
+                                base64.b64encode(mail_message),
+                                mail_item_properties, mail_labels)
 
     self.mail_batch.AddBatchEntry(mail_entry)
 
@@ -116,14 +122,260 @@ class MigrationService(gdata.apps.service.AppsService):
     Raises:
       AppsForYourDomainException: An error occurred importing the batch.
     """
+    self.result = self._PostBatch(user_name, self.mail_batch)
+
+    self.mail_batch = migration.BatchMailEventFeed()
+
+    return self.result
+
+  def _PostBatch(self, user_name, batch):
     uri = '%s/%s/mail/batch' % (self._BaseURL(), user_name)
 
     try:
-      self.result = self.Post(self.mail_batch, uri,
-                              converter=migration.BatchMailEventFeedFromString)
+      return self.Post(batch, uri,
+                       converter=migration.BatchMailEventFeedFromString)
     except gdata.service.RequestError, e:
       raise gdata.apps.service.AppsForYourDomainException(e.args[0])
 
-    self.mail_batch = migration.BatchMailEventFeed()
+  def CreateBatchBuilder(self, user_name, max_bytes=MAX_BATCH_BYTES,
+                         max_entries=MAX_BATCH_ENTRIES, pipeline=True,
+                         rate_limiter=None, on_batch=None):
+    """Returns a MailBatchBuilder which imports messages to a user.
 
-    return self.result
+    Unlike AddBatchEntry and SubmitBatch, the builder submits each batch
+    once it is full, without the caller counting bytes.
+
+    Args:
+      user_name: The username to import messages to.
+      max_bytes: The largest batch request to send, in bytes.
+      max_entries: The most messages to send in one batch.
+      pipeline: If True, each batch is submitted on a background thread
+          while the next is being built.
+      rate_limiter: See MailBatchBuilder.
+      on_batch: See MailBatchBuilder.
+    """
+    return MailBatchBuilder(self, user_name, max_bytes=max_bytes,
+                            max_entries=max_entries, pipeline=pipeline,
+                            rate_limiter=rate_limiter, on_batch=on_batch)
+
+
+def _MakeMailEntry(entry_class, encoded_message, mail_item_properties,
+                   mail_labels):
+  mail_entry = entry_class()
+  mail_entry.rfc822_msg = migration.Rfc822Msg(text=encoded_message)
+  mail_entry.rfc822_msg.encoding = 'base64'
+  mail_entry.mail_item_property = map(
+      lambda x: migration.MailItemProperty(value=x), mail_item_properties)
+  mail_entry.label = map(lambda x: migration.Label(label_name=x),
+                         mail_labels)
+  return mail_entry
+
+
+def _EncodeMailFile(mail_file, chunk_size=ENCODE_CHUNK_SIZE):
+  """Base64 encodes the contents of a file, chunk_size bytes at a time.
+
+  The chunk size must be a multiple of three so that the encoded chunks can
+  be joined without padding between them.
+  """
+  encoded = []
+  while True:
+    chunk = mail_file.read(chunk_size)
+    if not chunk:
+      return ''.join(encoded)
+    encoded.append(base64.b64encode(chunk))
+
+
+class MailBatchBuilder(object):
+  """Adds messages to batches and submits each batch once it is full.
+
+  Each message is base64 encoded and serialized once, when it is added, and
+  the size of the batch request is kept as messages are added. A batch is
+  submitted before a message is added to it if the message would make the
+  request larger than max_bytes, or if the batch already holds max_entries
+  messages. Call Close to submit the last batch.
+
+  If submitting a batch fails, AddMail raises the error without adding
+  the message, so it may be added again. Messages are never lost or
+  imported twice because of a retry.
+
+  If pipeline is True, a batch is sent on a background thread so that the
+  next batch can be built in the meantime. At most one batch is in flight:
+  submitting a batch first waits for the one before it. An error from a
+  background submission is raised by the next call to AddMail, Flush or
+  Close. The failed batch is kept and is sent again, before the batch being
+  built, by the next call to Flush or Close.
+
+  The results member holds the BatchMailEventFeed returned for each batch,
+  in the order the batches were submitted, or None for a batch which
+  failed in the background.
+
+  Args:
+    service: The MigrationService which submits the batches.
+    user_name: The username to import messages to.
+    max_bytes: The largest batch request to send, in bytes.
+    max_entries: The most messages to send in one batch.
+    pipeline: If True, each batch is submitted on a background thread.
+    rate_limiter: (optional) An object, such as a gdata.throttle.TokenBucket,
+        whose acquire method is called before each batch is submitted.
+        Builders may share one to limit their combined request rate.
+    on_batch: (optional) A function which is called with the
+        BatchMailEventFeed and the number of messages of each batch once it
+        has been submitted, on the thread which submitted it.
+  """
+
+  def __init__(self, service, user_name, max_bytes=MAX_BATCH_BYTES,
+               max_entries=MAX_BATCH_ENTRIES, pipeline=True,
+               rate_limiter=None, on_batch=None):
+    self.service = service
+    self.user_name = user_name
+    self.max_bytes = max_bytes
+    self.max_entries = max_entries
+    self.pipeline = pipeline
+    self.rate_limiter = rate_limiter
+    self.on_batch = on_batch
+    self.results = []
+    self.added = 0
+    self._entries = []
+    self._size = len(_BATCH_FEED_START) + len(_BATCH_FEED_END)
+    self._empty_size = self._size
+    self._in_flight = None
+    self._exc_info = None
+    # The (batch, count, index) of a batch which failed in the background.
+    self._failed = None
+
+  def _GetSize(self):
+    return self._size
+
+  size = property(_GetSize,
+                  doc='The size in bytes of the batch being built.')
+
+  def __len__(self):
+    return len(self._entries)
+
+  def AddMail(self, mail_message, mail_item_properties, mail_labels):
+    """Adds a message to the batch, submitting the batch first if full.
+
+    Args:
+      mail_message: An RFC822 format email message.
+      mail_item_properties: A list of Gmail properties to apply to the message.
+      mail_labels: A list of labels to apply to the message.
+
+    Returns:
+      The batch id of the message, which identifies its entry in the
+      results. Ids are unique among the messages added to this builder.
+
+    Raises:
+      Error: The message is too large to be sent in a batch.
+      AppsForYourDomainException: An error occurred importing a batch.
+    """
+    return self._AddEncodedMail(base64.b64encode(mail_message),
+                                mail_item_properties, mail_labels)
+
+  def AddMailFile(self, mail_file, mail_item_properties, mail_labels):
+    """Adds a message read from a file, like AddMail.
+
+    The file is read and encoded a chunk at a time, so that only the encoded
+    message is held in memory.
+
+    Args:
+      mail_file: A file-like object holding an RFC822 format email message.
+      mail_item_properties: A list of Gmail properties to apply to the message.
+      mail_labels: A list of labels to apply to the message.
+    """
+    return self._AddEncodedMail(_EncodeMailFile(mail_file),
+                                mail_item_properties, mail_labels)
+
+  def _AddEncodedMail(self, encoded_message, mail_item_properties,
+                      mail_labels):
+    batch_id = str(self.added)
+    mail_entry = _MakeMailEntry(migration.BatchMailEntry, encoded_message,
+                                mail_item_properties, mail_labels)
+    mail_entry.batch_id = gdata.BatchId(text=batch_id)
+    entry_xml = atom.ElementTree.tostring(mail_entry._ToElementTree())
+    if self._empty_size + len(entry_xml) > self.max_bytes:
+      raise gdata.apps.service.Error(
+          'A message of %i bytes does not fit in a batch of %i bytes' % (
+              len(entry_xml), self.max_bytes))
+    # Flush before adding, so that if it fails the message is not added.
+    if self._entries and (len(self._entries) >= self.max_entries or
+                          self._size + len(entry_xml) > self.max_bytes):
+      self.Flush()
+    self._entries.append(entry_xml)
+    self._size += len(entry_xml)
+    self.added += 1
+    return batch_id
+
+  def Flush(self):
+    """Submits the batch being built, if it holds any messages.
+
+    If the previous batch failed, its error is raised and both it and the
+    batch being built are kept, so Flush may be called again to send them.
+    """
+    self._Wait()
+    if self._failed is not None:
+      batch, count, index = self._failed
+      self.results[index] = self._Send(batch, count)
+      self._failed = None
+    if not self._entries:
+      return
+    batch = ''.join([_BATCH_FEED_START] + self._entries + [_BATCH_FEED_END])
+    if self.pipeline:
+      # The result's place is taken now so that the results stay in order.
+      self._in_flight = threading.Thread(
+          target=self._Submit,
+          args=(batch, len(self._entries), len(self.results)))
+      self.results.append(None)
+      self._in_flight.start()
+    else:
+      self.results.append(self._Send(batch, len(self._entries)))
+    self._entries = []
+    self._size = self._empty_size
+
+  def _Send(self, batch, count):
+    if self.rate_limiter is not None:
+      self.rate_limiter.acquire()
+    result = self.service._PostBatch(self.user_name, batch)
+    if self.on_batch is not None:
+      self.on_batch(result, count)
+    return result
+
+  def _Submit(self, batch, count, index):
+    try:
+      self.results[index] = self._Send(batch, count)
+    except Exception:
+      self._exc_info = sys.exc_info()
+      self._failed = (batch, count, index)
+
+  def _Wait(self):
+    """Waits for the batch in flight and raises its error, if any."""
+    if self._in_flight is not None:
+      self._in_flight.join()
+      self._in_flight = None
+    if self._exc_info is not None:
+      exc_info = self._exc_info
+      self._exc_info = None
+      raise exc_info[0], exc_info[1], exc_info[2]
+
+  def Abandon(self):
+    """Drops the batch being built and waits for the batch in flight.
+
+    Use this instead of Close to stop after an error, so that no messages
+    are sent after those of a batch which failed. A batch which failed is
+    dropped too. The error of the batch in flight, if any, is raised.
+    """
+    self._entries = []
+    self._size = self._empty_size
+    try:
+      self._Wait()
+    finally:
+      self._failed = None
+
+  def Close(self):
+    """Submits the last batch and waits for every submission to finish.
+
+    Returns:
+      The list of BatchMailEventFeeds returned for the batches.
+    """
+    self.Flush()
+    self._Wait()
+    return self.results
@@ -31,6 +31,7 @@ import gdata
 import atom.service
 import gdata.service
 import gdata.apps
+import gdata.apps.crawl
 import atom
 
 API_VER="2.0"
@@ -59,6 +60,11 @@ TOO_MANY_RECIPIENTS_ON_EMAIL_LIST=1500
 
 DEFAULT_QUOTA_LIMIT='2048'
 
+# The number of pages which the RetrieveAll and GetEntryGeneratorFor methods
+# download ahead of the page being read. Prefetching uses a background
+# thread, so callers ask for it.
+DEFAULT_PREFETCH=0
+
 
 class Error(Exception):
   pass
@@ -107,14 +113,24 @@ class AppsService(gdata.service.GDataService):
   def _baseURL(self):
     return "/a/feeds/%s" % self.domain 
 
-  def AddAllElementsFromAllPages(self, link_finder, func):
-    """retrieve all pages and add all elements"""
-    next = link_finder.GetNextLink()
-    while next is not None:
-      next_feed = self.Get(next.href, converter=func)
-      for a_entry in next_feed.entry:
-        link_finder.entry.append(a_entry)
-      next = next_feed.GetNextLink()
+  def AddAllElementsFromAllPages(self, link_finder, func,
+                                 prefetch=DEFAULT_PREFETCH):
+    """Retrieve all pages and add all elements to link_finder.
+
+    Each page is requested once with Get. If prefetch is positive, the
+    following pages are downloaded up to prefetch pages ahead, on a
+    background thread, while the entries of the current one are added.
+    To work through a large feed without holding all of it in memory, use
+    GetEntryGeneratorFromLinkFinder or one of the GetEntryGeneratorFor
+    methods instead.
+    """
+    pages = self.GetGeneratorFromLinkFinder(link_finder, func,
+                                            num_retries=None,
+                                            prefetch=prefetch)
+    # The first page is link_finder itself.
+    pages.next()
+    for next_feed in pages:
+      link_finder.entry.extend(next_feed.entry)
     return link_finder
 
   def RetrievePageOfEmailLists(self, start_email_list_name=None,
@@ -126,8 +142,9 @@ class AppsService(gdata.service.GDataService):
     if start_email_list_name is not None:
       uri += "?startEmailListName=%s" % start_email_list_name
     try:
-      return gdata.apps.EmailListFeedFromString(str(self.GetWithRetries(
-            uri, num_retries=num_retries, delay=delay, backoff=backoff)))
+      return self.GetWithRetries(
+          uri, converter=gdata.apps.EmailListFeedFromString,
+          num_retries=num_retries, delay=delay, backoff=backoff)
     except gdata.service.RequestError, e:
       raise AppsForYourDomainException(e.args[0])
     
@@ -139,9 +156,20 @@ class AppsService(gdata.service.GDataService):
                                                delay=delay,
                                                backoff=backoff)
     return self.GetGeneratorFromLinkFinder(
-      first_page, gdata.apps.EmailListRecipientFeedFromString,
+      first_page, gdata.apps.EmailListFeedFromString,
       num_retries=num_retries, delay=delay, backoff=backoff)
 
+  def GetEntryGeneratorForAllEmailLists(
+    self, prefetch=DEFAULT_PREFETCH,
+    num_retries=gdata.service.DEFAULT_NUM_RETRIES,
+    delay=gdata.service.DEFAULT_DELAY, backoff=gdata.service.DEFAULT_BACKOFF):
+    """Retrieve a generator which yields every email list in this domain."""
+    first_page = self.RetrievePageOfEmailLists(num_retries=num_retries,
+                                               delay=delay, backoff=backoff)
+    return self.GetEntryGeneratorFromLinkFinder(
+      first_page, gdata.apps.EmailListFeedFromString, num_retries=num_retries,
+      delay=delay, backoff=backoff, prefetch=prefetch)
+
   def RetrieveAllEmailLists(self):
     """Retrieve all email list of a domain."""
 
@@ -166,7 +194,7 @@ class AppsService(gdata.service.GDataService):
     uri = "%s/emailList/%s?recipient=%s" % (
       self._baseURL(), API_VER, recipient)
     try:
-      ret = gdata.apps.EmailListFeedFromString(str(self.Get(uri)))
+      ret = self.Get(uri, converter=gdata.apps.EmailListFeedFromString)
     except gdata.service.RequestError, e:
       raise AppsForYourDomainException(e.args[0])
     
@@ -196,9 +224,9 @@ class AppsService(gdata.service.GDataService):
     if start_recipient is not None:
       uri += "?startRecipient=%s" % start_recipient
     try:
-      return gdata.apps.EmailListRecipientFeedFromString(str(
-          self.GetWithRetries(
-            uri, num_retries=num_retries, delay=delay, backoff=backoff)))
+      return self.GetWithRetries(
+          uri, converter=gdata.apps.EmailListRecipientFeedFromString,
+          num_retries=num_retries, delay=delay, backoff=backoff)
     except gdata.service.RequestError, e:
       raise AppsForYourDomainException(e.args[0])
 
@@ -214,6 +242,19 @@ class AppsService(gdata.service.GDataService):
       first_page, gdata.apps.EmailListRecipientFeedFromString,
       num_retries=num_retries, delay=delay, backoff=backoff)
 
+  def GetEntryGeneratorForAllRecipients(
+    self, list_name, prefetch=DEFAULT_PREFETCH,
+    num_retries=gdata.service.DEFAULT_NUM_RETRIES,
+    delay=gdata.service.DEFAULT_DELAY, backoff=gdata.service.DEFAULT_BACKOFF):
+    """Retrieve a generator which yields every recipient of an email list."""
+    first_page = self.RetrievePageOfRecipients(list_name,
+                                               num_retries=num_retries,
+                                               delay=delay, backoff=backoff)
+    return self.GetEntryGeneratorFromLinkFinder(
+      first_page, gdata.apps.EmailListRecipientFeedFromString,
+      num_retries=num_retries, delay=delay, backoff=backoff,
+      prefetch=prefetch)
+
   def RetrieveAllRecipients(self, list_name):
     """Retrieve all recipient of an email list."""
 
@@ -276,8 +317,9 @@ class AppsService(gdata.service.GDataService):
     if start_nickname is not None:
       uri += "?startNickname=%s" % start_nickname
     try:
-      return gdata.apps.NicknameFeedFromString(str(self.GetWithRetries(
-            uri, num_retries=num_retries, delay=delay, backoff=backoff)))
+      return self.GetWithRetries(
+          uri, converter=gdata.apps.NicknameFeedFromString,
+          num_retries=num_retries, delay=delay, backoff=backoff)
     except gdata.service.RequestError, e:
       raise AppsForYourDomainException(e.args[0])
 
@@ -292,6 +334,17 @@ class AppsService(gdata.service.GDataService):
       first_page, gdata.apps.NicknameFeedFromString, num_retries=num_retries,
       delay=delay, backoff=backoff)
 
+  def GetEntryGeneratorForAllNicknames(
+    self, prefetch=DEFAULT_PREFETCH,
+    num_retries=gdata.service.DEFAULT_NUM_RETRIES,
+    delay=gdata.service.DEFAULT_DELAY, backoff=gdata.service.DEFAULT_BACKOFF):
+    """Retrieve a generator which yields every nickname in this domain."""
+    first_page = self.RetrievePageOfNicknames(num_retries=num_retries,
+                                              delay=delay, backoff=backoff)
+    return self.GetEntryGeneratorFromLinkFinder(
+      first_page, gdata.apps.NicknameFeedFromString, num_retries=num_retries,
+      delay=delay, backoff=backoff, prefetch=prefetch)
+
   def RetrieveAllNicknames(self):
     """Retrieve all nicknames in the domain"""
 
@@ -300,14 +353,30 @@ class AppsService(gdata.service.GDataService):
     return self.AddAllElementsFromAllPages(
       ret, gdata.apps.NicknameFeedFromString)
 
+  def CrawlAllNicknames(
+    self, boundaries=gdata.apps.crawl.DEFAULT_BOUNDARIES,
+    max_workers=gdata.apps.crawl.DEFAULT_MAX_WORKERS):
+    """Retrieve all nicknames in the domain, several ranges at a time.
+
+    Returns the same feed as RetrieveAllNicknames. See gdata.apps.crawl.
+    """
+    crawler = gdata.apps.crawl.RangeCrawler(
+      lambda start: self.RetrievePageOfNicknames(start_nickname=start),
+      lambda uri: self.GetWithRetries(
+        uri, converter=gdata.apps.NicknameFeedFromString),
+      lambda entry: entry.nickname.name, boundaries=boundaries,
+      max_workers=max_workers)
+    return gdata.apps.NicknameFeed(entry=list(crawler.Crawl()))
+
   def GetGeneratorForAllNicknamesOfAUser(
     self, user_name, num_retries=gdata.service.DEFAULT_NUM_RETRIES,
     delay=gdata.service.DEFAULT_DELAY, backoff=gdata.service.DEFAULT_BACKOFF):
     """Retrieve a generator for all nicknames of a particular user."""
     uri = "%s/nickname/%s?username=%s" % (self._baseURL(), API_VER, user_name)
     try:
-      first_page = gdata.apps.NicknameFeedFromString(str(self.GetWithRetries(
-            uri, num_retries=num_retries, delay=delay, backoff=backoff)))
+      first_page = self.GetWithRetries(
+          uri, converter=gdata.apps.NicknameFeedFromString,
+          num_retries=num_retries, delay=delay, backoff=backoff)
     except gdata.service.RequestError, e:
       raise AppsForYourDomainException(e.args[0])
     return self.GetGeneratorFromLinkFinder(
@@ -319,7 +388,7 @@ class AppsService(gdata.service.GDataService):
 
     uri = "%s/nickname/%s?username=%s" % (self._baseURL(), API_VER, user_name)
     try:
-      ret = gdata.apps.NicknameFeedFromString(str(self.Get(uri)))
+      ret = self.Get(uri, converter=gdata.apps.NicknameFeedFromString)
     except gdata.service.RequestError, e:
       raise AppsForYourDomainException(e.args[0])
 
@@ -435,8 +504,9 @@ class AppsService(gdata.service.GDataService):
     if start_username is not None:
       uri += "?startUsername=%s" % start_username
     try:
-      return gdata.apps.UserFeedFromString(str(self.GetWithRetries(
-          uri, num_retries=num_retries, delay=delay, backoff=backoff)))
+      return self.GetWithRetries(
+          uri, converter=gdata.apps.UserFeedFromString,
+          num_retries=num_retries, delay=delay, backoff=backoff)
     except gdata.service.RequestError, e:
       raise AppsForYourDomainException(e.args[0])
 
@@ -451,6 +521,21 @@ class AppsService(gdata.service.GDataService):
       first_page, gdata.apps.UserFeedFromString, num_retries=num_retries,
       delay=delay, backoff=backoff)
 
+  def GetEntryGeneratorForAllUsers(
+    self, prefetch=DEFAULT_PREFETCH,
+    num_retries=gdata.service.DEFAULT_NUM_RETRIES,
+    delay=gdata.service.DEFAULT_DELAY, backoff=gdata.service.DEFAULT_BACKOFF):
+    """Retrieve a generator which yields every user in this domain.
+
+    Unlike RetrieveAllUsers, the users are yielded page by page as they
+    arrive and only the pages being read are held in memory.
+    """
+    first_page = self.RetrievePageOfUsers(num_retries=num_retries,
+                                          delay=delay, backoff=backoff)
+    return self.GetEntryGeneratorFromLinkFinder(
+      first_page, gdata.apps.UserFeedFromString, num_retries=num_retries,
+      delay=delay, backoff=backoff, prefetch=prefetch)
+
   def RetrieveAllUsers(self):
     """Retrieve all users in this domain. OBSOLETE"""
 
@@ -459,6 +544,23 @@ class AppsService(gdata.service.GDataService):
     return self.AddAllElementsFromAllPages(
       ret, gdata.apps.UserFeedFromString)
 
+  def CrawlAllUsers(
+    self, boundaries=gdata.apps.crawl.DEFAULT_BOUNDARIES,
+    max_workers=gdata.apps.crawl.DEFAULT_MAX_WORKERS):
+    """Retrieve all users in this domain, several ranges at a time.
+
+    The user names are split into ranges at the boundaries and up to
+    max_workers ranges are retrieved at once. Returns the same feed as
+    RetrieveAllUsers. See gdata.apps.crawl.
+    """
+    crawler = gdata.apps.crawl.RangeCrawler(
+      lambda start: self.RetrievePageOfUsers(start_username=start),
+      lambda uri: self.GetWithRetries(
+        uri, converter=gdata.apps.UserFeedFromString),
+      lambda entry: entry.login.user_name, boundaries=boundaries,
+      max_workers=max_workers)
+    return gdata.apps.UserFeed(entry=list(crawler.Crawl()))
+
 
 class PropertyService(gdata.service.GDataService):
   """Client for the Google Apps Property service."""
@@ -473,14 +575,24 @@ class PropertyService(gdata.service.GDataService):
     self.port = 443
     self.domain = domain
 
-  def AddAllElementsFromAllPages(self, link_finder, func):
-    """retrieve all pages and add all elements"""
-    next = link_finder.GetNextLink()
-    while next is not None:
-      next_feed = self.Get(next.href, converter=func)
-      for a_entry in next_feed.entry:
-        link_finder.entry.append(a_entry)
-      next = next_feed.GetNextLink()
+  def AddAllElementsFromAllPages(self, link_finder, func,
+                                 prefetch=DEFAULT_PREFETCH):
+    """Retrieve all pages and add all elements to link_finder.
+
+    Each page is requested once with Get. If prefetch is positive, the
+    following pages are downloaded up to prefetch pages ahead, on a
+    background thread, while the entries of the current one are added.
+    To work through a large feed without holding all of it in memory, use
+    GetEntryGeneratorFromLinkFinder or one of the GetEntryGeneratorFor
+    methods instead.
+    """
+    pages = self.GetGeneratorFromLinkFinder(link_finder, func,
+                                            num_retries=None,
+                                            prefetch=prefetch)
+    # The first page is link_finder itself.
+    pages.next()
+    for next_feed in pages:
+      link_finder.entry.extend(next_feed.entry)
     return link_finder
 
   def _GetPropertyEntry(self, properties):
@@ -500,19 +612,48 @@ class PropertyService(gdata.service.GDataService):
 
   def _GetPropertyFeed(self, uri):
     try:
-      return gdata.apps.PropertyFeedFromString(str(self.Get(uri)))
+      return self.Get(uri, converter=gdata.apps.PropertyFeedFromString)
     except gdata.service.RequestError, e:
       raise gdata.apps.service.AppsForYourDomainException(e.args[0])
 
-  def _GetPropertiesList(self, uri):
+  def _GetPropertiesGenerator(self, uri, prefetch=DEFAULT_PREFETCH):
+    """Returns a generator of property dicts for every entry in a feed.
+
+    The first page is requested right away. The following pages are
+    requested once each with Get as the dicts are consumed, at most
+    prefetch pages ahead.
+    """
     property_feed = self._GetPropertyFeed(uri)
     # pagination
-    property_feed = self.AddAllElementsFromAllPages(
-      property_feed, gdata.apps.PropertyFeedFromString)
-    properties_list = []
-    for property_entry in property_feed.entry:
-      properties_list.append(self._PropertyEntry2Dict(property_entry))
-    return properties_list
+    property_entries = self.GetEntryGeneratorFromLinkFinder(
+      property_feed, gdata.apps.PropertyFeedFromString, num_retries=None,
+      prefetch=prefetch)
+    return (self._PropertyEntry2Dict(property_entry)
+            for property_entry in property_entries)
+
+  def _GetPropertiesList(self, uri):
+    return list(self._GetPropertiesGenerator(uri))
+
+  def _CrawlPropertiesList(self, uri, key_name, boundaries, max_workers):
+    """Returns the property dicts of a feed, crawling ranges in parallel.
+
+    The feed must accept a start parameter and be ordered by the property
+    named key_name.
+    """
+    if '?' in uri:
+      start_uri = uri + '&start=%s'
+    else:
+      start_uri = uri + '?start=%s'
+    def FirstPage(start):
+      if start is None:
+        return self._GetPropertyFeed(uri)
+      return self._GetPropertyFeed(start_uri % urllib.quote_plus(start))
+    crawler = gdata.apps.crawl.RangeCrawler(
+      FirstPage, self._GetPropertyFeed,
+      lambda entry: self._PropertyEntry2Dict(entry)[key_name],
+      boundaries=boundaries, max_workers=max_workers)
+    return [self._PropertyEntry2Dict(property_entry)
+            for property_entry in crawler.Crawl()]
 
   def _GetProperties(self, uri):
     try:
@@ -0,0 +1,440 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# This module is used for version 2 of the Google Data APIs.
+
+
+"""Caches GET responses by ETag so that unchanged feeds are not downloaded.
+
+When a GDClient has a response_cache, every GET for which a cached response
+exists is sent with an If-None-Match header. If the server answers 304 Not
+Modified, the cached body is used as though it had been sent again.
+Responses are cached per URL, per API version and per user, so clients
+authorized as different users never see each other's data.
+
+Cached responses are kept in a storage backend:
+  MemoryStorage: a dict in this process.
+  DirectoryStorage: one file per response in a local directory.
+  SqliteStorage: a table in an SQLite database file.
+Each evicts the least recently used responses once it holds more than
+max_entries responses or more than max_bytes of response bodies.
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import os
+import tempfile
+import threading
+import time
+try:
+  import sqlite3
+except ImportError:
+  sqlite3 = None
+import atom.http_core
+import gdata.core
+
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+
+
+class Error(Exception):
+  pass
+
+
+class CacheEntry(object):
+  """A cached response body with the ETag and headers sent with it."""
+
+  def __init__(self, etag, body, headers=None):
+    self.etag = etag
+    self.body = body
+    self.headers = headers or {}
+
+  def _get_size(self):
+    return len(self.body)
+
+  size = property(_get_size)
+
+  def to_response(self):
+    """Creates a 200 response as though the server had sent the body again."""
+    return atom.http_core.HttpResponse(status=200, reason='OK',
+                                       headers=self.headers.copy(),
+                                       body=self.body)
+
+  def _to_json(self):
+    return gdata.core.simplejson.dumps({'etag': self.etag,
+                                        'headers': self.headers})
+
+  def _from_json(meta, body):
+    meta = gdata.core.simplejson.loads(meta)
+    return CacheEntry(meta['etag'], body, meta['headers'])
+
+  _from_json = staticmethod(_from_json)
+
+
+def _hash_key(key):
+  try:
+    import hashlib
+    return hashlib.sha1(key).hexdigest()
+  except ImportError:
+    import sha
+    return sha.new(key).hexdigest()
+
+
+class MemoryStorage(object):
+  """Keeps cached responses in memory, evicting the least recently used."""
+
+  def __init__(self, max_entries=DEFAULT_MAX_ENTRIES,
+               max_bytes=DEFAULT_MAX_BYTES):
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self.size = 0
+    self._entries = {}
+    # The keys of the entries, least recently used first.
+    self._order = []
+    self._lock = threading.Lock()
+
+  def get(self, key):
+    self._lock.acquire()
+    try:
+      entry = self._entries.get(key)
+      if entry is not None:
+        # Move the key to the most recently used end.
+        self._order.remove(key)
+        self._order.append(key)
+      return entry
+    finally:
+      self._lock.release()
+
+  def put(self, key, entry):
+    self._lock.acquire()
+    try:
+      self._remove(key)
+      self._entries[key] = entry
+      self._order.append(key)
+      self.size += entry.size
+      while self._order and (len(self._order) > self.max_entries or
+                             self.size > self.max_bytes):
+        self._remove(self._order[0])
+    finally:
+      self._lock.release()
+
+  def _remove(self, key):
+    old = self._entries.pop(key, None)
+    if old is not None:
+      self._order.remove(key)
+      self.size -= old.size
+
+  def delete(self, key):
+    self._lock.acquire()
+    try:
+      self._remove(key)
+    finally:
+      self._lock.release()
+
+  def clear(self):
+    self._lock.acquire()
+    try:
+      self._entries.clear()
+      del self._order[:]
+      self.size = 0
+    finally:
+      self._lock.release()
+
+  def __len__(self):
+    return len(self._entries)
+
+
+class DirectoryStorage(object):
+  """Keeps cached responses as files in a directory.
+
+  Each response is stored in a file named after a hash of its key, holding
+  a line of JSON with the ETag and headers followed by the body. A file's
+  modification time records when it was last used. The directory may be
+  shared by several processes.
+  """
+
+  def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES,
+               max_bytes=DEFAULT_MAX_BYTES):
+    self.path = path
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self._lock = threading.Lock()
+    if not os.path.isdir(path):
+      os.makedirs(path)
+
+  def _file_name(self, key):
+    return os.path.join(self.path, _hash_key(key) + '.cache')
+
+  def get(self, key):
+    file_name = self._file_name(key)
+    try:
+      cache_file = open(file_name, 'rb')
+    except IOError:
+      return None
+    try:
+      meta = cache_file.readline()
+      body = cache_file.read()
+    finally:
+      cache_file.close()
+    try:
+      entry = CacheEntry._from_json(meta, body)
+    except (ValueError, KeyError):
+      # A damaged file is treated as a miss.
+      self.delete(key)
+      return None
+    try:
+      os.utime(file_name, None)
+    except OSError:
+      pass
+    return entry
+
+  def put(self, key, entry):
+    # Write to a temporary file first so that readers never see part of a
+    # response.
+    handle, temp_name = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+    temp_file = os.fdopen(handle, 'wb')
+    try:
+      temp_file.write(entry._to_json() + '\n')
+      temp_file.write(entry.body)
+    finally:
+      temp_file.close()
+    file_name = self._file_name(key)
+    if os.name == 'nt' and os.path.exists(file_name):
+      os.remove(file_name)
+    os.rename(temp_name, file_name)
+    self._evict()
+
+  def _evict(self):
+    self._lock.acquire()
+    try:
+      files = []
+      total = 0
+      for name in os.listdir(self.path):
+        if not name.endswith('.cache'):
+          continue
+        file_name = os.path.join(self.path, name)
+        try:
+          stat = os.stat(file_name)
+        except OSError:
+          continue
+        files.append((stat.st_mtime, stat.st_size, file_name))
+        total += stat.st_size
+      files.sort()
+      while files and (len(files) > self.max_entries or
+                       total > self.max_bytes):
+        mtime, size, file_name = files.pop(0)
+        total -= size
+        try:
+          os.remove(file_name)
+        except OSError:
+          pass
+    finally:
+      self._lock.release()
+
+  def delete(self, key):
+    try:
+      os.remove(self._file_name(key))
+    except OSError:
+      pass
+
+  def clear(self):
+    for name in os.listdir(self.path):
+      if name.endswith('.cache'):
+        try:
+          os.remove(os.path.join(self.path, name))
+        except OSError:
+          pass
+
+
+class SqliteStorage(object):
+  """Keeps cached responses in an SQLite database.
+
+  Requires the sqlite3 module. Use ':memory:' as the path for a database
+  which is not saved to disk.
+  """
+
+  def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES,
+               max_bytes=DEFAULT_MAX_BYTES):
+    if sqlite3 is None:
+      raise Error('The sqlite3 module is required for SqliteStorage')
+    self.path = path
+    self.max_entries = max_entries
+    self.max_bytes = max_bytes
+    self._lock = threading.Lock()
+    self._db = sqlite3.connect(path, check_same_thread=False)
+    self._db.execute('CREATE TABLE IF NOT EXISTS responses ('
+                     'key TEXT PRIMARY KEY, meta TEXT, body BLOB, '
+                     'size INTEGER, last_used REAL)')
+    self._db.execute('CREATE INDEX IF NOT EXISTS responses_last_used '
+                     'ON responses (last_used)')
+    self._db.commit()
+
+  def get(self, key):
+    key = _hash_key(key)
+    self._lock.acquire()
+    try:
+      row = self._db.execute('SELECT meta, body FROM responses WHERE key = ?',
+                             (key,)).fetchone()
+      if row is None:
+        return None
+      self._db.execute('UPDATE responses SET last_used = ? WHERE key = ?',
+                       (time.time(), key))
+      self._db.commit()
+    finally:
+      self._lock.release()
+    return CacheEntry._from_json(row[0], str(row[1]))
+
+  def put(self, key, entry):
+    key = _hash_key(key)
+    self._lock.acquire()
+    try:
+      self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                       (key, entry._to_json(), sqlite3.Binary(entry.body),
+                        entry.size, time.time()))
+      count, total = self._db.execute(
+          'SELECT COUNT(*), TOTAL(size) FROM responses').fetchone()
+      for old_key, size in self._db.execute(
+          'SELECT key, size FROM responses ORDER BY last_used').fetchall():
+        if count <= self.max_entries and total <= self.max_bytes:
+          break
+        self._db.execute('DELETE FROM responses WHERE key = ?', (old_key,))
+        count -= 1
+        total -= size
+      self._db.commit()
+    finally:
+      self._lock.release()
+
+  def delete(self, key):
+    self._lock.acquire()
+    try:
+      self._db.execute('DELETE FROM responses WHERE key = ?',
+                       (_hash_key(key),))
+      self._db.commit()
+    finally:
+      self._lock.release()
+
+  def clear(self):
+    self._lock.acquire()
+    try:
+      self._db.execute('DELETE FROM responses')
+      self._db.commit()
+    finally:
+      self._lock.release()
+
+  def close(self):
+    self._db.close()
+
+
+def get_auth_scope(auth_token):
+  """Returns a string which identifies the user an auth token acts for.
+
+  The token's secret is hashed so that it is not written to the cache. A
+  token class which has no such secret can name its user in a cache_scope
+  member.
+
+  Returns:
+    The scope, or None if the token has no identity which is the same in
+    every process and for the token's whole life. Responses fetched with
+    such a token must not be cached.
+  """
+  if auth_token is None:
+    return ''
+  secret = (getattr(auth_token, 'cache_scope', None) or
+            getattr(auth_token, 'token_string', None) or
+            getattr(auth_token, 'token', None) or
+            getattr(auth_token, 'access_token', None))
+  if secret is None and getattr(auth_token, 'requestor_id', None):
+    # A two legged OAuth token acts for requestor_id.
+    secret = '%s:%s' % (auth_token.consumer_key, auth_token.requestor_id)
+  if secret is None:
+    return None
+  return _hash_key('%s:%s' % (auth_token.__class__.__name__, secret))
+
+
+class ResponseCache(object):
+  """Sends conditional GET requests and answers 304s from storage.
+
+  The hits, misses and stores members count responses served from the
+  cache after a 304, responses which had to be downloaded, and responses
+  which were added to the cache.
+  """
+
+  def __init__(self, storage=None):
+    if storage is None:
+      storage = MemoryStorage()
+    self.storage = storage
+    self.hits = 0
+    self.misses = 0
+    self.stores = 0
+    self._lock = threading.Lock()
+
+  def make_key(self, http_request, auth_scope, api_version=None):
+    return '%s\n%s\n%s' % (str(http_request.uri), auth_scope,
+                           api_version or '')
+
+  def send(self, send, http_request, auth_scope, api_version=None):
+    """Calls send(http_request), using and updating the cached response.
+
+    Returns:
+      The response from the server or, if the server said that the cached
+      response is still current, a 200 response with the cached body.
+    """
+    key = self.make_key(http_request, auth_scope, api_version)
+    entry = self.storage.get(key)
+    if entry is None:
+      response = send(http_request)
+    else:
+      http_request.headers['If-None-Match'] = entry.etag
+      try:
+        response = send(http_request)
+      finally:
+        # The request may be sent again, after a redirect for example, by
+        # which time the cached entry may have changed.
+        del http_request.headers['If-None-Match']
+      if response.status == 304:
+        # Read the empty body so that the connection can be reused.
+        response.read()
+        self._count('hits')
+        return entry.to_response()
+    self._count('misses')
+    etag = response.getheader('ETag')
+    cache_control = response.getheader('Cache-Control') or ''
+    if response.status != 200 or not etag or 'no-store' in cache_control:
+      return response
+    body = response.read()
+    headers = {}
+    for name in ('Content-Type', 'ETag', 'Last-Modified'):
+      value = response.getheader(name)
+      if value is not None:
+        headers[name] = value
+    entry = CacheEntry(etag, body, headers)
+    self.storage.put(key, entry)
+    self._count('stores')
+    return entry.to_response()
+
+  def _count(self, name):
+    self._lock.acquire()
+    try:
+      setattr(self, name, getattr(self, name) + 1)
+    finally:
+      self._lock.release()
+
+  MakeKey = make_key
+  Send = send
@@ -1042,3 +1042,12 @@ def CalendarEventFeedFromString(xml_string):
 
 def CalendarEventCommentFeedFromString(xml_string):
   return atom.CreateClassFromXMLString(CalendarEventCommentFeed, xml_string)
+
+
+# The kind category term of event feeds and entries.
+EVENT_KIND = 'http://schemas.google.com/g/2005#event'
+
+# Chooses Calendar classes for responses which CalendarService receives.
+ROOT_REGISTRY = gdata.RootRegistry(parent=gdata.ROOT_REGISTRY)
+ROOT_REGISTRY.Register(CalendarEventFeed, kind=EVENT_KIND)
+ROOT_REGISTRY.Register(CalendarEventEntry, kind=EVENT_KIND)
@@ -51,6 +51,8 @@ class RequestError(Error):
 class CalendarService(gdata.service.GDataService):
   """Client for the Google Calendar service."""
 
+  root_registry = gdata.calendar.ROOT_REGISTRY
+
   def __init__(self, email=None, password=None, source=None,
                server='www.google.com', additional_headers=None, **kwargs):
     """Creates a client for the Google Calendar service.
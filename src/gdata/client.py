@@ -24,6 +24,7 @@ This module is used for version 2 of the Google Data APIs. The primary class
 in this module is GDClient.
 
   GDClient: handles auth and CRUD operations when communicating with servers.
+  AsyncGDClient: a GDClient which performs its requests without blocking.
   GDataClient: deprecated client for version one services. Will be removed.
 """
 
@@ -31,12 +32,25 @@ in this module is GDClient.
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
-import re
+import copy
+import email.utils
+import httplib
+import Queue
+import random
+import socket
+import sys
+import threading
+import time
 import atom.client
 import atom.core
+import atom.data
+import atom.http_async
 import atom.http_core
+import gdata.cache
 import gdata.gauth
 import gdata.data
+import gdata.executor
+import gdata.sessions
 
 
 class Error(Exception):
@@ -133,6 +147,392 @@ def get_xml_version(version):
   return int(version.split('.')[0])
 
 
+# Responses with these statuses are worth retrying later.
+DEFAULT_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Requests with these methods may be sent more than once without changing
+# the result.
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Guards the creation of the session id cache and the connection pool which
+# a client sets up on first use, so that threads sharing a client share them.
+_lazy_init_lock = threading.Lock()
+
+# The most operations, and the most bytes, sent in one batch request.
+# Servers reject batch feeds with more than 100 entries or over 1MB.
+DEFAULT_BATCH_MAX_ENTRIES = 100
+DEFAULT_BATCH_MAX_BYTES = 1024 * 1024
+
+
+class RetryAttempt(object):
+  """Describes one attempt at sending a request, passed to observers.
+
+  Attributes:
+    number: int 1 for the first attempt, 2 for the first retry and so on.
+    method: str The HTTP method.
+    uri: str The requested URL.
+    status: int The response status, or None if an exception was raised.
+    error: The exception raised while sending, or None.
+    duration: float Seconds the attempt took.
+    delay: float Seconds waited before the next attempt, None if the
+        request is not retried after this attempt.
+  """
+
+  def __init__(self, number, method, uri, status, error, duration, delay):
+    self.number = number
+    self.method = method
+    self.uri = uri
+    self.status = status
+    self.error = error
+    self.duration = duration
+    self.delay = delay
+
+
+class RetryPolicy(object):
+  """Decides when and how soon GDClient should resend a failed request.
+
+  A request is retried if it failed with one of retry_statuses or with a
+  network error, and if it is safe to send again: the method must be
+  idempotent, or a PUT or DELETE made conditional with an If-Match ETag,
+  and the body must not be read from a file.
+
+  The wait before retry n is a random time between zero and
+  base_delay * 2 ** (n - 1), capped at max_delay ("full jitter"), so that
+  clients which failed together do not retry together. If the server sent
+  a Retry-After header, the wait is at least that long. A request is not
+  retried if the wait would take the total time past time_budget seconds;
+  the last response is returned (or the last error raised) instead.
+
+  If observer is set, its attempt_finished method is called with a
+  RetryAttempt after every attempt. The attempts, retries and exhausted
+  members count attempts made, retries made and requests which still
+  failed after their last attempt.
+  """
+
+  _time = staticmethod(time.time)
+  _sleep = staticmethod(time.sleep)
+  _random = staticmethod(random.random)
+
+  def __init__(self, max_attempts=4, base_delay=0.5, max_delay=30,
+               time_budget=120, retry_statuses=DEFAULT_RETRY_STATUSES,
+               observer=None):
+    self.max_attempts = max_attempts
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.time_budget = time_budget
+    self.retry_statuses = retry_statuses
+    self.observer = observer
+    self.attempts = 0
+    self.retries = 0
+    self.exhausted = 0
+    self._lock = threading.Lock()
+
+  def is_retryable(self, http_request):
+    """Returns True if the request may be sent more than once."""
+    if not atom.http_core._can_resend(http_request._body_parts):
+      return False
+    method = (http_request.method or 'GET').upper()
+    if method in IDEMPOTENT_METHODS:
+      return True
+    if method in ('PUT', 'DELETE'):
+      etag = http_request.headers.get('If-Match')
+      return bool(etag) and etag != '*'
+    return False
+
+  def get_delay(self, retry_number, retry_after=None):
+    """Returns the seconds to wait before the retry_number-th retry."""
+    ceiling = min(self.max_delay, self.base_delay * 2 ** (retry_number - 1))
+    delay = self._random() * ceiling
+    if retry_after is not None:
+      delay = max(delay, retry_after)
+    return delay
+
+  def _parse_retry_after(self, response):
+    value = response.getheader('Retry-After')
+    if not value:
+      return None
+    value = value.strip()
+    if value.isdigit():
+      return float(value)
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+      return None
+    return max(0.0, email.utils.mktime_tz(parsed) - self._time())
+
+  def _count(self, name):
+    self._lock.acquire()
+    try:
+      setattr(self, name, getattr(self, name) + 1)
+    finally:
+      self._lock.release()
+
+  def send(self, send, http_request, sign=None):
+    """Calls send(http_request), repeating it while it should be retried.
+
+    Args:
+      send: function which sends an atom.http_core.HttpRequest and returns
+          the response.
+      http_request: The request, ready to be sent.
+      sign: (optional) function, such as an auth token's modify_request,
+          which sets the Authorization header of a request. Each retry
+          sends a copy of http_request passed through sign, so that a
+          signature with a nonce and timestamp, as OAuth uses, is not
+          replayed.
+
+    Returns:
+      The response from the last attempt.
+    """
+    retryable = self.is_retryable(http_request)
+    deadline = self._time() + self.time_budget
+    number = 0
+    while True:
+      number += 1
+      self._count('attempts')
+      started = self._time()
+      response = None
+      exc_info = None
+      attempt_request = http_request
+      if number > 1 and sign is not None:
+        attempt_request = http_request._copy()
+        sign(attempt_request)
+      try:
+        response = send(attempt_request)
+        failed = response.status in self.retry_statuses
+      except (socket.error, httplib.HTTPException):
+        exc_info = sys.exc_info()
+        failed = True
+      now = self._time()
+      delay = None
+      if failed and retryable and number < self.max_attempts:
+        retry_after = None
+        if response is not None:
+          retry_after = self._parse_retry_after(response)
+        delay = self.get_delay(number, retry_after)
+        if now + delay > deadline:
+          delay = None
+      if self.observer is not None:
+        self.observer.attempt_finished(RetryAttempt(
+            number, http_request.method, str(http_request.uri),
+            response and response.status, exc_info and exc_info[1],
+            now - started, delay))
+      if delay is None:
+        if failed:
+          self._count('exhausted')
+        if exc_info is not None:
+          raise exc_info[0], exc_info[1], exc_info[2]
+        return response
+      if response is not None:
+        # Read the body so that the connection can be reused.
+        response.read()
+      self._count('retries')
+      self._sleep(delay)
+
+  IsRetryable = is_retryable
+  GetDelay = get_delay
+  Send = send
+
+
+class BatchResult(object):
+  """The outcome of one operation sent with GDClient.batch.
+
+  Attributes:
+    index: int The position of the operation in the operations passed to
+        batch.
+    operation: str The operation, such as gdata.data.BATCH_INSERT.
+    entry: The entry or URL which was passed in with the operation.
+    response: The entry for this operation in the server's response feed,
+        or None if the server did not answer for it.
+    code: int The code from the response entry's batch:status, None if
+        there was no status.
+    reason: str The reason from the batch:status, or an explanation of why
+        there is no response.
+    exc_info: The (type, value, traceback) tuple from sys.exc_info if the
+        batch request carrying this operation raised an exception, such as
+        a RequestError, otherwise None.
+  """
+
+  def __init__(self, index, operation, entry):
+    self.index = index
+    self.operation = operation
+    self.entry = entry
+    self.response = None
+    self.code = None
+    self.reason = None
+    self.exc_info = None
+
+  def succeeded(self):
+    return (self.exc_info is None and self.code is not None
+            and 200 <= self.code < 300)
+
+  Succeeded = succeeded
+
+  def _get_exception(self):
+    if self.exc_info is None:
+      return None
+    return self.exc_info[1]
+
+  exception = property(_get_exception)
+
+
+_BATCH_FEED_START = ('<feed xmlns="http://www.w3.org/2005/Atom" '
+                     'xmlns:batch="http://schemas.google.com/gdata/batch">')
+_BATCH_FEED_END = '</feed>'
+
+
+def _batch_entry_xml(operation, entry, batch_id, version):
+  """Serializes entry with a batch:id and a batch:operation.
+
+  The entry is left as it was found, so the caller's entries are not
+  changed.
+  """
+  if isinstance(entry, (str, unicode, atom.http_core.Uri)):
+    entry = gdata.data.BatchEntry(id=atom.data.Id(text=str(entry)))
+  elif not isinstance(entry, gdata.data.BatchEntry):
+    # Other entry classes have no batch members, so they would be dropped
+    # when serializing. Elements unknown to BatchEntry are kept as they are.
+    entry = atom.core.parse(entry.to_string(version), gdata.data.BatchEntry,
+                            version)
+  old_id, old_operation = entry.batch_id, entry.batch_operation
+  entry.batch_id = gdata.data.BatchId(text=batch_id)
+  entry.batch_operation = gdata.data.BatchOperation(type=operation)
+  try:
+    return entry.to_string(version)
+  finally:
+    entry.batch_id, entry.batch_operation = old_id, old_operation
+
+
+def _chunk_batch(operations, max_entries, max_bytes):
+  """Groups (result, xml) pairs into lists within the batch limits.
+
+  An entry which is larger than max_bytes on its own is sent alone.
+  """
+  overhead = len(_BATCH_FEED_START) + len(_BATCH_FEED_END)
+  chunk = []
+  size = overhead
+  for result, xml in operations:
+    if chunk and (len(chunk) >= max_entries or size + len(xml) > max_bytes):
+      yield chunk
+      chunk = []
+      size = overhead
+    chunk.append((result, xml))
+    size += len(xml)
+  if chunk:
+    yield chunk
+
+
+def _add_fields(uri, fields):
+  """Adds a fields parameter to a URI, for partial responses."""
+  if fields is None:
+    return uri
+  if isinstance(uri, (str, unicode)):
+    uri = atom.http_core.Uri.parse_uri(uri)
+  uri.query['fields'] = fields
+  return uri
+
+
+# Prefixes used in gd:fields for the namespaces of common elements. Atom
+# elements are named without a prefix.
+_FIELD_PREFIXES = {
+    'http://schemas.google.com/g/2005': 'gd',
+    'http://www.w3.org/2007/app': 'app',
+    'http://schemas.google.com/gdata/batch': 'batch',
+    'http://schemas.google.com/contact/2008': 'gContact',
+    'http://schemas.google.com/gCal/2005': 'gCal',
+    'http://schemas.google.com/spreadsheets/2006': 'gs'}
+
+
+def _get_field_name(tag, declarations):
+  """Converts an element qname into a name for gd:fields.
+
+  Args:
+    tag: str A qname such as '{http://schemas.google.com/g/2005}email'.
+    declarations: dict Prefixes mapped to the namespaces they stand for,
+        updated with the prefix used.
+  """
+  if not tag.startswith('{'):
+    return tag
+  namespace, local_name = tag[1:].split('}', 1)
+  if namespace == 'http://www.w3.org/2005/Atom':
+    return local_name
+  prefix = _FIELD_PREFIXES.get(namespace)
+  if prefix is None:
+    prefix = 'ns%i' % len(declarations)
+  declarations[prefix] = namespace
+  return '%s:%s' % (prefix, local_name)
+
+
+def _member_xml(value, version):
+  if not value:
+    return ''
+  if isinstance(value, list):
+    return ''.join([item.to_string(version) for item in value])
+  return value.to_string(version)
+
+
+def _get_changed_members(original, entry, version):
+  """Lists the child element members which differ between two entries.
+
+  Returns:
+    A list of (qname, member name) pairs.
+  """
+  qname, elements, attributes = entry.__class__._get_rules(version)
+  changed = []
+  for tag, (member_name, member_class, repeating) in elements.iteritems():
+    if (_member_xml(getattr(original, member_name, None), version)
+        != _member_xml(getattr(entry, member_name), version)):
+      changed.append((tag, member_name))
+  changed.sort()
+  return changed
+
+
+def _get_member_tags(entry, member_names, version):
+  """Finds the qnames of the named child element members."""
+  qname, elements, attributes = entry.__class__._get_rules(version)
+  tags = {}
+  for tag, element_def in elements.iteritems():
+    tags[element_def[0]] = tag
+  members = []
+  for member_name in member_names:
+    if member_name not in tags:
+      raise ValueError('%s has no element member %s' % (
+          entry.__class__.__name__, member_name))
+    members.append((tags[member_name], member_name))
+  return members
+
+
+def _copy_uri(uri):
+  """Returns a Uri which request may change without affecting the caller.
+
+  The gsessionid is added to the URI of each request, and a caller may
+  pass the same Uri object from several threads.
+  """
+  if isinstance(uri, (str, unicode)):
+    return atom.http_core.Uri.parse_uri(uri)
+  if isinstance(uri, atom.http_core.Uri):
+    uri = copy.copy(uri)
+    uri.query = uri.query.copy()
+  return uri
+
+
+def _get_int(element):
+  """Returns the integer text of an element, or None."""
+  if element is None or element.text is None:
+    return None
+  try:
+    return int(element.text.strip())
+  except ValueError:
+    return None
+
+
+def _new_entries(feed, seen):
+  """Yields the entries of feed whose ids are not in seen, adding them."""
+  for entry in feed.entry:
+    if entry.id is not None and entry.id.text:
+      if entry.id.text in seen:
+        continue
+      seen.add(entry.id.text)
+    yield entry
+
+
 class GDClient(atom.client.AtomPubClient):
   """Communicates with Google Data servers to perform CRUD operations.
 
@@ -174,17 +574,35 @@ class GDClient(atom.client.AtomPubClient):
   api_version member to a string, either '1' or '2'.
   """
 
-  # The gsessionid is used by Google Calendar to prevent redirects.
-  __gsessionid = None
+  # A gdata.sessions.SessionIdCache with the gsessionids which Google
+  # Calendar uses to prevent redirects. Created when first needed.
+  session_ids = None
   api_version = None
   # Name of the Google Data service when making a ClientLogin request.
   auth_service = None
   # URL prefixes which should be requested for AuthSub and OAuth.
   auth_scopes = None
+  # A gdata.throttle.Throttler which limits the rate and concurrency of
+  # requests to each host. If None, requests are sent right away.
+  throttler = None
+  # A RetryPolicy which decides whether failed requests are sent again. If
+  # None, requests are only sent once.
+  retry_policy = None
+  # A gdata.cache.ResponseCache which makes GET requests conditional on the
+  # ETag of the cached response. GETs which already have an If-None-Match
+  # header, such as get_entry with an etag, bypass the cache, as do GETs
+  # with an auth token for which gdata.cache.get_auth_scope returns None.
+  response_cache = None
+  # A gdata.executor.SingleFlight which lets concurrent GETs for the same
+  # URL, user and headers share one request. Only requests with a converter
+  # or desired_class take part, and the callers share the same parsed
+  # object, so it should be treated as read only. If None, every request
+  # is sent.
+  single_flight = None
 
   def request(self, method=None, uri=None, auth_token=None,
               http_request=None, converter=None, desired_class=None,
-              redirects_remaining=4, **kwargs):
+              redirects_remaining=4, headers=None, **kwargs):
     """Make an HTTP request to the server.
 
     See also documentation for atom.client.AtomPubClient.request.
@@ -225,6 +643,10 @@ class GDClient(atom.client.AtomPubClient):
                            server sends a 302 redirect, the request method
                            will raise an exception. This parameter is used in
                            recursive request calls to avoid an infinite loop.
+      headers: dict (optional) HTTP headers to send with this request only.
+               They take precedence over the headers this client sets, such
+               as User-Agent, and leave the client unchanged so it can be
+               shared by several threads.
 
     Any additional arguments are passed through to
     atom.client.AtomPubClient.request.
@@ -238,35 +660,184 @@ class GDClient(atom.client.AtomPubClient):
       body will be converted to the class using
       atom.core.parse.
     """
-    if isinstance(uri, (str, unicode)):
-      uri = atom.http_core.Uri.parse_uri(uri)
+    uri = _copy_uri(uri)
+    self._apply_session_id(uri, http_request)
+
+    # The AtomPubClient should call this class' modify_request before
+    # performing the HTTP request.
+    #http_request = self.modify_request(http_request)
 
-    # Add the gsession ID to the URL to prevent further redirects.
-    # TODO: If different sessions are using the same client, there will be a
-    # multitude of redirects and session ID shuffling.
+    http_request = self._prepare_request(method=method, uri=uri,
+        auth_token=auth_token, http_request=http_request, **kwargs)
+    if headers:
+      http_request.headers.update(headers)
+    if (self.single_flight is not None and http_request.method == 'GET'
+        and (converter is not None or desired_class is not None)):
+      return self.single_flight.do(
+          self._get_flight_key(http_request, auth_token, converter,
+                               desired_class),
+          lambda: self._complete_request(method, uri, auth_token,
+                                         http_request, converter,
+                                         desired_class, redirects_remaining,
+                                         headers, kwargs))
+    return self._complete_request(method, uri, auth_token, http_request,
+                                  converter, desired_class,
+                                  redirects_remaining, headers, kwargs)
+
+  def _complete_request(self, method, uri, auth_token, http_request,
+                        converter, desired_class, redirects_remaining,
+                        headers, kwargs):
+    """Sends a prepared request and converts the response, see request."""
+    auth_scope = None
+    if (self.response_cache is not None and http_request.method == 'GET'
+        and 'If-None-Match' not in http_request.headers):
+      auth_scope = gdata.cache.get_auth_scope(auth_token or self.auth_token)
+    if auth_scope is not None:
+      response = self.response_cache.send(
+          lambda http_request: self._send(http_request, auth_token),
+          http_request, auth_scope, self.api_version)
+    else:
+      response = self._send(http_request, auth_token)
+    if response is None:
+      return None
+    # TODO: move the redirect logic into the Google Calendar client once it
+    # exists since the redirects are only used in the calendar API.
+    if response.status == 302:
+      self._handle_redirect(response, redirects_remaining)
+      self._forget_session_id(uri, http_request)
+      # Make a recursive call with the gsession ID in the URI to follow
+      # the redirect.
+      return self.request(method=method, uri=uri, auth_token=auth_token,
+                          http_request=http_request, converter=converter,
+                          desired_class=desired_class,
+                          redirects_remaining=redirects_remaining-1,
+                          headers=headers, **kwargs)
+    return self._process_response(response, converter, desired_class)
+
+  def _get_flight_key(self, http_request, auth_token, converter,
+                      desired_class):
+    """Identifies GETs which would return the same result.
+
+    The Authorization header may differ between requests made for the same
+    user, for example by an OAuth nonce, so the user is identified by the
+    auth token instead. A token with no auth scope is only equal to
+    itself; the key keeps it alive while the request is in flight.
+    """
+    headers = [(name.lower(), value)
+               for name, value in http_request.headers.iteritems()
+               if name.lower() != 'authorization']
+    headers.sort()
+    token = auth_token or self.auth_token
+    auth_scope = gdata.cache.get_auth_scope(token)
+    if auth_scope is None:
+      auth_scope = token
+    return (str(http_request.uri), auth_scope, tuple(headers), converter,
+            desired_class)
+
+  def _send(self, http_request, auth_token=None):
+    """Sends a prepared request, retrying it if a retry_policy is set.
+
+    Retries are signed again by the token which signed the request, the
+    auth_token or else the client's own.
+    """
+    if self.retry_policy is None:
+      return self._send_once(http_request)
+    token = auth_token or self.auth_token
+    sign = None
+    if token:
+      sign = token.modify_request
+    return self.retry_policy.send(self._send_once, http_request, sign)
+
+  def _send_once(self, http_request):
+    """Sends a prepared request, waiting first if a throttler is set."""
+    if self.throttler is None:
+      return self.http_client.request(http_request)
+    throttle = self.throttler.get(http_request.uri.host)
+    start = throttle.start()
+    try:
+      response = self.http_client.request(http_request)
+    except Exception:
+      exc_info = sys.exc_info()
+      throttle.finish(start, error=exc_info[1])
+      raise exc_info[0], exc_info[1], exc_info[2]
+    throttle.finish(start, status=response.status)
+    return response
+
+  def _get_session_ids(self):
+    if self.session_ids is None:
+      _lazy_init_lock.acquire()
+      try:
+        if self.session_ids is None:
+          self.session_ids = gdata.sessions.SessionIdCache()
+      finally:
+        _lazy_init_lock.release()
+    return self.session_ids
+
+  def _apply_session_id(self, uri, http_request):
+    """Adds the stored gsessionid to the URI, or adopts one found there."""
+    # Add the gsession ID to the URL to prevent further redirects. Session
+    # IDs are stored per host and feed so that clients which use several
+    # sessions send the right one.
+    session_ids = self._get_session_ids()
     # If the gsession ID is in the URL, adopt it as the standard location.
     if uri is not None and uri.query is not None and 'gsessionid' in uri.query:
-      self.__gsessionid = uri.query['gsessionid']
+      session_ids.put(uri.host, uri.path, uri.query['gsessionid'])
     # The gsession ID could also be in the HTTP request.
     elif (http_request is not None and http_request.uri is not None
           and http_request.uri.query is not None
           and 'gsessionid' in http_request.uri.query):
-      self.__gsessionid = http_request.uri.query['gsessionid']
-    # If the gsession ID is stored in the client, and was not present in the
+      session_ids.put(http_request.uri.host, http_request.uri.path,
+                      http_request.uri.query['gsessionid'])
+    # If a gsession ID is stored for this URL, and was not present in the
     # URI then add it to the URI.
-    elif self.__gsessionid is not None:
-      uri.query['gsessionid'] = self.__gsessionid
+    else:
+      if uri is None and http_request is not None:
+        uri = http_request.uri
+      if uri is not None:
+        session_id = session_ids.get(uri.host, uri.path)
+        if session_id is not None:
+          uri.query['gsessionid'] = session_id
+
+  def _forget_session_id(self, uri, http_request):
+    """Removes a gsessionid which the server has just replaced."""
+    for target in (uri, http_request and http_request.uri):
+      if target is not None and target.query is not None:
+        target.query.pop('gsessionid', None)
+
+  def _handle_redirect(self, response, redirects_remaining):
+    """Stores the gsessionid sent in a 302 which the client should follow.
 
-    # The AtomPubClient should call this class' modify_request before
-    # performing the HTTP request.
-    #http_request = self.modify_request(http_request)
+    Raises:
+      RedirectError if the redirect cannot be followed.
+    """
+    if redirects_remaining > 0:
+      location = (response.getheader('Location')
+                  or response.getheader('location'))
+      if location is not None:
+        # Read the body so that the connection can be reused for the
+        # redirected request.
+        response.read()
+        session_id = gdata.sessions.find_session_id(location)
+        if session_id is not None:
+          location = atom.http_core.Uri.parse_uri(location)
+          self._get_session_ids().redirected(location.host, location.path,
+                                             session_id)
+      else:
+        raise error_from_response('302 received without Location header',
+                                  response, RedirectError)
+    else:
+      raise error_from_response('Too many redirects from server',
+                                response, RedirectError)
 
-    response = atom.client.AtomPubClient.request(self, method=method,
-        uri=uri, auth_token=auth_token, http_request=http_request, **kwargs)
+  def _process_response(self, response, converter, desired_class):
+    """Converts a successful response or raises the matching error.
+
+    Returns:
+      The result of the converter or the response body parsed as the
+      desired_class. If neither was given, the response itself.
+    """
     # On success, convert the response body using the desired converter
     # function if present.
-    if response is None:
-      return None
     if response.status == 200 or response.status == 201:
       if converter is not None:
         return converter(response)
@@ -280,29 +851,6 @@ class GDClient(atom.client.AtomPubClient):
           return atom.core.parse(response.read(), desired_class)
       else:
         return response
-    # TODO: move the redirect logic into the Google Calendar client once it
-    # exists since the redirects are only used in the calendar API.
-    elif response.status == 302:
-      if redirects_remaining > 0:
-        location = (response.getheader('Location')
-                    or response.getheader('location'))
-        if location is not None:
-          m = re.compile('[\?\&]gsessionid=(\w*)').search(location)
-          if m is not None:
-            self.__gsessionid = m.group(1)
-          # Make a recursive call with the gsession ID in the URI to follow
-          # the redirect.
-          return self.request(method=method, uri=uri, auth_token=auth_token,
-                              http_request=http_request, converter=converter,
-                              desired_class=desired_class,
-                              redirects_remaining=redirects_remaining-1,
-                              **kwargs)
-        else:
-          raise error_from_response('302 received without Location header',
-                                    response, RedirectError)
-      else:
-        raise error_from_response('Too many redirects from server',
-                                  response, RedirectError)
     elif response.status == 401:
       raise error_from_response('Unauthorized - Server responded with',
                                 response, Unauthorized)
@@ -629,20 +1177,28 @@ class GDClient(atom.client.AtomPubClient):
   ModifyRequest = modify_request
 
   def get_feed(self, uri, auth_token=None, converter=None,
-               desired_class=gdata.data.GDFeed, **kwargs):
-    return self.request(method='GET', uri=uri, auth_token=auth_token,
-                        converter=converter, desired_class=desired_class,
-                        **kwargs)
+               desired_class=gdata.data.GDFeed, fields=None, **kwargs):
+    """Fetches a feed.
+
+    If fields is set, for example to 'entry(title,gd:email)', the server
+    sends a partial response with only the selected elements.
+    """
+    return self.request(method='GET', uri=_add_fields(uri, fields),
+                        auth_token=auth_token, converter=converter,
+                        desired_class=desired_class, **kwargs)
 
   GetFeed = get_feed
 
   def get_entry(self, uri, auth_token=None, converter=None,
-                desired_class=gdata.data.GDEntry, etag=None, **kwargs):
+                desired_class=gdata.data.GDEntry, etag=None, fields=None,
+                **kwargs):
+    """Fetches an entry, see get_feed for fields."""
     http_request = atom.http_core.HttpRequest()
     # Conditional retrieval
     if etag is not None:
       http_request.headers['If-None-Match'] = etag
-    return self.request(method='GET', uri=uri, auth_token=auth_token,
+    return self.request(method='GET', uri=_add_fields(uri, fields),
+                        auth_token=auth_token,
                         http_request=http_request, converter=converter,
                         desired_class=desired_class, **kwargs)
 
@@ -669,6 +1225,177 @@ class GDClient(atom.client.AtomPubClient):
 
   GetNext = get_next
 
+  def get_entries(self, uri, auth_token=None, desired_class=gdata.data.GDFeed,
+                  prefetch=1, **kwargs):
+    """Yields the entries from every page of a feed, following next links.
+
+    While the caller works through the entries of one page, the following
+    pages are downloaded and parsed on a background thread. At most
+    prefetch pages are downloaded ahead of the page being read, so memory
+    use stays bounded however long the feed is. If the generator is closed
+    early, or garbage collected, no further pages are requested.
+
+    Args:
+      uri: str or atom.http_core.Uri The URL of the first page.
+      auth_token: (optional) Used to authorize every page request.
+      desired_class: The feed class to which each page is converted.
+      prefetch: int The most pages to download ahead of the caller. If 0,
+          each page is requested only once the previous one has been used
+          up, on the caller's thread.
+
+    Any additional arguments, such as a Query in q, are passed to get_feed
+    for the first page only. The next links already hold the query, so
+    later pages are requested with just the auth_token and any converter.
+
+    Yields:
+      The entries of each page in turn. If a page request fails, the error
+      is raised after the entries of the pages before it.
+    """
+    if prefetch < 1:
+      feed = self.get_feed(uri, auth_token=auth_token,
+                           desired_class=desired_class, **kwargs)
+      while feed is not None:
+        for entry in feed.entry:
+          yield entry
+        feed = self._get_next_page(feed, auth_token, kwargs)
+      return
+    pages = Queue.Queue()
+    slots = threading.Semaphore(prefetch)
+    stop = threading.Event()
+    fetcher = threading.Thread(target=self._fetch_pages, args=(
+        uri, auth_token, desired_class, kwargs, pages, slots, stop))
+    fetcher.setDaemon(True)
+    fetcher.start()
+    try:
+      while True:
+        feed, exc_info = pages.get()
+        slots.release()
+        if exc_info is not None:
+          raise exc_info[0], exc_info[1], exc_info[2]
+        if feed is None:
+          return
+        for entry in feed.entry:
+          yield entry
+    finally:
+      stop.set()
+      # Wake the fetcher if it is waiting for a slot so that it can exit.
+      slots.release()
+
+  GetEntries = get_entries
+
+  def _get_next_page(self, feed, auth_token, kwargs):
+    """Requests the page which feed's next link points to, if it has one.
+
+    The link is followed as given. Applying the first request's options
+    again, such as a Query with a start_index, could change it to ask for
+    the same page forever.
+    """
+    next_link = feed.find_next_link()
+    if next_link is None:
+      return None
+    return self.get_feed(next_link, auth_token=auth_token,
+                         converter=kwargs.get('converter'),
+                         desired_class=feed.__class__)
+
+  def _fetch_pages(self, uri, auth_token, desired_class, kwargs, pages,
+                   slots, stop):
+    """Puts (feed, exc_info) pairs for each page in the pages queue.
+
+    A slot is taken before each page is requested and the reader gives it
+    back when it takes the page from the queue. The end of the feed is
+    marked with (None, None).
+    """
+    try:
+      slots.acquire()
+      if stop.isSet():
+        return
+      feed = self.get_feed(uri, auth_token=auth_token,
+                           desired_class=desired_class, **kwargs)
+      while feed is not None:
+        pages.put((feed, None))
+        slots.acquire()
+        if stop.isSet():
+          return
+        feed = self._get_next_page(feed, auth_token, kwargs)
+      pages.put((None, None))
+    except Exception:
+      pages.put((None, sys.exc_info()))
+
+  def get_entries_parallel(self, uri, auth_token=None,
+                           desired_class=gdata.data.GDFeed,
+                           max_workers=gdata.executor.DEFAULT_MAX_WORKERS,
+                           **kwargs):
+    """Yields the entries from every page of a feed, requesting pages at once.
+
+    The first page is requested on its own. If it gives the
+    openSearch:totalResults and openSearch:itemsPerPage of the feed, the
+    URLs of the remaining pages are worked out with the start-index and
+    max-results parameters and the pages are requested together, at most
+    max_workers at a time (see request_many). Entries are still yielded in
+    feed order.
+
+    Entries added or removed while the pages are being fetched shift the
+    later pages, so an entry may appear on two pages; each entry id is only
+    yielded once. If the last page has a next link, because the feed grew,
+    the rest of the feed is fetched by following next links. Feeds without
+    totalResults are always read by following next links.
+
+    Args:
+      uri: str or atom.http_core.Uri The URL of the first page. Its
+          max-results parameter, if any, sets the page size.
+      auth_token: (optional) Used to authorize every page request.
+      desired_class: The feed class to which each page is converted.
+      max_workers: int The most page requests in progress at once.
+
+    Any additional arguments are passed to get_feed for the first page and
+    for the pages requested by index. They should not set start-index, as a
+    Query object might. Next links are followed as given, see get_entries.
+
+    Yields:
+      The entries of each page in turn. If a page request fails, the error
+      is raised after the entries of the pages before it.
+    """
+    if isinstance(uri, (str, unicode)):
+      uri = atom.http_core.Uri.parse_uri(uri)
+    seen = set()
+    feed = self.get_feed(uri, auth_token=auth_token,
+                         desired_class=desired_class, **kwargs)
+    for entry in _new_entries(feed, seen):
+      yield entry
+    for feed in self._get_pages_by_index(uri, feed, auth_token, max_workers,
+                                         kwargs):
+      for entry in _new_entries(feed, seen):
+        yield entry
+    feed = self._get_next_page(feed, auth_token, kwargs)
+    while feed is not None:
+      for entry in _new_entries(feed, seen):
+        yield entry
+      feed = self._get_next_page(feed, auth_token, kwargs)
+
+  GetEntriesParallel = get_entries_parallel
+
+  def _get_pages_by_index(self, uri, first_page, auth_token, max_workers,
+                          kwargs):
+    """Yields the pages after first_page, requested by start-index."""
+    total = _get_int(first_page.total_results)
+    per_page = (_get_int(first_page.items_per_page)
+                or len(first_page.entry))
+    start = _get_int(first_page.start_index) or 1
+    if not total or not per_page:
+      return
+    page_uris = []
+    for index in xrange(start + per_page, total + 1, per_page):
+      query = uri.query.copy()
+      query['start-index'] = str(index)
+      query['max-results'] = str(per_page)
+      page_uris.append(atom.http_core.Uri(uri.scheme, uri.host, uri.port,
+                                          uri.path, query))
+    for result in self.request_many(page_uris, max_workers=max_workers,
+                                    auth_token=auth_token,
+                                    desired_class=first_page.__class__,
+                                    **kwargs):
+      yield result.get()
+
   # TODO: add a refresh method to re-fetch the entry/feed from the server
   # if it has been updated.
 
@@ -721,6 +1448,71 @@ class GDClient(atom.client.AtomPubClient):
 
   Update = update
 
+  def patch(self, entry, original=None, fields=None, auth_token=None,
+            force=False, **kwargs):
+    """Sends only the changed parts of an entry in a PATCH request.
+
+    The members of the entry which differ from original, or the members
+    named in fields, are sent along with a gd:fields attribute naming them,
+    so that the server replaces those elements and leaves the rest of the
+    entry as it is. Like update, the request is conditional on the entry's
+    ETag unless force is True.
+
+    Args:
+      entry: The edited entry, with an edit link.
+      original: (optional) The entry as it was fetched from the server,
+          used to find which members have changed. A copy can be kept with
+          atom.core.parse(entry.to_string(), entry.__class__) before
+          editing.
+      fields: list of str (optional) The names of the members to send, such
+          as ['title', 'email'], instead of comparing with original.
+      auth_token: (optional)
+      force: boolean If True the entry is changed whatever version is on
+          the server.
+
+    Any additional arguments are passed to request. Pass a Query with
+    fields set to ask for a partial response.
+
+    Returns:
+      The entry sent back by the server, converted to the entry's class. If
+      nothing has changed, no request is sent and entry is returned.
+
+    Raises:
+      Error if neither original nor fields is given.
+      ValueError if fields names a member the entry does not have.
+    """
+    version = get_xml_version(self.api_version)
+    if fields is not None:
+      changed = _get_member_tags(entry, fields, version)
+    elif original is not None:
+      changed = _get_changed_members(original, entry, version)
+    else:
+      raise Error('Either the original entry or fields is needed')
+    if not changed:
+      return entry
+    partial = entry.__class__()
+    declarations = {}
+    names = []
+    for tag, member_name in changed:
+      setattr(partial, member_name, getattr(entry, member_name))
+      names.append(_get_field_name(tag, declarations))
+    partial._other_attributes[gdata.data.GD_TEMPLATE % 'fields'] = (
+        ','.join(names))
+    for prefix, namespace in declarations.iteritems():
+      partial._other_attributes['xmlns:' + prefix] = namespace
+    http_request = atom.http_core.HttpRequest()
+    http_request.add_body_part(partial.to_string(version),
+                               'application/atom+xml')
+    if force:
+      http_request.headers['If-Match'] = '*'
+    elif hasattr(entry, 'etag') and entry.etag:
+      http_request.headers['If-Match'] = entry.etag
+    return self.request(method='PATCH', uri=entry.find_edit_link(),
+                        auth_token=auth_token, http_request=http_request,
+                        desired_class=entry.__class__, **kwargs)
+
+  Patch = patch
+
   def delete(self, entry_or_uri, auth_token=None, force=False, **kwargs):
     http_request = atom.http_core.HttpRequest()
       
@@ -743,14 +1535,401 @@ class GDClient(atom.client.AtomPubClient):
 
   Delete = delete
 
-  #TODO: implement batch requests.
-  #def batch(feed, uri, auth_token=None, converter=None, **kwargs):
-  #  pass
+  def request_many(self, uris, method='GET', ordered=True,
+                   max_workers=gdata.executor.DEFAULT_MAX_WORKERS, **kwargs):
+    """Makes one request for each URI, several at a time, using threads.
+
+    The requests run on a pool of max_workers threads. If this client's
+    http_client supports connection pooling (as atom.http_core.HttpClient
+    does) and has no pool, it is given one until the results have been
+    read, so that the threads reuse each other's connections, and the
+    pool's connections are then closed. To keep connections open between
+    calls, call use_connection_pool first.
+
+    Nothing is sent until the results are iterated over.
+
+    Args:
+      uris: An iterable of str or atom.http_core.Uri objects. It may be a
+          generator, URIs are read as threads become free.
+      method: str The HTTP method used for every request, defaults to 'GET'.
+      ordered: boolean If True (the default) results are yielded in the order
+          of the uris, otherwise each result is yielded as soon as its
+          request completes.
+      max_workers: int The largest number of requests in progress at once.
+
+    Any additional arguments, such as auth_token, converter or
+    desired_class, are passed to request for every URI. A separate
+    HttpRequest is built for each URI, so http_request may not be passed.
+
+    Yields:
+      A gdata.executor.Result for each URI. The result's item is the URI and
+      its value is what request returned. If the request raised an
+      exception, for example a RequestError, it is stored in the result's
+      exception and exc_info instead and the other requests continue.
+    """
+    def make_request(uri):
+      return self.request(method=method, uri=uri, **kwargs)
+
+    connection_pool = self._borrow_connection_pool(max_workers)
+    pool = gdata.executor.ThreadPool(max_workers)
+    try:
+      for result in pool.map(make_request, uris, ordered=ordered):
+        yield result
+    finally:
+      pool.shutdown()
+      self._return_connection_pool(connection_pool)
+
+  RequestMany = request_many
+
+  def use_connection_pool(
+      self, max_idle_per_host=gdata.executor.DEFAULT_MAX_WORKERS):
+    """Gives the http_client a connection pool if it supports one.
+
+    Threads which share this client then reuse each other's connections
+    rather than opening one per request. Does nothing if the http_client
+    already has a pool.
+
+    Returns:
+      The http_client's atom.http_core.ConnectionPool, or None if the
+      http_client does not support pooling.
+    """
+    if getattr(self.http_client, 'connection_pool', False) is None:
+      _lazy_init_lock.acquire()
+      try:
+        if self.http_client.connection_pool is None:
+          self.http_client.connection_pool = atom.http_core.ConnectionPool(
+              max_idle_per_host=max_idle_per_host)
+      finally:
+        _lazy_init_lock.release()
+    return getattr(self.http_client, 'connection_pool', None)
+
+  UseConnectionPool = use_connection_pool
+
+  def _borrow_connection_pool(self, max_idle_per_host):
+    """Gives the http_client a connection pool for the length of a call.
+
+    Returns:
+      The new pool, to be passed to _return_connection_pool, or None if the
+      http_client already has a pool or does not support pooling.
+    """
+    if getattr(self.http_client, 'connection_pool', False) is not None:
+      return None
+    _lazy_init_lock.acquire()
+    try:
+      if self.http_client.connection_pool is not None:
+        return None
+      connection_pool = atom.http_core.ConnectionPool(
+          max_idle_per_host=max_idle_per_host)
+      self.http_client.connection_pool = connection_pool
+      return connection_pool
+    finally:
+      _lazy_init_lock.release()
+
+  def _return_connection_pool(self, connection_pool):
+    """Takes back a pool from _borrow_connection_pool and closes it."""
+    if connection_pool is None:
+      return
+    _lazy_init_lock.acquire()
+    try:
+      if getattr(self.http_client, 'connection_pool', None) is connection_pool:
+        self.http_client.connection_pool = None
+    finally:
+      _lazy_init_lock.release()
+    connection_pool.clear()
+
+  def get_feeds(self, uris, auth_token=None, converter=None,
+                desired_class=gdata.data.GDFeed, ordered=True,
+                max_workers=gdata.executor.DEFAULT_MAX_WORKERS, **kwargs):
+    """Fetches many feeds concurrently, see request_many.
+
+    Yields:
+      A gdata.executor.Result for each URI whose value is the parsed feed.
+    """
+    return self.request_many(uris, method='GET', ordered=ordered,
+                             max_workers=max_workers, auth_token=auth_token,
+                             converter=converter, desired_class=desired_class,
+                             **kwargs)
+
+  GetFeeds = get_feeds
+
+  def batch(self, operations, uri_or_feed, auth_token=None,
+            desired_class=gdata.data.BatchFeed,
+            max_entries=DEFAULT_BATCH_MAX_ENTRIES,
+            max_bytes=DEFAULT_BATCH_MAX_BYTES,
+            max_workers=gdata.executor.DEFAULT_MAX_WORKERS, **kwargs):
+    """Performs many operations using as few batch requests as possible.
+
+    The operations are split into batch feeds of at most max_entries
+    entries and max_bytes bytes, which are POSTed to the batch URL several
+    at a time using threads. Each operation is given a batch:id so that the
+    entries in the response feeds can be matched to the operations. If the
+    server stops processing a batch part way through, it marks the response
+    feed with batch:interrupted and the operations it did not get to are
+    sent again in a later batch, as long as the interrupted batch made some
+    progress.
+
+    Args:
+      operations: An iterable of (operation, entry) pairs. The operation is
+          one of gdata.data.BATCH_INSERT, BATCH_UPDATE, BATCH_DELETE or
+          BATCH_QUERY. For a delete or query, the entry may instead be the
+          entry's id URL as a str. Entries which are not BatchEntry objects
+          are converted, and the entries themselves are not modified.
+      uri_or_feed: The batch URL as a str or atom.http_core.Uri, or a feed
+          whose batch link should be used.
+      auth_token: (optional) Used to authorize every batch request.
+      desired_class: The class to which each response feed is converted,
+          defaults to gdata.data.BatchFeed. Use the service's feed class,
+          such as gdata.contacts.data.ContactsFeed, to get entries of the
+          service's entry class in the results.
+      max_entries: int The most operations to send in one batch request.
+      max_bytes: int The largest batch feed to send, in bytes.
+      max_workers: int The most batch requests in progress at once.
+
+    Any additional arguments are passed to request for every batch request.
+
+    Returns:
+      A list with a BatchResult for each operation, in the same order as
+      the operations.
+
+    Raises:
+      Error if uri_or_feed is a feed without a batch link.
+    """
+    if hasattr(uri_or_feed, 'find_batch_link'):
+      uri = uri_or_feed.find_batch_link()
+      if uri is None:
+        raise Error('The feed has no batch link')
+    else:
+      uri = uri_or_feed
+    version = get_xml_version(self.api_version)
+    results = []
+    pending = []
+    for index, (operation, entry) in enumerate(operations):
+      result = BatchResult(index, operation, entry)
+      results.append(result)
+      pending.append(
+          (result, _batch_entry_xml(operation, entry, str(index), version)))
+
+    def send_chunk(chunk):
+      http_request = atom.http_core.HttpRequest()
+      http_request.add_body_part(
+          ''.join([_BATCH_FEED_START] + [xml for result, xml in chunk]
+                  + [_BATCH_FEED_END]), 'application/atom+xml')
+      return self.request(method='POST', uri=uri, auth_token=auth_token,
+                          http_request=http_request,
+                          desired_class=desired_class, **kwargs)
+
+    connection_pool = self._borrow_connection_pool(max_workers)
+    pool = gdata.executor.ThreadPool(max_workers)
+    try:
+      while pending:
+        chunks = _chunk_batch(pending, max_entries, max_bytes)
+        pending = []
+        for outcome in pool.map(send_chunk, chunks, ordered=False):
+          pending.extend(self._match_batch_results(outcome))
+    finally:
+      pool.shutdown()
+      self._return_connection_pool(connection_pool)
+    return results
+
+  Batch = batch
+
+  def _match_batch_results(self, outcome):
+    """Fills in the BatchResults for one batch request.
+
+    Args:
+      outcome: gdata.executor.Result The Result of sending a list of
+          (BatchResult, xml) pairs.
+
+    Returns:
+      The (BatchResult, xml) pairs which should be sent again.
+    """
+    chunk = outcome.item
+    if not outcome.succeeded():
+      for result, xml in chunk:
+        result.exc_info = outcome.exc_info
+      return []
+    feed = outcome.value
+    by_id = {}
+    for result, xml in chunk:
+      by_id[str(result.index)] = result
+    answered = 0
+    for entry in feed.entry:
+      if entry.batch_id is None or entry.batch_id.text is None:
+        continue
+      result = by_id.get(entry.batch_id.text.strip())
+      if result is None or result.response is not None:
+        continue
+      answered += 1
+      result.response = entry
+      if entry.batch_status is not None:
+        if entry.batch_status.code is not None:
+          result.code = int(entry.batch_status.code)
+        result.reason = entry.batch_status.reason
+    remainder = [(result, xml) for result, xml in chunk
+                 if result.response is None]
+    if feed.interrupted is not None and answered and remainder:
+      return remainder
+    if feed.interrupted is not None:
+      reason = 'Batch interrupted: %s' % feed.interrupted.reason
+    else:
+      reason = 'No response entry for this operation'
+    for result, xml in remainder:
+      result.reason = reason
+    return []
 
   # TODO: add a refresh method to request a conditional update to an entry
   # or feed.
 
 
+# GDClient members which AsyncGDClient.request does not apply.
+_UNSUPPORTED_ASYNC_MEMBERS = ('throttler', 'retry_policy', 'response_cache',
+                              'single_flight')
+
+
+class AsyncGDClient(GDClient):
+  """A GDClient which sends requests without waiting for the responses.
+
+  The request method, and the CRUD methods built on it such as get_feed,
+  get_entry, get_next, post, update and delete, return an
+  atom.http_async.AsyncResult instead of the converted response. Requests
+  are built exactly as in GDClient (modify_request, the auth token and any
+  Query objects) and responses are converted, mapped to exceptions and
+  gsessionid redirects followed in the same way. The value is obtained by
+  calling result() on the returned object, which runs the event loop until
+  the response has arrived, or by registering a function with
+  add_done_callback.
+
+  All requests share the async_http_client, which keeps connections open to
+  each server and can have thousands of requests in flight from one thread.
+  It opens at most max_connections_per_host connections to each server (10
+  by default) and queues the other requests, so pass an AsyncHttpClient with
+  a higher limit to have more requests to one server in flight at once.
+  The auth helpers which talk to the Google Accounts servers (client_login,
+  upgrade_token, get_oauth_token and so on) still use the blocking
+  http_client.
+
+  The throttler, retry_policy, response_cache and single_flight members are
+  not supported and request raises NotImplementedError if any of them is
+  set. The thread based helpers request_many, get_feeds, batch and
+  get_entries_parallel also raise NotImplementedError; start the requests
+  directly and collect the AsyncResults instead.
+  """
+
+  def __init__(self, async_http_client=None, **kwargs):
+    """Creates a new AsyncGDClient.
+
+    Args:
+      async_http_client: atom.http_async.AsyncHttpClient (optional) The
+          client used to send requests. A new one is created if not given.
+      kwargs: The other parameters to pass to the GDClient constructor.
+    """
+    GDClient.__init__(self, **kwargs)
+    self.async_http_client = (async_http_client
+                              or atom.http_async.AsyncHttpClient())
+
+  def request(self, method=None, uri=None, auth_token=None,
+              http_request=None, converter=None, desired_class=None,
+              redirects_remaining=4, headers=None, **kwargs):
+    """Starts an HTTP request and returns an AsyncResult for the outcome.
+
+    Takes the same arguments as GDClient.request. Errors raised while
+    processing the response, such as RequestError, are raised when
+    result() is called on the returned object.
+
+    Raises:
+      NotImplementedError if throttler, retry_policy, response_cache or
+      single_flight is set, since their behavior is not applied here.
+    """
+    for name in _UNSUPPORTED_ASYNC_MEMBERS:
+      if getattr(self, name) is not None:
+        raise NotImplementedError(
+            'AsyncGDClient does not support %s, set it to None' % name)
+    uri = _copy_uri(uri)
+    self._apply_session_id(uri, http_request)
+    prepared = self._prepare_request(method=method, uri=uri,
+        auth_token=auth_token, http_request=http_request, **kwargs)
+    if headers:
+      prepared.headers.update(headers)
+
+    def process(response):
+      if response.status == 302:
+        self._handle_redirect(response, redirects_remaining)
+        self._forget_session_id(uri, http_request)
+        return self.request(method=method, uri=uri, auth_token=auth_token,
+                            http_request=http_request, converter=converter,
+                            desired_class=desired_class,
+                            redirects_remaining=redirects_remaining-1,
+                            headers=headers, **kwargs)
+      return self._process_response(response, converter, desired_class)
+
+    return atom.http_async.chain(
+        self.async_http_client.request(prepared),
+        atom.http_async.AsyncResult(self.async_http_client), process)
+
+  Request = request
+
+  def _not_supported(self, *args, **kwargs):
+    raise NotImplementedError(
+        'AsyncGDClient does not support the thread based request_many, '
+        'get_feeds, batch and get_entries_parallel; start the requests '
+        'directly and call result() on the AsyncResults')
+
+  request_many = RequestMany = _not_supported
+  get_feeds = GetFeeds = _not_supported
+  batch = Batch = _not_supported
+  get_entries_parallel = GetEntriesParallel = _not_supported
+
+  def iter_feeds(self, uri, auth_token=None, desired_class=gdata.data.GDFeed,
+                 **kwargs):
+    """Yields every page of a feed by following the next links.
+
+    The request for the next page is sent as soon as the current page has
+    arrived, so it downloads while the caller processes the current page.
+    Other requests started on this client make progress while waiting.
+    """
+    pending = self.get_feed(uri, auth_token=auth_token,
+                            desired_class=desired_class, **kwargs)
+    while pending is not None:
+      feed = pending.result()
+      next_link = feed.find_next_link()
+      if next_link is not None:
+        pending = self.get_feed(next_link, auth_token=auth_token,
+                                desired_class=feed.__class__)
+      else:
+        pending = None
+      yield feed
+
+  IterFeeds = iter_feeds
+
+  def iter_entries(self, uri, auth_token=None,
+                   desired_class=gdata.data.GDFeed, **kwargs):
+    """Yields the entries from every page of a feed, see iter_feeds."""
+    for feed in self.iter_feeds(uri, auth_token=auth_token,
+                                desired_class=desired_class, **kwargs):
+      for entry in feed.entry:
+        yield entry
+
+  IterEntries = iter_entries
+
+  def get_entries(self, uri, auth_token=None, desired_class=gdata.data.GDFeed,
+                  prefetch=1, **kwargs):
+    """Yields the entries from every page of a feed, see iter_entries.
+
+    The next page is always requested as soon as the current page arrives,
+    so prefetch is ignored.
+    """
+    return self.iter_entries(uri, auth_token=auth_token,
+                             desired_class=desired_class, **kwargs)
+
+  GetEntries = get_entries
+
+  def run(self):
+    """Runs the event loop until all started requests have completed."""
+    self.async_http_client.run()
+
+  Run = run
+
+
 def _add_query_param(param_string, value, http_request):
   if value:
     http_request.uri.query[param_string] = value
@@ -761,7 +1940,7 @@ class Query(object):
   def __init__(self, text_query=None, categories=None, author=None, alt=None,
                updated_min=None, updated_max=None, pretty_print=False,
                published_min=None, published_max=None, start_index=None,
-               max_results=None, strict=False):
+               max_results=None, strict=False, fields=None):
     """Constructs a Google Data Query to filter feed contents serverside.
 
     Args:
@@ -807,6 +1986,10 @@ class Query(object):
       strict: boolean (optional) If True, the server will return an error if
           the server does not recognize any of the parameters in the request
           URL. Defaults to False.
+      fields: str (optional) Asks the server for a partial response
+          containing only the selected elements, for example
+          'entry(title,gd:email)'. See
+          http://code.google.com/apis/gdata/docs/2.0/reference.html#PartialResponse
     """
     self.text_query = text_query
     self.categories = categories or []
@@ -820,6 +2003,7 @@ class Query(object):
     self.start_index = start_index
     self.max_results = max_results
     self.strict = strict
+    self.fields = fields
 
   def modify_request(self, http_request):
     _add_query_param('q', self.text_query, http_request)
@@ -839,6 +2023,7 @@ class Query(object):
       http_request.uri.query['max-results'] = str(self.max_results)
     if self.strict:
       http_request.uri.query['strict'] = 'true'
+    _add_query_param('fields', self.fields, http_request)
 
 
   ModifyRequest = modify_request
@@ -739,3 +739,17 @@ def ProfilesFeedFromString(xml_string):
   """
   return atom.CreateClassFromXMLString(ProfilesFeed, xml_string)
 
+
+# Kind category terms used by the Contacts API.
+CONTACT_KIND = 'http://schemas.google.com/contact/2008#contact'
+GROUP_KIND = 'http://schemas.google.com/contact/2008#group'
+PROFILE_KIND = 'http://schemas.google.com/contact/2008#profile'
+
+# Chooses Contacts classes for responses which ContactsService receives.
+ROOT_REGISTRY = gdata.RootRegistry(parent=gdata.ROOT_REGISTRY)
+ROOT_REGISTRY.Register(ContactsFeed, kind=CONTACT_KIND)
+ROOT_REGISTRY.Register(ContactEntry, kind=CONTACT_KIND)
+ROOT_REGISTRY.Register(GroupsFeed, kind=GROUP_KIND)
+ROOT_REGISTRY.Register(GroupEntry, kind=GROUP_KIND)
+ROOT_REGISTRY.Register(ProfilesFeed, kind=PROFILE_KIND)
+ROOT_REGISTRY.Register(ProfileEntry, kind=PROFILE_KIND)
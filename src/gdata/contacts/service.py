@@ -29,6 +29,7 @@ __author__ = 'dbrattli (Dag Brattli)'
 
 import gdata
 import gdata.calendar
+import gdata.contacts
 import gdata.service
 
 
@@ -51,6 +52,8 @@ class RequestError(Error):
 class ContactsService(gdata.service.GDataService):
   """Client for the Google Contacts service."""
 
+  root_registry = gdata.contacts.ROOT_REGISTRY
+
   def __init__(self, email=None, password=None, source=None,
                server='www.google.com', additional_headers=None,
                contact_list='default', **kwargs):
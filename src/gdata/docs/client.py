@@ -53,6 +53,36 @@ class DocsClient(gdata.client.GDClient):
     """
     gdata.client.GDClient.__init__(self, auth_token=auth_token, **kwargs)
 
+  def get_file_body(self, uri, auth_token=None,
+                    max_size=atom.http_core.DEFAULT_SPOOL_SIZE, **kwargs):
+    """Fetches the file content from the specified uri as a spooled body.
+
+    Files up to max_size bytes are kept in memory, larger files are written
+    to a temporary file as they are downloaded so that big exports do not
+    need to fit in memory.
+
+    Args:
+      uri: str The full URL to fetch the file contents from.
+      auth_token: (optional) gdata.gauth.ClientLoginToken, AuthSubToken, or
+          OAuthToken which authorizes this client to edit the user's data.
+      max_size: int (optional) The largest file which will be held in memory.
+      kwargs: Other parameters to pass to self.request().
+
+    Returns:
+      An atom.http_core.SpooledBody positioned at the start of the file.
+
+    Raises:
+      gdata.client.RequestError: on error response from server.
+    """
+    server_response = self.request('GET', uri, auth_token=auth_token, **kwargs)
+    if server_response.status != 200:
+      raise  gdata.client.RequestError, {'status': server_response.status,
+                                         'reason': server_response.reason,
+                                         'body': server_response.read()}
+    return atom.http_core.spool_response(server_response, max_size)
+
+  GetFileBody = get_file_body
+
   def get_file_content(self, uri, auth_token=None, **kwargs):
     """Fetches the file content from the specified uri.
 
@@ -72,12 +102,11 @@ class DocsClient(gdata.client.GDClient):
     Raises:
       gdata.client.RequestError: on error response from server.
     """
-    server_response = self.request('GET', uri, auth_token=auth_token, **kwargs)
-    if server_response.status != 200:
-      raise  gdata.client.RequestError, {'status': server_response.status,
-                                         'reason': server_response.reason,
-                                         'body': server_response.read()}
-    return server_response.read()
+    body = self.get_file_body(uri, auth_token=auth_token, **kwargs)
+    try:
+      return body.read()
+    finally:
+      body.close()
 
   GetFileContent = get_file_content
 
@@ -91,19 +120,19 @@ class DocsClient(gdata.client.GDClient):
       file_path: str The full path to save the file to.
       auth_token: (optional) gdata.gauth.ClientLoginToken, AuthSubToken, or
           OAuthToken which authorizes this client to edit the user's data.
-      kwargs: Other parameters to pass to self.get_file_content().
+      kwargs: Other parameters to pass to self.get_file_body().
 
     Raises:
       gdata.client.RequestError: on error response from server.
     """
+    body = self.get_file_body(uri, auth_token=auth_token, **kwargs)
     f = open(file_path, 'wb')
     try:
-      f.write(self.get_file_content(uri, auth_token=auth_token, **kwargs))
-    except gdata.client.RequestError, e:
+      body.copy_to(f)
+      f.flush()
+    finally:
       f.close()
-      raise e
-    f.flush()
-    f.close()
+      body.close()
 
   _DownloadFile = _download_file
 
@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# This module is used for version 2 of the Google Data APIs.
+
+
+"""Runs independent tasks, such as HTTP requests, on a pool of threads.
+
+  ThreadPool: a fixed number of worker threads which map a function over
+      a sequence of items.
+  Result: the value returned, or the exception raised, for one item.
+  SingleFlight: lets concurrent callers with the same key share one call.
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import sys
+import threading
+import Queue
+
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class Result(object):
+  """The outcome of calling the task function with one item.
+
+  Attributes:
+    index: int The position of the item in the input sequence.
+    item: The item which was passed to the task function.
+    value: The return value of the task function, None if it raised.
+    exc_info: The (type, value, traceback) tuple from sys.exc_info if the
+        task function raised an exception, otherwise None.
+  """
+
+  def __init__(self, index, item, value=None, exc_info=None):
+    self.index = index
+    self.item = item
+    self.value = value
+    self.exc_info = exc_info
+
+  def succeeded(self):
+    return self.exc_info is None
+
+  Succeeded = succeeded
+
+  def _get_exception(self):
+    if self.exc_info is None:
+      return None
+    return self.exc_info[1]
+
+  exception = property(_get_exception)
+
+  def get(self):
+    """Returns the value, or re-raises the exception from the task."""
+    if self.exc_info is not None:
+      raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+    return self.value
+
+  Get = get
+
+
+_STOP = object()
+
+
+class ThreadPool(object):
+  """Calls a function for many items using a fixed number of threads.
+
+  Worker threads are started on first use and run until shutdown is called.
+  They are daemon threads so an abandoned pool does not keep the process
+  alive.
+  """
+
+  def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+    if max_workers < 1:
+      raise ValueError('max_workers must be at least 1')
+    self.max_workers = max_workers
+    self._tasks = Queue.Queue()
+    self._workers = []
+    self._lock = threading.Lock()
+
+  def _start_workers(self):
+    self._lock.acquire()
+    try:
+      while len(self._workers) < self.max_workers:
+        worker = threading.Thread(target=self._work)
+        worker.setDaemon(True)
+        worker.start()
+        self._workers.append(worker)
+    finally:
+      self._lock.release()
+
+  def _work(self):
+    while True:
+      task = self._tasks.get()
+      if task is _STOP:
+        return
+      function, index, item, results = task
+      try:
+        results.put(Result(index, item, value=function(item)))
+      except Exception:
+        results.put(Result(index, item, exc_info=sys.exc_info()))
+
+  def map(self, function, items, ordered=True):
+    """Calls function once for each item and yields a Result for each.
+
+    At most max_workers calls run at the same time and the items are read
+    from the iterable only as workers become free, so items may be a
+    generator. An exception raised by function is captured in the Result
+    for that item rather than stopping the other calls.
+
+    Args:
+      function: A callable which takes a single item.
+      items: An iterable of items.
+      ordered: boolean If True (the default) the Results are yielded in the
+          same order as the items. An item is only started once it is
+          fewer than max_workers items after the next Result to yield, so
+          a slow call holds back at most max_workers - 1 finished Results.
+          If False, each Result is yielded as soon as its call completes.
+
+    Yields:
+      Result objects.
+    """
+    self._start_workers()
+    results = Queue.Queue()
+    items = iter(items)
+    in_flight = 0
+    next_index = 0
+    next_to_yield = 0
+    finished = {}
+    exhausted = False
+    while True:
+      while (not exhausted and in_flight < self.max_workers and
+             (not ordered or next_index < next_to_yield + self.max_workers)):
+        try:
+          item = items.next()
+        except StopIteration:
+          exhausted = True
+          break
+        self._tasks.put((function, next_index, item, results))
+        next_index += 1
+        in_flight += 1
+      if in_flight == 0:
+        return
+      result = results.get()
+      in_flight -= 1
+      if not ordered:
+        yield result
+        continue
+      finished[result.index] = result
+      while next_to_yield in finished:
+        yield finished.pop(next_to_yield)
+        next_to_yield += 1
+
+  Map = map
+
+  def shutdown(self, wait=False):
+    """Stops the worker threads once they finish their current tasks.
+
+    Args:
+      wait: boolean If True, waits until the workers have run every task
+          already queued, including those left by a map which was not
+          read to the end, and have stopped.
+    """
+    self._lock.acquire()
+    try:
+      workers = self._workers
+      self._workers = []
+    finally:
+      self._lock.release()
+    for worker in workers:
+      self._tasks.put(_STOP)
+    if wait:
+      for worker in workers:
+        worker.join()
+
+  Shutdown = shutdown
+
+
+class _Flight(object):
+  """A call in progress and the callers waiting for it."""
+
+  def __init__(self, leader):
+    self.leader = leader
+    self.done = threading.Event()
+    self.result = None
+
+
+class SingleFlight(object):
+  """Runs one call at a time per key, sharing its outcome with late callers.
+
+  If a thread calls do with a key while another thread's call with an equal
+  key is in progress, it waits for that call and receives the same return
+  value, or the same exception, instead of making its own call. Calls made
+  once the first has finished run afresh; nothing is cached.
+
+  The calls and shared members count the calls which were made and the
+  callers which shared another's call.
+  """
+
+  def __init__(self):
+    self.calls = 0
+    self.shared = 0
+    self._flights = {}
+    self._lock = threading.Lock()
+
+  def do(self, key, function):
+    """Returns function(), or the result of an equal call in progress.
+
+    Args:
+      key: A hashable value. Calls with equal keys must be interchangeable.
+      function: A callable which takes no arguments.
+    """
+    current = threading.currentThread()
+    self._lock.acquire()
+    try:
+      flight = self._flights.get(key)
+      if flight is None:
+        flight = _Flight(current)
+        self._flights[key] = flight
+        self.calls += 1
+        leader = True
+      elif flight.leader is current:
+        # The function has called itself with the same key, as when a
+        # request is redirected to the same URL. Waiting would deadlock.
+        leader = None
+      else:
+        self.shared += 1
+        leader = False
+    finally:
+      self._lock.release()
+    if leader is None:
+      return function()
+    if not leader:
+      flight.done.wait()
+      return flight.result.get()
+    try:
+      try:
+        flight.result = Result(0, key, value=function())
+      except:
+        flight.result = Result(0, key, exc_info=sys.exc_info())
+    finally:
+      self._lock.acquire()
+      try:
+        del self._flights[key]
+      finally:
+        self._lock.release()
+      flight.done.set()
+    return flight.result.get()
+
+  Do = do
@@ -48,6 +48,7 @@ ae_save
 
 import time
 import random
+import threading
 import urllib
 import atom.http_core
 
@@ -437,15 +438,108 @@ def build_auth_sub_data(http_request, timestamp, nonce):
                           str(timestamp), nonce)
 
 
-def generate_signature(data, rsa_key):
-  """Signs the data string for a secure AuthSub request."""
-  import base64
+# The most parsed RSA private keys which an RsaKeyCache keeps by default.
+DEFAULT_MAX_RSA_KEYS = 16
+
+
+class RsaKeyCache(object):
+  """Keeps parsed RSA private keys so that each key is parsed only once.
+
+  Parsing a PEM key means decoding base64 and ASN.1 and building big
+  integers, which can take longer than the signature itself. Keys are held
+  by the SHA-1 digest of the key string, so the cache does not keep a second
+  copy of each PEM string. Once max_keys keys are held, the least recently
+  used key is dropped.
+
+  A parsed key changes its blinding values with each signature, so sign
+  with the sign method, which lets one thread use a key at a time, rather
+  than with a key returned by get.
+
+  The hits and misses members count the lookups which found a parsed key
+  and those which had to parse one.
+  """
+
+  def __init__(self, max_keys=DEFAULT_MAX_RSA_KEYS):
+    self.max_keys = max_keys
+    self.hits = 0
+    self.misses = 0
+    self._keys = {}
+    # The digests of the keys, least recently used first.
+    self._order = []
+    self._lock = threading.Lock()
+
+  def _get_entry(self, rsa_key):
+    try:
+      import hashlib
+      digest = hashlib.sha1(rsa_key).digest()
+    except ImportError:
+      import sha
+      digest = sha.new(rsa_key).digest()
+    self._lock.acquire()
+    try:
+      entry = self._keys.get(digest)
+      if entry is not None:
+        # Move the key to the most recently used end.
+        self._order.remove(digest)
+        self._order.append(digest)
+        self.hits += 1
+        return entry
+      self.misses += 1
+    finally:
+      self._lock.release()
+    # Parse outside the lock so that other keys can be looked up meanwhile.
+    entry = (_parse_private_key(rsa_key), threading.Lock())
+    self._lock.acquire()
+    try:
+      # If another thread parsed the same key meanwhile, use its copy.
+      if digest in self._keys:
+        return self._keys[digest]
+      self._keys[digest] = entry
+      self._order.append(digest)
+      while len(self._order) > self.max_keys:
+        del self._keys[self._order.pop(0)]
+      return entry
+    finally:
+      self._lock.release()
+
+  def get(self, rsa_key):
+    """Returns the parsed private key for a PEM or XML key string."""
+    return self._get_entry(rsa_key)[0]
+
+  def sign(self, rsa_key, data):
+    """Returns the PKCS #1 SHA-1 signature of data as an array of bytes."""
+    private_key, key_lock = self._get_entry(rsa_key)
+    key_lock.acquire()
+    try:
+      return private_key.hashAndSign(data)
+    finally:
+      key_lock.release()
+
+  def clear(self):
+    self._lock.acquire()
+    try:
+      self._keys.clear()
+      del self._order[:]
+    finally:
+      self._lock.release()
+
+
+def _parse_private_key(rsa_key):
   try:
     from tlslite.utils import keyfactory
   except ImportError:
     from gdata.tlslite.utils import keyfactory
-  private_key = keyfactory.parsePrivateKey(rsa_key)
-  signed = private_key.hashAndSign(data)
+  return keyfactory.parsePrivateKey(rsa_key)
+
+
+# Shared by all of the RSA token classes and by gdata.oauth.rsa.
+rsa_key_cache = RsaKeyCache()
+
+
+def generate_signature(data, rsa_key):
+  """Signs the data string for a secure AuthSub request."""
+  import base64
+  signed = rsa_key_cache.sign(rsa_key, data)
   # Python2.3 and lower does not have the base64.b64encode function.
   if hasattr(base64, 'b64encode'):
     return base64.b64encode(signed)
@@ -626,16 +720,11 @@ def generate_rsa_signature(http_request, consumer_key, rsa_key,
                            timestamp, nonce, version, next='oob',
                            token=None, token_secret=None, verifier=None):
   import base64
-  try:
-    from tlslite.utils import keyfactory
-  except ImportError:
-    from gdata.tlslite.utils import keyfactory
   base_string = build_oauth_base_string(
       http_request, consumer_key, nonce, RSA_SHA1, timestamp, version,
       next, token, verifier=verifier)
-  private_key = keyfactory.parsePrivateKey(rsa_key)
   # Sign using the key
-  signed = private_key.hashAndSign(base_string)
+  signed = rsa_key_cache.sign(rsa_key, base_string)
   # Python2.3 does not have base64.b64encode.
   if hasattr(base64, 'b64encode'):
     return base64.b64encode(signed)
@@ -9,6 +9,7 @@ import binascii
 
 from gdata.tlslite.utils import keyfactory
 from gdata.tlslite.utils import cryptomath
+import gdata.gauth
 
 # XXX andy: ugly local import due to module name, oauth.oauth
 import gdata.oauth as oauth
@@ -51,14 +52,12 @@ class OAuthSignatureMethod_RSA_SHA1(oauth.OAuthSignatureMethod):
     # Fetch the private key cert based on the request
     cert = self._fetch_private_cert(oauth_request)
 
-    # Pull the private key from the certificate
-    privatekey = keyfactory.parsePrivateKey(cert)
-    
     # Convert base_string to bytes
     #base_string_bytes = cryptomath.createByteArraySequence(base_string)
     
-    # Sign using the key
-    signed = privatekey.hashAndSign(base_string)
+    # Sign using the private key from the certificate, which is parsed once
+    # and then kept in the cache shared with gdata.gauth.
+    signed = gdata.gauth.rsa_key_cache.sign(cert, base_string)
   
     return binascii.b2a_base64(signed)[:-1]
   
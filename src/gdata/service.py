@@ -60,7 +60,9 @@
 
 __author__ = 'api.jscudder (Jeffrey Scudder)'
 
-import re
+import Queue
+import sys
+import threading
 import urllib
 import urlparse
 try:
@@ -76,10 +78,13 @@ except ImportError:
 import atom.service
 import gdata
 import atom
+import atom.http_core
 import atom.http_interface
 import atom.token_store
+import atom.url
 import gdata.auth
 import gdata.gauth
+import gdata.sessions
 
 
 AUTH_SERVER_HOST = 'https://www.google.com'
@@ -102,6 +107,8 @@ CLIENT_LOGIN_SCOPES = gdata.gauth.AUTH_SCOPES
 DEFAULT_NUM_RETRIES = 3
 DEFAULT_DELAY = 1
 DEFAULT_BACKOFF = 2
+# Guards the creation of each service's gdata.sessions.SessionIdCache.
+_session_ids_lock = threading.Lock()
 
 
 def lookup_scopes(service_name):
@@ -195,6 +202,16 @@ class GDataService(atom.service.AtomService):
   auth_token = None
   # The tokens dict is deprecated in favor of the token_store.
   tokens = None
+  # A gdata.throttle.Throttler which limits the rate and concurrency of
+  # requests to each host. If None, requests are sent right away.
+  throttler = None
+  # A gdata.sessions.SessionIdCache with the gsessionids which Google
+  # Calendar uses to prevent redirects. Created when first needed.
+  session_ids = None
+  # A gdata.RootRegistry which chooses the class that responses are parsed
+  # into when no converter is given. Services may register their own
+  # classes with a registry whose parent is gdata.ROOT_REGISTRY.
+  root_registry = gdata.ROOT_REGISTRY
 
   def __init__(self, email=None, password=None, account_type='HOSTED_OR_GOOGLE',
                service=None, auth_service_url=None, source=None, server=None, 
@@ -245,15 +262,77 @@ class GDataService(atom.service.AtomService):
     self.__SetSource(source)
     self.__captcha_token = None
     self.__captcha_url = None
-    self.__gsessionid = None
 
     if http_request_handler.__name__ == 'gdata.urlfetch':
       import gdata.alt.appengine
       self.http_client = gdata.alt.appengine.AppEngineHttpClient()
 
+  def request(self, operation, url, data=None, headers=None,
+      url_params=None):
+    """Performs the HTTP request, first waiting if a throttler is set.
+
+    See atom.service.AtomService.request for a description of the arguments.
+    """
+    if self.throttler is None:
+      return atom.service.AtomService.request(self, operation, url,
+          data=data, headers=headers, url_params=url_params)
+    if isinstance(url, atom.url.Url):
+      host = url.host
+    elif url.startswith('http'):
+      host = atom.url.parse_url(url).host
+    else:
+      host = self.server
+    throttle = self.throttler.get(host)
+    start = throttle.start()
+    try:
+      response = atom.service.AtomService.request(self, operation, url,
+          data=data, headers=headers, url_params=url_params)
+    except Exception:
+      exc_info = sys.exc_info()
+      throttle.finish(start, error=exc_info[1])
+      raise exc_info[0], exc_info[1], exc_info[2]
+    throttle.finish(start, status=response.status)
+    return response
+
   def _SetSessionId(self, session_id):
     """Used in unit tests to simulate a 302 which sets a gsessionid."""
-    self.__gsessionid = session_id
+    self._GetSessionIds().default = session_id
+
+  def _GetSessionIds(self):
+    if self.session_ids is None:
+      _session_ids_lock.acquire()
+      try:
+        if self.session_ids is None:
+          self.session_ids = gdata.sessions.SessionIdCache()
+      finally:
+        _session_ids_lock.release()
+    return self.session_ids
+
+  def __GetHostAndPath(self, uri):
+    if uri.startswith('http'):
+      url = atom.url.parse_url(uri)
+      return url.host, url.path
+    return self.server, uri
+
+  def __GetSessionId(self, uri):
+    """Returns the gsessionid to add to the URI, or None if it has one."""
+    if uri.find('gsessionid=') >= 0:
+      return None
+    host, path = self.__GetHostAndPath(uri)
+    return self._GetSessionIds().get(host, path)
+
+  def __StoreRedirectSessionId(self, location, url_params=None):
+    """Remembers the gsessionid in a redirect's Location, if there is one.
+
+    The gsessionid is removed from url_params so that the one in the
+    Location is sent when the redirect is followed.
+    """
+    session_id = gdata.sessions.find_session_id(location)
+    if session_id is not None:
+      if url_params is not None:
+        url_params.pop('gsessionid', None)
+      host, path = self.__GetHostAndPath(location)
+      self._GetSessionIds().redirected(host, path, session_id)
  
   # Define properties for GDataService
   def _SetAuthSubToken(self, auth_token, scopes=None):
@@ -314,25 +393,101 @@ class GDataService(atom.service.AtomService):
   def GetGeneratorFromLinkFinder(self, link_finder, func, 
                                  num_retries=DEFAULT_NUM_RETRIES,
                                  delay=DEFAULT_DELAY,
-                                 backoff=DEFAULT_BACKOFF):
-    """returns a generator for pagination"""
-    yield link_finder
-    next = link_finder.GetNextLink()
-    while next is not None:
-      next_feed = func(str(self.GetWithRetries(
-            next.href, num_retries=num_retries, delay=delay, backoff=backoff)))
-      yield next_feed
-      next = next_feed.GetNextLink()
-
-  def _GetElementGeneratorFromLinkFinder(self, link_finder, func,
-                                        num_retries=DEFAULT_NUM_RETRIES,
-                                        delay=DEFAULT_DELAY,
-                                        backoff=DEFAULT_BACKOFF):
-    for element in self.GetGeneratorFromLinkFinder(link_finder, func,
-                                                   num_retries=num_retries,
-                                                   delay=delay,
-                                                   backoff=backoff).entry:
-      yield element
+                                 backoff=DEFAULT_BACKOFF, prefetch=0):
+    """Returns a generator which yields every page of a feed.
+
+    Yields link_finder, then each page reached by following next links.
+    Each page is parsed once, by func.
+
+    Args:
+      link_finder: The first page, usually a feed, with a GetNextLink method.
+      func: function which converts the XML of a page into the desired
+          class, for example gdata.apps.UserFeedFromString.
+      num_retries, delay, backoff: Passed to GetWithRetries for each page.
+          If num_retries is None, each page is requested once with Get, so
+          that errors are raised as RequestError without waiting.
+      prefetch: int (optional) The most pages to download, on a background
+          thread, ahead of the page the caller is using. If 0, the default,
+          each page is requested once the caller asks for it.
+    """
+    if prefetch < 1:
+      yield link_finder
+      next = link_finder.GetNextLink()
+      while next is not None:
+        next_feed = self._GetNextPage(next.href, func,
+                                      (num_retries, delay, backoff))
+        yield next_feed
+        next = next_feed.GetNextLink()
+      return
+    pages = Queue.Queue()
+    slots = threading.Semaphore(prefetch)
+    stop = threading.Event()
+    fetcher = threading.Thread(target=self._FetchPages, args=(
+        link_finder, func, (num_retries, delay, backoff), pages, slots, stop))
+    fetcher.setDaemon(True)
+    # The next pages are downloaded while the caller reads the first.
+    fetcher.start()
+    try:
+      yield link_finder
+      while True:
+        next_feed, exc_info = pages.get()
+        slots.release()
+        if exc_info is not None:
+          raise exc_info[0], exc_info[1], exc_info[2]
+        if next_feed is None:
+          return
+        yield next_feed
+    finally:
+      stop.set()
+      # Wake the fetcher if it is waiting for a slot so that it can exit.
+      slots.release()
+
+  def _FetchPages(self, link_finder, func, retry_args, pages, slots, stop):
+    """Puts (feed, exc_info) pairs for the pages after link_finder in pages.
+
+    A slot is taken before each page is requested and the reader gives it
+    back when it takes the page from the queue. The end of the feed is
+    marked with (None, None).
+    """
+    try:
+      next = link_finder.GetNextLink()
+      while next is not None:
+        slots.acquire()
+        if stop.isSet():
+          return
+        next_feed = self._GetNextPage(next.href, func, retry_args)
+        pages.put((next_feed, None))
+        next = next_feed.GetNextLink()
+      pages.put((None, None))
+    except Exception:
+      pages.put((None, sys.exc_info()))
+
+  def _GetNextPage(self, uri, func, retry_args):
+    num_retries, delay, backoff = retry_args
+    if num_retries is None:
+      return self.Get(uri, converter=func)
+    return self.GetWithRetries(uri, converter=func, num_retries=num_retries,
+                               delay=delay, backoff=backoff)
+
+  def GetEntryGeneratorFromLinkFinder(self, link_finder, func,
+                                      num_retries=DEFAULT_NUM_RETRIES,
+                                      delay=DEFAULT_DELAY,
+                                      backoff=DEFAULT_BACKOFF, prefetch=0):
+    """Returns a generator which yields every entry on every page of a feed.
+
+    Takes the same arguments as GetGeneratorFromLinkFinder. Pages are
+    fetched as the entries are consumed, at most prefetch pages ahead, and
+    no page is kept once its entries have been yielded, so memory use does
+    not grow with the size of the feed.
+    """
+    for page in self.GetGeneratorFromLinkFinder(link_finder, func,
+                                                num_retries=num_retries,
+                                                delay=delay, backoff=backoff,
+                                                prefetch=prefetch):
+      for element in page.entry:
+        yield element
+
+  _GetElementGeneratorFromLinkFinder = GetEntryGeneratorFromLinkFinder
 
   def GetOAuthInputParameters(self):
     return self._oauth_input_params
@@ -961,6 +1116,9 @@ class GDataService(atom.service.AtomService):
     by default in Python2.2.
 
     Args:
+      uri, extra_headers, redirects_remaining, encoding, converter: Passed
+          to Get. Pass the converter for the desired class rather than
+          converting the returned object, so the response is parsed once.
       num_retries: Integer; the retry count.
       delay: Integer; the initial delay for retrying.
       backoff: Integer; how much the delay should lengthen after each failure.
@@ -1049,7 +1207,8 @@ class GDataService(atom.service.AtomService):
 
     Returns:
       If there is no ResultsTransformer specified in the call, a GDataFeed 
-      or GDataEntry depending on which is sent from the server. If the 
+      or GDataEntry depending on which is sent from the server, or the
+      class which root_registry has for the response. If the 
       response is niether a feed or entry and there is no ResultsTransformer,
       return a string. If there is a ResultsTransformer, the returned value 
       will be that of the ResultsTransformer function.
@@ -1058,12 +1217,12 @@ class GDataService(atom.service.AtomService):
     if extra_headers is None:
       extra_headers = {}
 
-    if self.__gsessionid is not None:
-      if uri.find('gsessionid=') < 0:
-        if uri.find('?') > -1:
-          uri += '&gsessionid=%s' % (self.__gsessionid,)
-        else:
-          uri += '?gsessionid=%s' % (self.__gsessionid,)
+    session_id = self.__GetSessionId(uri)
+    if session_id is not None:
+      if uri.find('?') > -1:
+        uri += '&gsessionid=%s' % (session_id,)
+      else:
+        uri += '?gsessionid=%s' % (session_id,)
 
     server_response = self.request('GET', uri, 
         headers=extra_headers)
@@ -1072,27 +1231,21 @@ class GDataService(atom.service.AtomService):
     if server_response.status == 200:
       if converter:
         return converter(result_body)
-      # There was no ResultsTransformer specified, so try to convert the
-      # server's response into a GDataFeed.
-      feed = gdata.GDataFeedFromString(result_body)
-      if not feed:
-        # If conversion to a GDataFeed failed, try to convert the server's
-        # response to a GDataEntry.
-        entry = gdata.GDataEntryFromString(result_body)
-        if not entry:
-          # The server's response wasn't a feed, or an entry, so return the
-          # response body as a string.
-          return result_body
-        return entry
-      return feed
+      # There was no ResultsTransformer specified, so convert the server's
+      # response into the class registered for its root element, usually a
+      # GDataFeed or a GDataEntry.
+      result = self.root_registry.Parse(result_body)
+      if result is None:
+        # The server's response wasn't a feed, or an entry, so return the
+        # response body as a string.
+        return result_body
+      return result
     elif server_response.status == 302:
       if redirects_remaining > 0:
         location = (server_response.getheader('Location')
                     or server_response.getheader('location'))
         if location is not None:
-          m = re.compile('[\?\&]gsessionid=(\w*)').search(location)
-          if m is not None:
-            self.__gsessionid = m.group(1)
+          self.__StoreRedirectSessionId(location)
           return GDataService.Get(self, location, extra_headers, redirects_remaining - 1, 
               encoding=encoding, converter=converter)
         else:
@@ -1107,15 +1260,23 @@ class GDataService(atom.service.AtomService):
       raise RequestError, {'status': server_response.status,
           'reason': server_response.reason, 'body': result_body}
 
-  def GetMedia(self, uri, extra_headers=None):
+  def GetMedia(self, uri, extra_headers=None,
+               max_size=atom.http_core.DEFAULT_SPOOL_SIZE):
     """Returns a MediaSource containing media and its metadata from the given
     URI string.
+
+    The media is read from the server into an atom.http_core.SpooledBody
+    which becomes the file_handle of the MediaSource. Media larger than
+    max_size bytes is spooled to a temporary file instead of memory.
     """
     response_handle = self.request('GET', uri,
         headers=extra_headers)
-    return gdata.MediaSource(response_handle, response_handle.getheader(
-            'Content-Type'),
-        response_handle.getheader('Content-Length'))
+    body = atom.http_core.spool_response(response_handle, max_size)
+    content_length = response_handle.getheader('Content-Length')
+    if content_length is None:
+      content_length = body.size
+    return gdata.MediaSource(body, response_handle.getheader(
+            'Content-Type'), content_length)
 
   def GetEntry(self, uri, extra_headers=None):
     """Query the GData API with the given URI and receive an Entry.
@@ -1270,14 +1431,14 @@ class GDataService(atom.service.AtomService):
       or the results of running converter on the server's result body (if
       converter was specified).
     """
-    if extra_headers is None:
-      extra_headers = {}
+    # Copy the caller's dicts since headers and the gsessionid are added to
+    # them, and they may be shared with requests made by other threads.
+    extra_headers = dict(extra_headers or {})
+    url_params = dict(url_params or {})
 
-    if self.__gsessionid is not None:
-      if uri.find('gsessionid=') < 0:
-        if url_params is None:
-          url_params = {}
-        url_params['gsessionid'] = self.__gsessionid
+    session_id = self.__GetSessionId(uri)
+    if session_id is not None:
+      url_params['gsessionid'] = session_id
 
     if data and media_source:
       if ElementTree.iselement(data):
@@ -1326,21 +1487,16 @@ class GDataService(atom.service.AtomService):
     if server_response.status == 201 or server_response.status == 200:
       if converter:
         return converter(result_body)
-      feed = gdata.GDataFeedFromString(result_body)
-      if not feed:
-        entry = gdata.GDataEntryFromString(result_body)
-        if not entry:
-          return result_body
-        return entry
-      return feed
+      result = self.root_registry.Parse(result_body)
+      if result is None:
+        return result_body
+      return result
     elif server_response.status == 302:
       if redirects_remaining > 0:
         location = (server_response.getheader('Location')
                     or server_response.getheader('location'))
         if location is not None:
-          m = re.compile('[\?\&]gsessionid=(\w*)').search(location)
-          if m is not None:
-            self.__gsessionid = m.group(1) 
+          self.__StoreRedirectSessionId(location, url_params)
           return GDataService.PostOrPut(self, verb, data, location, 
               extra_headers, url_params, escape_params, 
               redirects_remaining - 1, media_source, converter=converter)
@@ -1418,13 +1574,12 @@ class GDataService(atom.service.AtomService):
     """
     if extra_headers is None:
       extra_headers = {}
+    url_params = dict(url_params or {})
+
+    session_id = self.__GetSessionId(uri)
+    if session_id is not None:
+      url_params['gsessionid'] = session_id
 
-    if self.__gsessionid is not None:
-      if uri.find('gsessionid=') < 0:
-        if url_params is None:
-          url_params = {}
-        url_params['gsessionid'] = self.__gsessionid
- 
     server_response = self.request('DELETE', uri, 
         headers=extra_headers, url_params=url_params)
     result_body = server_response.read()
@@ -1436,9 +1591,7 @@ class GDataService(atom.service.AtomService):
         location = (server_response.getheader('Location')
                     or server_response.getheader('location'))
         if location is not None:
-          m = re.compile('[\?\&]gsessionid=(\w*)').search(location)
-          if m is not None:
-            self.__gsessionid = m.group(1) 
+          self.__StoreRedirectSessionId(location, url_params)
           return GDataService.Delete(self, location, extra_headers, 
               url_params, escape_params, redirects_remaining - 1)
         else:
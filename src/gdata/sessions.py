@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Remembers the gsessionid URL parameters which servers ask clients to use.
+
+Some services, notably Google Calendar, answer a request which lacks a
+gsessionid parameter with a 302 redirect to the same URL with the parameter
+added. The request must then be sent again, body and all. Sending the right
+gsessionid in the first place avoids the extra round trip.
+
+A client which talks to several hosts or feeds is given a different session
+for each, so a SessionIdCache keeps the session ids by host and by the
+leading segments of the URL path, such as /calendar/feeds/user@example.com.
+Both gdata.client.GDClient and gdata.service.GDataService keep one in their
+session_ids member.
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import re
+import threading
+
+
+# The number of leading path segments which identify a session, for
+# example /calendar/feeds/default.
+DEFAULT_PREFIX_SEGMENTS = 3
+
+SESSION_ID_PATTERN = re.compile('[\?\&]gsessionid=(\w*)')
+
+
+def find_session_id(url_string):
+  """Returns the gsessionid parameter in a URL string, or None."""
+  match = SESSION_ID_PATTERN.search(url_string)
+  if match is None:
+    return None
+  return match.group(1)
+
+
+class SessionIdCache(object):
+  """Maps hosts and path prefixes to the gsessionid to use for them.
+
+  A lookup for a path under a prefix without a session id of its own
+  falls back to the session id most recently stored for the host, which
+  costs no more than sending no session id at all, and then to default.
+
+  The redirects member counts the redirects which set a session id, so
+  it shows how many round trips were spent on sessions.
+  """
+
+  def __init__(self, prefix_segments=DEFAULT_PREFIX_SEGMENTS, default=None):
+    self.prefix_segments = prefix_segments
+    self.default = default
+    self.redirects = 0
+    self._ids = {}
+    self._latest = {}
+    self._lock = threading.Lock()
+
+  def _get_prefix(self, path):
+    segments = (path or '/').split('?')[0].split('/')
+    # The path starts with a slash so the first segment is empty.
+    return '/'.join(segments[:self.prefix_segments + 1])
+
+  def get(self, host, path):
+    """Returns the session id to use for a URL, or None."""
+    self._lock.acquire()
+    try:
+      session_id = self._ids.get((host, self._get_prefix(path)))
+      if session_id is None:
+        session_id = self._latest.get(host, self.default)
+      return session_id
+    finally:
+      self._lock.release()
+
+  def put(self, host, path, session_id):
+    """Records the session id which the server chose for a URL."""
+    self._lock.acquire()
+    try:
+      self._ids[(host, self._get_prefix(path))] = session_id
+      self._latest[host] = session_id
+    finally:
+      self._lock.release()
+
+  def redirected(self, host, path, session_id):
+    """Records a session id sent in a redirect, and counts the redirect."""
+    self._lock.acquire()
+    try:
+      self.redirects += 1
+    finally:
+      self._lock.release()
+    self.put(host, path, session_id)
+
+  def clear(self):
+    self._lock.acquire()
+    try:
+      self._ids.clear()
+      self._latest.clear()
+    finally:
+      self._lock.release()
+
+  Get = get
+  Put = put
+  Redirected = redirected
+  Clear = clear
@@ -20,6 +20,7 @@
 __author__ = 'e.bidelman (Eric Bidelman)'
 
 import atom.data
+import atom.http_core
 import gdata.client
 import gdata.sites.data
 import gdata.gauth
@@ -87,14 +88,16 @@ class SitesClient(gdata.client.GDClient):
     return self.post(entry, uri, media_source=media_source,
                      auth_token=auth_token, **kwargs)
 
-  def _get_file_content(self, uri):
-    """Fetches the file content from the specified URI.
+  def _get_file_body(self, uri, max_size=atom.http_core.DEFAULT_SPOOL_SIZE):
+    """Fetches the file content from the specified URI as a spooled body.
 
     Args:
       uri: string The full URL to fetch the file contents from.
+      max_size: int (optional) The largest file which will be held in memory,
+          larger attachments are spooled to a temporary file.
 
     Returns:
-      The binary file content.
+      An atom.http_core.SpooledBody positioned at the start of the file.
 
     Raises:
       gdata.client.RequestError: on error response from server.
@@ -104,7 +107,27 @@ class SitesClient(gdata.client.GDClient):
       raise  gdata.client.RequestError, {'status': server_response.status,
                                          'reason': server_response.reason,
                                          'body': server_response.read()}
-    return server_response.read()
+    return atom.http_core.spool_response(server_response, max_size)
+
+  _GetFileBody = _get_file_body
+
+  def _get_file_content(self, uri):
+    """Fetches the file content from the specified URI.
+
+    Args:
+      uri: string The full URL to fetch the file contents from.
+
+    Returns:
+      The binary file content.
+
+    Raises:
+      gdata.client.RequestError: on error response from server.
+    """
+    body = self._get_file_body(uri)
+    try:
+      return body.read()
+    finally:
+      body.close()
 
   _GetFileContent = _get_file_content
 
@@ -449,13 +472,13 @@ class SitesClient(gdata.client.GDClient):
     if isinstance(uri_or_entry, gdata.sites.data.ContentEntry):
       uri = uri_or_entry.content.src
 
+    body = self._get_file_body(uri)
     f = open(file_path, 'wb')
     try:
-      f.write(self._get_file_content(uri))
-    except gdata.client.RequestError, e:
+      body.copy_to(f)
+      f.flush()
+    finally:
       f.close()
-      raise e
-    f.flush()
-    f.close()
+      body.close()
 
   DownloadAttachment = download_attachment
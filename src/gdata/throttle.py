@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Limits how fast and how many requests are sent to each server.
+
+  TokenBucket: caps the request rate while allowing short bursts.
+  AimdController: caps the number of requests in progress. The cap grows
+      by one per round of successful requests and is cut in half whenever
+      the server shows signs of overload (additive increase, multiplicative
+      decrease), so it settles near the most the server will sustain.
+  Throttle: combines a TokenBucket and an AimdController for one server.
+  Throttler: hands out a Throttle for each host, configured per host.
+
+To use a Throttler, set the throttler member of a gdata.client.GDClient or a
+gdata.service.GDataService:
+
+  client.throttler = gdata.throttle.Throttler(
+      hosts={'docs.google.com': {'rate': 10, 'max_concurrency': 8}})
+
+Clients for different services may share a Throttler, or each may have its
+own to configure limits per service.
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import threading
+import time
+
+
+# Responses with these statuses show that the server is overloaded or that
+# a quota has been exceeded.
+DEFAULT_OVERLOAD_STATUSES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket(object):
+  """Allows at most rate operations per second on average.
+
+  Up to burst operations may run back to back after a quiet period.
+  """
+
+  # Replaced in tests to simulate the passage of time.
+  _time = staticmethod(time.time)
+  _sleep = staticmethod(time.sleep)
+
+  def __init__(self, rate, burst=None):
+    if rate <= 0:
+      raise ValueError('rate must be positive')
+    self.rate = float(rate)
+    self.burst = float(burst or max(1.0, rate))
+    self._tokens = self.burst
+    self._last = self._time()
+    self._lock = threading.Lock()
+
+  def _refill(self):
+    now = self._time()
+    self._tokens = min(self.burst,
+                       self._tokens + (now - self._last) * self.rate)
+    self._last = now
+
+  def try_acquire(self):
+    """Takes a token if one is available, returns True if it was taken."""
+    self._lock.acquire()
+    try:
+      self._refill()
+      if self._tokens >= 1:
+        self._tokens -= 1
+        return True
+      return False
+    finally:
+      self._lock.release()
+
+  def acquire(self):
+    """Takes a token, waiting until one is available."""
+    while True:
+      self._lock.acquire()
+      try:
+        self._refill()
+        if self._tokens >= 1:
+          self._tokens -= 1
+          return
+        wait = (1 - self._tokens) / self.rate
+      finally:
+        self._lock.release()
+      self._sleep(wait)
+
+  def set_rate(self, rate):
+    self._lock.acquire()
+    try:
+      self._refill()
+      self.rate = float(rate)
+    finally:
+      self._lock.release()
+
+  TryAcquire = try_acquire
+  Acquire = acquire
+  SetRate = set_rate
+
+
+class AimdController(object):
+  """Limits the number of requests in progress, adapting the limit.
+
+  Each successful request raises the limit by increase / limit, so the
+  limit grows by about increase for every limit requests. A failed request
+  multiplies the limit by decrease. Failures of requests which were started
+  before the last decrease are ignored since they reflect the old limit,
+  so a burst of errors only halves the limit once.
+
+  A request counts as failed if the caller says so or if it took longer
+  than max_latency seconds.
+  """
+
+  _time = staticmethod(time.time)
+
+  def __init__(self, initial_limit=4, min_limit=1, max_limit=64,
+               increase=1.0, decrease=0.5, max_latency=None):
+    self.limit = float(initial_limit)
+    self.min_limit = min_limit
+    self.max_limit = max_limit
+    self.increase = increase
+    self.decrease = decrease
+    self.max_latency = max_latency
+    self.in_flight = 0
+    self._last_decrease = None
+    self._condition = threading.Condition()
+
+  def acquire(self):
+    """Waits for a free slot and returns the request's start time."""
+    self._condition.acquire()
+    try:
+      while self.in_flight >= max(int(self.limit), self.min_limit):
+        self._condition.wait()
+      self.in_flight += 1
+      return self._time()
+    finally:
+      self._condition.release()
+
+  def release(self, start, failed=False):
+    """Frees the slot taken at start and adjusts the limit.
+
+    Args:
+      start: The value returned by acquire.
+      failed: boolean True if the server was overloaded.
+    """
+    now = self._time()
+    if self.max_latency is not None and now - start > self.max_latency:
+      failed = True
+    self._condition.acquire()
+    try:
+      self.in_flight -= 1
+      if failed:
+        if self._last_decrease is None or start >= self._last_decrease:
+          self.limit = max(self.min_limit, self.limit * self.decrease)
+          self._last_decrease = now
+      else:
+        self.limit = min(self.max_limit,
+                         self.limit + self.increase / self.limit)
+      self._condition.notifyAll()
+    finally:
+      self._condition.release()
+
+  Acquire = acquire
+  Release = release
+
+
+class Throttle(object):
+  """Applies a rate limit and an adaptive concurrency limit to requests.
+
+  Call start before sending a request and finish once the response status
+  is known.
+  """
+
+  def __init__(self, rate=None, burst=None, initial_concurrency=4,
+               min_concurrency=1, max_concurrency=64, max_latency=None,
+               overload_statuses=DEFAULT_OVERLOAD_STATUSES):
+    """Constructs a Throttle.
+
+    Args:
+      rate: float (optional) The most requests per second. If None, only the
+          concurrency limit applies.
+      burst: int (optional) How many requests may be sent at once after a
+          quiet period. Defaults to the rate.
+      initial_concurrency: int The concurrency limit to start from.
+      min_concurrency: int The concurrency limit never falls below this.
+      max_concurrency: int The concurrency limit never grows above this.
+      max_latency: float (optional) Responses slower than this many seconds
+          are treated as a sign of overload.
+      overload_statuses: The response statuses which are treated as a sign
+          of overload.
+    """
+    self.bucket = None
+    if rate is not None:
+      self.bucket = TokenBucket(rate, burst)
+    self.concurrency = AimdController(
+        initial_limit=initial_concurrency, min_limit=min_concurrency,
+        max_limit=max_concurrency, max_latency=max_latency)
+    self.overload_statuses = overload_statuses
+
+  def start(self):
+    """Waits until a request may be sent, returns a value for finish."""
+    start = self.concurrency.acquire()
+    if self.bucket is not None:
+      try:
+        self.bucket.acquire()
+      except:
+        self.concurrency.release(start)
+        raise
+      # Time the request from when it is sent, so that waiting for the rate
+      # limit does not count as latency.
+      start = self.concurrency._time()
+    return start
+
+  def finish(self, start, status=None, error=None):
+    """Records the outcome of a request begun with start.
+
+    Args:
+      start: The value returned by start.
+      status: int The response status, if a response was received.
+      error: The exception raised while sending the request, if any. Errors
+          such as timeouts and refused connections count as overload.
+    """
+    failed = error is not None or status in self.overload_statuses
+    self.concurrency.release(start, failed)
+
+  Start = start
+  Finish = finish
+
+
+class Throttler(object):
+  """Creates and holds one Throttle per host.
+
+  Args:
+    default: dict (optional) Keyword arguments for the Throttle of a host
+        which is not listed in hosts.
+    hosts: dict (optional) Maps host names to dicts of keyword arguments for
+        their Throttles.
+  """
+
+  def __init__(self, default=None, hosts=None):
+    self.default = default or {}
+    self.hosts = hosts or {}
+    self._throttles = {}
+    self._lock = threading.Lock()
+
+  def get(self, host):
+    """Returns the Throttle for requests to host."""
+    self._lock.acquire()
+    try:
+      throttle = self._throttles.get(host)
+      if throttle is None:
+        throttle = Throttle(**self.hosts.get(host, self.default))
+        self._throttles[host] = throttle
+      return throttle
+    finally:
+      self._lock.release()
+
+  Get = get
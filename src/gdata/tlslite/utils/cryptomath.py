@@ -252,65 +252,134 @@ def invMod(a, b):
     return 0
 
 
-if gmpyLoaded:
-    def powMod(base, power, modulus):
-        base = gmpy.mpz(base)
-        power = gmpy.mpz(power)
-        modulus = gmpy.mpz(modulus)
-        result = pow(base, power, modulus)
-        return long(result)
+# **************************************************************************
+# Modular Exponentiation
+# **************************************************************************
 
-else:
-    #Copied from Bryan G. Olson's post to comp.lang.python
-    #Does left-to-right instead of pow()'s right-to-left,
-    #thus about 30% faster than the python built-in with small bases
-    def powMod(base, power, modulus):
-        nBitScan = 5
-
-        """ Return base**power mod modulus, using multi bit scanning
-        with nBitScan bits at a time."""
-
-        #TREV - Added support for negative exponents
-        negativeResult = False
-        if (power < 0):
-            power *= -1
-            negativeResult = True
-
-        exp2 = 2**nBitScan
-        mask = exp2 - 1
-
-        # Break power into a list of digits of nBitScan bits.
-        # The list is recursive so easy to read in reverse direction.
-        nibbles = None
-        while power:
-            nibbles = int(power & mask), nibbles
-            power = power >> nBitScan
-
-        # Make a table of powers of base up to 2**nBitScan - 1
-        lowPowers = [1]
-        for i in xrange(1, exp2):
-            lowPowers.append((lowPowers[i-1] * base) % modulus)
-
-        # To exponentiate by the first nibble, look it up in the table
+def _builtinPowMod(base, power, modulus):
+    if power < 0:
+        return _invertPowMod(pow(base, -power, modulus), modulus)
+    return pow(base, power, modulus)
+
+def _gmpyPowMod(base, power, modulus):
+    base = gmpy.mpz(base)
+    power = gmpy.mpz(power)
+    modulus = gmpy.mpz(modulus)
+    result = pow(base, power, modulus)
+    return long(result)
+
+def _invertPowMod(prod, modulus):
+    prodInv = invMod(prod, modulus)
+    #Check to make sure the inverse is correct
+    if (prod * prodInv) % modulus != 1:
+        raise AssertionError()
+    return prodInv
+
+#Copied from Bryan G. Olson's post to comp.lang.python
+#Does left-to-right instead of pow()'s right-to-left, which made it
+#about 30% faster than the python built-in with small bases on old
+#interpreters. The built-in is now usually faster; see choosePowMod.
+def _legacyPowMod(base, power, modulus):
+    nBitScan = 5
+
+    """ Return base**power mod modulus, using multi bit scanning
+    with nBitScan bits at a time."""
+
+    #TREV - Added support for negative exponents
+    negativeResult = False
+    if (power < 0):
+        power *= -1
+        negativeResult = True
+
+    exp2 = 2**nBitScan
+    mask = exp2 - 1
+
+    # Break power into a list of digits of nBitScan bits.
+    # The list is recursive so easy to read in reverse direction.
+    nibbles = None
+    while power:
+        nibbles = int(power & mask), nibbles
+        power = power >> nBitScan
+
+    # Make a table of powers of base up to 2**nBitScan - 1
+    lowPowers = [1]
+    for i in xrange(1, exp2):
+        lowPowers.append((lowPowers[i-1] * base) % modulus)
+
+    # To exponentiate by the first nibble, look it up in the table
+    nib, nibbles = nibbles
+    prod = lowPowers[nib]
+
+    # For the rest, square nBitScan times, then multiply by
+    # base^nibble
+    while nibbles:
         nib, nibbles = nibbles
-        prod = lowPowers[nib]
-
-        # For the rest, square nBitScan times, then multiply by
-        # base^nibble
-        while nibbles:
-            nib, nibbles = nibbles
-            for i in xrange(nBitScan):
-                prod = (prod * prod) % modulus
-            if nib: prod = (prod * lowPowers[nib]) % modulus
-
-        #TREV - Added support for negative exponents
-        if negativeResult:
-            prodInv = invMod(prod, modulus)
-            #Check to make sure the inverse is correct
-            if (prod * prodInv) % modulus != 1:
-                raise AssertionError()
-            return prodInv
-        return prod
+        for i in xrange(nBitScan):
+            prod = (prod * prod) % modulus
+        if nib: prod = (prod * lowPowers[nib]) % modulus
+
+    #TREV - Added support for negative exponents
+    if negativeResult:
+        return _invertPowMod(prod, modulus)
+    return prod
+
+
+#The powMod backends, from most to least preferred.
+powModBackends = []
+if gmpyLoaded:
+    powModBackends.append(("gmpy", _gmpyPowMod))
+powModBackends.append(("pow", _builtinPowMod))
+powModBackends.append(("legacy", _legacyPowMod))
+
+def timePowMod(function, bits=512, rounds=5):
+    """Return the fastest of several timings of one exponentiation.
+
+    The modulus has about as many bits as each half of an RSA private key
+    operation done with the CRT, so 512 stands for a 1024-bit key.
+    """
+    import timeit
+    modulus = (1L << bits) - 1 - 2 * 3 ** 40
+    power = modulus - (1L << (bits / 2)) - 1
+    base = 3 ** 50
+    best = None
+    for count in range(rounds):
+        start = timeit.default_timer()
+        function(base, power, modulus)
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def choosePowMod(margin=0.1):
+    """Return the name of the powMod backend to use on this interpreter.
+
+    The most preferred backend is kept unless a later one is more than
+    margin (a fraction) faster, so that timing noise does not change the
+    choice from one run to the next.
+    """
+    bestName, bestTime = None, None
+    for name, function in powModBackends:
+        elapsed = timePowMod(function)
+        if bestTime is None or elapsed < bestTime * (1 - margin):
+            bestName, bestTime = name, elapsed
+    return bestName
+
+def setPowMod(name):
+    """Make powMod use the named backend from powModBackends."""
+    global powModName, _powMod
+    for backendName, function in powModBackends:
+        if backendName == name:
+            powModName, _powMod = name, function
+            return
+    raise ValueError("No powMod backend named %s" % name)
+
+def powMod(base, power, modulus):
+    """Return base**power mod modulus, using the chosen backend."""
+    return _powMod(base, power, modulus)
+
+#Chosen once at import. Python_RSAKey, and so every private key made by
+#keyfactory, calls powMod for the CRT steps of each signature.
+setPowMod(choosePowMod())
 
 
 #Pre-calculate a sieve of the ~100 primes < 1000:
@@ -645,17 +645,14 @@ class YouTubeService(gdata.service.GDataService):
                      'with a .read() method' % type(filename_or_handle))})
     upload_uri = '%s/%s/%s' % (YOUTUBE_UPLOAD_URI, youtube_username,
                               'uploads')
-    self.additional_headers['Slug'] = mediasource.file_name
-
-    # Using a nested try statement to retain Python 2.4 compatibility
+    # The Slug header is sent with this request only, so that uploads made
+    # by other threads with the same service are not affected.
     try:
-      try:
-        return self.Post(video_entry, uri=upload_uri, media_source=mediasource,
-                         converter=gdata.youtube.YouTubeVideoEntryFromString)
-      except gdata.service.RequestError, e:
-        raise YouTubeError(e.args[0])
-    finally:
-      del(self.additional_headers['Slug'])
+      return self.Post(video_entry, uri=upload_uri, media_source=mediasource,
+                       extra_headers={'Slug': mediasource.file_name},
+                       converter=gdata.youtube.YouTubeVideoEntryFromString)
+    except gdata.service.RequestError, e:
+      raise YouTubeError(e.args[0])
 
   def CheckUploadStatus(self, video_entry=None, video_id=None):
     """Check upload status on a recently uploaded video entry.
@@ -26,16 +26,28 @@ import unittest
 import atom_tests.core_test
 import atom_tests.data_test
 import atom_tests.http_core_test
+import atom_tests.http_async_test
+import atom_tests.instrumentation_test
 import atom_tests.auth_test
 import atom_tests.mock_http_core_test
 import atom_tests.client_test
+import gdata_tests.cache_test
 import gdata_tests.client_test
+import gdata_tests.executor_test
+import gdata_tests.sessions_test
+import gdata_tests.throttle_test
 import gdata_tests.core_test
 import gdata_tests.data_test
 import gdata_tests.data_smoke_test
 import gdata_tests.client_smoke_test
 import gdata_tests.live_client_test
 import gdata_tests.gauth_test
+import gdata_tests.apps.retrieve_all_test
+import gdata_tests.apps.crawl_test
+import gdata_tests.apps.migration.batch_test
+import gdata_tests.apps.migration.importer_test
+import gdata_tests.apps.emailsettings.bulk_test
+import gdata_tests.apps.groups.graph_test
 import gdata_tests.blogger.data_test
 import gdata_tests.blogger.live_client_test
 import gdata_tests.maps.data_test
@@ -58,16 +70,28 @@ def suite():
       atom_tests.core_test.suite(),
       atom_tests.data_test.suite(),
       atom_tests.http_core_test.suite(),
+      atom_tests.http_async_test.suite(),
+      atom_tests.instrumentation_test.suite(),
       atom_tests.auth_test.suite(),
       atom_tests.mock_http_core_test.suite(),
       atom_tests.client_test.suite(),
+      gdata_tests.cache_test.suite(),
       gdata_tests.client_test.suite(),
+      gdata_tests.executor_test.suite(),
+      gdata_tests.sessions_test.suite(),
+      gdata_tests.throttle_test.suite(),
       gdata_tests.core_test.suite(),
       gdata_tests.data_test.suite(),
       gdata_tests.data_smoke_test.suite(),
       gdata_tests.client_smoke_test.suite(),
       gdata_tests.live_client_test.suite(),
       gdata_tests.gauth_test.suite(),
+      gdata_tests.apps.retrieve_all_test.suite(),
+      gdata_tests.apps.crawl_test.suite(),
+      gdata_tests.apps.migration.batch_test.suite(),
+      gdata_tests.apps.migration.importer_test.suite(),
+      gdata_tests.apps.emailsettings.bulk_test.suite(),
+      gdata_tests.apps.groups.graph_test.suite(),
       gdata_tests.blogger.data_test.suite(),
       gdata_tests.blogger.live_client_test.suite(),
       gdata_tests.maps.data_test.suite(),
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Compares RetrieveAllUsers with streaming the users of a large domain.
+
+Lists every user of a domain served by a local stand-in for the
+provisioning API and reports the time until the first user is available,
+the total time and the most UserEntry objects alive at once. Run from the
+tests directory:
+
+  PYTHONPATH=../src python apps_retrieve_all_benchmark.py [users] [delay]
+
+where delay is the number of seconds the server waits before each page.
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import gc
+import sys
+import time
+import gdata.apps
+import gdata.apps.service
+import apps_server
+
+
+class SlowAppsServer(apps_server.AppsServer):
+  """Waits before each response, like a server some distance away."""
+
+  delay = 0
+
+  def respond(self, method, path, headers, body):
+    time.sleep(self.delay)
+    return apps_server.AppsServer.respond(self, method, path, headers, body)
+
+
+def count_user_entries():
+  return len([o for o in gc.get_objects()
+              if isinstance(o, gdata.apps.UserEntry)])
+
+
+def retrieve_all(service):
+  return iter(service.RetrieveAllUsers().entry)
+
+
+def stream(prefetch):
+  def stream_users(service):
+    return service.GetEntryGeneratorForAllUsers(prefetch=prefetch)
+  return stream_users
+
+
+def measure(service, list_users):
+  gc.collect()
+  start = time.time()
+  first = None
+  most_alive = 0
+  for i, entry in enumerate(list_users(service)):
+    if first is None:
+      first = time.time() - start
+    # Counting is slow, so only look once per page.
+    if i % apps_server.DEFAULT_PAGE_SIZE == 0:
+      most_alive = max(most_alive, count_user_entries())
+  return first, time.time() - start, most_alive
+
+
+def main():
+  users = 5000
+  delay = 0.02
+  if len(sys.argv) > 1:
+    users = int(sys.argv[1])
+  if len(sys.argv) > 2:
+    delay = float(sys.argv[2])
+  server = SlowAppsServer('example.com',
+                          ['user%06i' % i for i in xrange(users)]).start()
+  server.delay = delay
+  service = server.configure_service(gdata.apps.service.AppsService())
+  print '%i users, %i per page, %.3fs per page' % (
+      users, apps_server.DEFAULT_PAGE_SIZE, delay)
+  print '%-22s %12s %10s %12s' % ('', 'first user', 'total', 'most alive')
+  try:
+    for name, list_users in (('RetrieveAllUsers', retrieve_all),
+                             ('generator prefetch=0', stream(0)),
+                             ('generator prefetch=1', stream(1)),
+                             ('generator prefetch=4', stream(4))):
+      first, total, most_alive = measure(service, list_users)
+      print '%-22s %11.3fs %9.3fs %12i' % (name, first, total, most_alive)
+  finally:
+    server.stop()
+
+
+if __name__ == '__main__':
+  main()
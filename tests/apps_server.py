@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""A local stand-in for the Google Apps provisioning and groups feeds.
+
+Serves the paged user, nickname and email list feeds and the group and
+group member feeds of one domain from in-memory data, following the start
+parameters and next links of the real service. Point an AppsService or a
+GroupsService at it with configure_service.
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import bisect
+import cgi
+import urllib
+import urlparse
+import atom
+import gdata.apps
+import local_server
+
+
+DEFAULT_PAGE_SIZE = 100
+
+_ATOM_CONTENT_TYPE = {'Content-Type': 'application/atom+xml'}
+
+
+class AppsServer(local_server.LocalServer):
+  """Serves the feeds of a domain's users, nicknames, lists and groups.
+
+  Args:
+    domain: str The domain name used in the feed paths.
+    users: list of user names.
+    nicknames: dict (optional) Maps nicknames to the user names they
+        belong to.
+    email_lists: list (optional) of email list names.
+    groups: dict (optional) Maps group ids to lists of member ids.
+    page_size: int The most entries on each page.
+  """
+
+  def __init__(self, domain, users, nicknames=None, email_lists=None,
+               groups=None, page_size=DEFAULT_PAGE_SIZE):
+    local_server.LocalServer.__init__(self)
+    self.domain = domain
+    self.users = sorted(users)
+    self.nicknames = nicknames or {}
+    self.email_lists = sorted(email_lists or [])
+    self.groups = groups or {}
+    self.page_size = page_size
+    self.paths = []
+
+  def configure_service(self, service):
+    """Sends the requests of a gdata.apps.service.AppsService here."""
+    service.server = '%s:%i' % (self.host, self.port)
+    service.port = self.port
+    service.ssl = False
+    service.domain = self.domain
+    return service
+
+  def respond(self, method, path, headers, body):
+    self.lock.acquire()
+    try:
+      self.paths.append(path)
+    finally:
+      self.lock.release()
+    if method != 'GET':
+      return 405, {}, 'Only GET is supported'
+    # The v1 clients send absolute URLs in the request line.
+    scheme, netloc, path, query, fragment = urlparse.urlsplit(path)
+    params = dict((name, values[0])
+                  for name, values in cgi.parse_qs(query).iteritems())
+    feed = self._get_feed(path, params)
+    if feed is None:
+      return 404, {}, 'Not found'
+    return 200, _ATOM_CONTENT_TYPE, str(feed)
+
+  def _get_feed(self, path, params):
+    provisioning = '/a/feeds/%s/' % self.domain
+    groups = '/a/feeds/group/2.0/%s' % self.domain
+    if path == provisioning + 'user/2.0':
+      return self._page(path, params, 'startUsername', self.users,
+                        gdata.apps.UserFeed, self._user_entry)
+    if path == provisioning + 'nickname/2.0':
+      return self._page(path, params, 'startNickname',
+                        sorted(self.nicknames), gdata.apps.NicknameFeed,
+                        self._nickname_entry)
+    if path == provisioning + 'emailList/2.0':
+      return self._page(path, params, 'startEmailListName',
+                        self.email_lists, gdata.apps.EmailListFeed,
+                        self._email_list_entry)
+    if path == groups:
+      return self._page(path, params, 'start', sorted(self.groups),
+                        gdata.apps.PropertyFeed, self._group_entry)
+    if path.startswith(groups + '/') and path.endswith('/member'):
+      group_id = urllib.unquote(path[len(groups) + 1:-len('/member')])
+      if group_id not in self.groups:
+        return None
+      return self._page(path, params, 'start',
+                        sorted(self.groups[group_id]),
+                        gdata.apps.PropertyFeed, self._member_entry)
+    return None
+
+  def _page(self, path, params, start_param, names, feed_class, make_entry):
+    """Builds the page of names which begins at the start parameter."""
+    first = 0
+    if start_param in params:
+      first = bisect.bisect_left(names, params[start_param])
+    last = first + self.page_size
+    feed = feed_class(entry=[make_entry(name) for name in names[first:last]])
+    if last < len(names):
+      # Other parameters, such as includeSuspendedUsers, are kept.
+      params = dict(params)
+      params[start_param] = names[last]
+      feed.link.append(atom.Link(rel='next', link_type='application/atom+xml',
+          href=self.url('%s?%s' % (path, urllib.urlencode(params)))))
+    return feed
+
+  def _user_entry(self, user_name):
+    return gdata.apps.UserEntry(
+        atom_id=atom.Id(text=self.url('/a/feeds/%s/user/2.0/%s' % (
+            self.domain, user_name))),
+        login=gdata.apps.Login(user_name=user_name, suspended='false',
+                               admin='false'),
+        name=gdata.apps.Name(family_name='Family of %s' % user_name,
+                             given_name=user_name),
+        quota=gdata.apps.Quota(limit='25600'))
+
+  def _nickname_entry(self, nickname):
+    return gdata.apps.NicknameEntry(
+        atom_id=atom.Id(text=self.url('/a/feeds/%s/nickname/2.0/%s' % (
+            self.domain, nickname))),
+        login=gdata.apps.Login(user_name=self.nicknames[nickname]),
+        nickname=gdata.apps.Nickname(name=nickname))
+
+  def _email_list_entry(self, list_name):
+    return gdata.apps.EmailListEntry(
+        atom_id=atom.Id(text=self.url('/a/feeds/%s/emailList/2.0/%s' % (
+            self.domain, list_name))),
+        email_list=gdata.apps.EmailList(name=list_name))
+
+  def _group_entry(self, group_id):
+    return gdata.apps.PropertyEntry(property=[
+        gdata.apps.Property(name='groupId', value=group_id),
+        gdata.apps.Property(name='groupName', value=group_id.split('@')[0]),
+        gdata.apps.Property(name='emailPermission', value='Member')])
+
+  def _member_entry(self, member_id):
+    member_type = 'User'
+    if member_id in self.groups:
+      member_type = 'Group'
+    return gdata.apps.PropertyEntry(property=[
+        gdata.apps.Property(name='memberId', value=member_id),
+        gdata.apps.Property(name='memberType', value=member_type),
+        gdata.apps.Property(name='directMember', value='true')])
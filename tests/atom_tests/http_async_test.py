@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+# This module is used for version 2 of the Google Data APIs.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import socket
+import ssl
+import threading
+import unittest
+import atom.http_async
+import atom.http_core
+import local_server
+
+
+def echo_path(method, path, headers, body):
+  return 200, {'Content-Type': 'text/plain', 'X-Method': method}, path + body
+
+
+class ClosingServer(object):
+  """Answers the first request on each connection, then closes it.
+
+  The second request on a connection is read and recorded but gets no
+  response, like a server which closes an idle connection just as a
+  request arrives, or which fails after acting on it.
+  """
+
+  def __init__(self):
+    self.requests = []
+    self._socket = socket.socket()
+    self._socket.bind(('127.0.0.1', 0))
+    self._socket.listen(5)
+    self.port = self._socket.getsockname()[1]
+    thread = threading.Thread(target=self._accept)
+    thread.setDaemon(True)
+    thread.start()
+
+  def url(self, path):
+    return 'http://127.0.0.1:%i%s' % (self.port, path)
+
+  def _accept(self):
+    while True:
+      try:
+        connection = self._socket.accept()[0]
+      except socket.error:
+        return
+      thread = threading.Thread(target=self._serve, args=(connection,))
+      thread.setDaemon(True)
+      thread.start()
+
+  def _serve(self, connection):
+    data = ''
+    for i in xrange(2):
+      while '\r\n\r\n' not in data:
+        received = connection.recv(4096)
+        if not received:
+          connection.close()
+          return
+        data += received
+      head, data = data.split('\r\n\r\n', 1)
+      self.requests.append(head.split(' ')[0])
+      length = 0
+      for line in head.split('\r\n')[1:]:
+        name, value = line.split(':', 1)
+        if name.lower() == 'content-length':
+          length = int(value)
+      while len(data) < length:
+        data += connection.recv(4096)
+      data = data[length:]
+      if i == 0:
+        connection.sendall('HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nOK')
+    connection.close()
+
+  def stop(self):
+    self._socket.close()
+
+
+class AsyncResultTest(unittest.TestCase):
+
+  def test_callbacks_and_chain(self):
+    source = atom.http_async.AsyncResult()
+    seen = []
+    source.add_done_callback(lambda r: seen.append(r.result()))
+    target = atom.http_async.chain(source, atom.http_async.AsyncResult(),
+                                   lambda x: x * 2)
+    source.set_result(21)
+    self.assertEqual(seen, [21])
+    self.assertEqual(target.result(), 42)
+
+  def test_exception_passed_on(self):
+    source = atom.http_async.AsyncResult()
+    target = atom.http_async.chain(source, atom.http_async.AsyncResult())
+    source.set_exception(ValueError('bad'))
+    self.assert_(isinstance(target.exception(), ValueError))
+    self.assertRaises(ValueError, target.result)
+
+
+class AsyncHttpClientTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(echo_path).start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def test_concurrent_requests_reuse_connections(self):
+    client = atom.http_async.AsyncHttpClient(max_connections_per_host=4)
+    results = []
+    for i in xrange(40):
+      results.append(client.request(atom.http_core.HttpRequest(
+          uri=self.server.url('/item/%i' % i), method='GET')))
+    self.assert_(client.pending() > 0)
+    client.run()
+    for i in xrange(40):
+      response = results[i].result()
+      self.assertEqual(response.status, 200)
+      self.assertEqual(response.read(), '/item/%i' % i)
+      self.assertEqual(response.getheader('x-method'), 'GET')
+    self.assertEqual(self.server.request_count, 40)
+    self.assert_(len(self.server.connections) <= 4)
+    client.close()
+
+  def test_post_body(self):
+    client = atom.http_async.AsyncHttpClient()
+    request = atom.http_core.HttpRequest(uri=self.server.url('/p'),
+                                         method='POST')
+    request.add_body_part('hello', 'text/plain')
+    response = client.request(request).result()
+    self.assertEqual(response.read(), '/phello')
+    self.assertEqual(response.getheader('X-Method'), 'POST')
+
+  def test_connection_refused(self):
+    client = atom.http_async.AsyncHttpClient()
+    self.server.stop()
+    result = client.request(atom.http_core.HttpRequest(
+        uri=self.server.url('/'), method='GET'))
+    self.assert_(result.exception() is not None)
+    # Restart so that tearDown has a server to stop.
+    self.server = local_server.LocalServer(echo_path).start()
+
+
+class ClosedConnectionTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = ClosingServer()
+    self.client = atom.http_async.AsyncHttpClient(max_connections_per_host=1)
+
+  def tearDown(self):
+    self.client.close()
+    self.server.stop()
+
+  def send(self, method):
+    request = atom.http_core.HttpRequest(uri=self.server.url('/'),
+                                         method=method)
+    if method == 'POST':
+      request.add_body_part('hello', 'text/plain')
+    return self.client.request(request)
+
+  def test_get_sent_again(self):
+    self.assertEqual(self.send('GET').result().read(), 'OK')
+    self.assertEqual(self.send('GET').result().read(), 'OK')
+    self.assertEqual(self.server.requests, ['GET', 'GET', 'GET'])
+
+  def test_post_not_sent_again(self):
+    self.assertEqual(self.send('GET').result().read(), 'OK')
+    result = self.send('POST')
+    self.assert_(isinstance(result.exception(),
+                            atom.http_async.ConnectionClosed))
+    self.assertEqual(self.server.requests, ['GET', 'POST'])
+
+
+class HttpsTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(echo_path, use_ssl=True).start()
+    self.client = atom.http_async.AsyncHttpClient(timeout=5)
+
+  def tearDown(self):
+    self.client.close()
+    self.server.stop()
+
+  def get(self):
+    return self.client.request(atom.http_core.HttpRequest(
+        uri=self.server.url('/secure'), method='GET'))
+
+  def test_self_signed_certificate_rejected(self):
+    result = self.get()
+    self.assert_(isinstance(result.exception(), ssl.SSLError))
+    self.assertEqual(self.server.request_count, 0)
+
+  def test_trusted_certificate_accepted(self):
+    self.client.ssl_context = ssl.create_default_context(
+        cafile=local_server.TEST_CERT_FILE)
+    self.assertEqual(self.get().result().read(), '/secure')
+
+  def test_fails_without_certificate_checks(self):
+    saved = atom.http_async.ssl
+    atom.http_async.ssl = None
+    try:
+      result = self.get()
+    finally:
+      atom.http_async.ssl = saved
+    self.assert_(isinstance(result.exception(), atom.http_async.Error))
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(AsyncResultTest, 'test'),
+                             unittest.makeSuite(AsyncHttpClientTest, 'test'),
+                             unittest.makeSuite(ClosedConnectionTest, 'test'),
+                             unittest.makeSuite(HttpsTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -21,9 +21,13 @@
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
+import base64
+import os
 import unittest
+import atom.http
 import atom.http_core
 import StringIO
+import local_server
 
 
 class UriTest(unittest.TestCase):
@@ -149,9 +153,165 @@ class HttpRequestTest(unittest.TestCase):
     self.assert_(request._body_parts != copied._body_parts)
 
 
+class SpooledBodyTest(unittest.TestCase):
+
+  def test_small_body_stays_in_memory(self):
+    body = atom.http_core.SpooledBody(max_size=10)
+    body.write('0123456789')
+    self.assert_(not body.rolled_over)
+    self.assertEqual(body.size, 10)
+    body.seek(0)
+    self.assertEqual(body.read(4), '0123')
+    self.assertEqual(body.read(), '456789')
+
+  def test_large_body_rolls_over(self):
+    body = atom.http_core.SpooledBody(max_size=10, chunk_size=4)
+    body.write('0123456789')
+    body.write('abc')
+    self.assert_(body.rolled_over)
+    self.assertEqual(len(body), 13)
+    body.seek(0)
+    self.assertEqual(list(body), ['0123', '4567', '89ab', 'c'])
+    body.seek(0)
+    copy = StringIO.StringIO()
+    body.copy_to(copy)
+    self.assertEqual(copy.getvalue(), '0123456789abc')
+    body.close()
+
+  def test_spool_response(self):
+    response = atom.http_core.HttpResponse(status=200, reason='OK',
+                                           body='x' * 100)
+    body = atom.http_core.spool_response(response, max_size=50)
+    self.assert_(body.rolled_over)
+    self.assertEqual(body.tell(), 0)
+    self.assertEqual(body.read(), 'x' * 100)
+    empty = atom.http_core.spool_response(atom.http_core.HttpResponse())
+    self.assertEqual(empty.read(), '')
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer().start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def test_connections_reused_after_read(self):
+    client = atom.http_core.HttpClient()
+    client.connection_pool = atom.http_core.ConnectionPool()
+    for i in xrange(5):
+      response = client.request(atom.http_core.HttpRequest(
+          uri=atom.http_core.Uri.parse_uri(self.server.url('/%i' % i)),
+          method='GET'))
+      self.assertEqual(response.status, 200)
+      self.assertEqual(response.read(), 'OK')
+    self.assertEqual(self.server.request_count, 5)
+    self.assertEqual(len(self.server.connections), 1)
+    client.connection_pool.clear()
+
+  def test_unread_response_not_reused(self):
+    client = atom.http_core.HttpClient()
+    client.connection_pool = atom.http_core.ConnectionPool()
+    uri = atom.http_core.Uri.parse_uri(self.server.url())
+    first = client.request(atom.http_core.HttpRequest(uri=uri, method='GET'))
+    second = client.request(atom.http_core.HttpRequest(uri=uri, method='GET'))
+    self.assertEqual(second.read(), 'OK')
+    self.assertEqual(first.read(), 'OK')
+    self.assertEqual(len(self.server.connections), 2)
+
+  def test_stale_connection_retried(self):
+    client = atom.http_core.HttpClient()
+    client.connection_pool = atom.http_core.ConnectionPool()
+    uri = atom.http_core.Uri.parse_uri(self.server.url())
+    client.request(atom.http_core.HttpRequest(uri=uri, method='GET')).read()
+    # Restart the server on the same port so the pooled connection is dead.
+    self.server.stop()
+    self.server = local_server.LocalServer(port=self.server.port).start()
+    response = client.request(atom.http_core.HttpRequest(uri=uri,
+                                                         method='GET'))
+    self.assertEqual(response.read(), 'OK')
+
+
+class ProxyTunnelTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(use_ssl=True).start()
+    self.proxy = local_server.TunnelProxy(
+        required_auth='Basic %s' % base64.b64encode('user:secret')).start()
+    self.saved_environ = dict(os.environ)
+    os.environ['https_proxy'] = self.proxy.url()
+    os.environ['proxy_username'] = 'user'
+    os.environ['proxy_password'] = 'secret'
+
+  def tearDown(self):
+    os.environ.clear()
+    os.environ.update(self.saved_environ)
+    self.proxy.stop()
+    self.server.stop()
+
+  def get(self, client, path='/'):
+    response = client.request(atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri.parse_uri(self.server.url(path)),
+        method='GET'))
+    self.assertEqual(response.status, 200)
+    return response.read()
+
+  def test_tunnel_reused(self):
+    client = atom.http_core.ProxiedHttpClient()
+    for i in xrange(5):
+      self.assertEqual(self.get(client, '/%i' % i), 'OK')
+    self.assertEqual(self.server.request_count, 5)
+    self.assertEqual(self.proxy.connect_count, 1)
+
+  def test_idle_tunnel_closed(self):
+    client = atom.http_core.ProxiedHttpClient()
+    self.get(client)
+    client.tunnel_pool.idle_timeout = -1
+    self.get(client)
+    self.assertEqual(self.proxy.connect_count, 2)
+
+  def test_expired_tunnels_to_other_hosts_closed(self):
+    client = atom.http_core.ProxiedHttpClient()
+    self.get(client)
+    tunnel = client.tunnel_pool._idle.values()[0][0][0]
+    client.tunnel_pool.idle_timeout = -1
+    response = client.request(atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri.parse_uri(
+            self.server.url('/').replace('127.0.0.1', 'localhost')),
+        method='GET'))
+    response.read()
+    self.assertEqual(tunnel.sock, None)
+    self.assertEqual([key[1] for key in client.tunnel_pool._idle],
+                     ['localhost'])
+
+  def test_refused_tunnel(self):
+    os.environ['proxy_password'] = 'wrong'
+    client = atom.http_core.ProxiedHttpClient()
+    self.assertRaises(atom.http_core.ProxyError, self.get, client)
+
+  def test_v1_tunnel_reused(self):
+    client = atom.http.ProxiedHttpClient()
+    for i in xrange(3):
+      response = client.request('GET', self.server.url('/%i' % i))
+      self.assertEqual(response.status, 200)
+      self.assertEqual(response.read(), 'OK')
+    self.assertEqual(self.proxy.connect_count, 1)
+
+  def test_proxy_auth_cached(self):
+    first = atom.http_core._get_proxy_auth()
+    self.assert_(first is atom.http_core._get_proxy_auth())
+    os.environ['proxy_password'] = 'changed'
+    self.assertEqual(atom.http_core._get_proxy_auth(), 'Basic %s\r\n' %
+                     base64.b64encode('user:changed'))
+
+
 def suite():
   return unittest.TestSuite((unittest.makeSuite(UriTest,'test'),
-                             unittest.makeSuite(HttpRequestTest,'test')))
+                             unittest.makeSuite(HttpRequestTest,'test'),
+                             unittest.makeSuite(SpooledBodyTest,'test'),
+                             unittest.makeSuite(ConnectionPoolTest,'test'),
+                             unittest.makeSuite(ProxyTunnelTest,'test')))
 
  
 if __name__ == '__main__':
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import httplib
+import os
+import socket
+import ssl
+import unittest
+import atom.http
+import atom.http_core
+import atom.instrumentation
+import local_server
+
+
+class UnverifiedHttpClient(atom.http_core.HttpClient):
+  """Accepts the local server's self-signed certificate."""
+
+  def _get_connection(self, uri, headers=None):
+    return httplib.HTTPSConnection(
+        uri.host, int(uri.port), context=ssl._create_unverified_context())
+
+
+class SetTunnelHttpClient(atom.http_core.HttpClient):
+  """Reaches the server through a CONNECT proxy using set_tunnel."""
+
+  def __init__(self, proxy):
+    self.proxy = proxy
+
+  def _get_connection(self, uri, headers=None):
+    connection = httplib.HTTPSConnection(
+        self.proxy.host, self.proxy.port,
+        context=ssl._create_unverified_context())
+    connection.set_tunnel(uri.host, int(uri.port))
+    return connection
+
+
+class TimingCollectorTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer().start()
+    self.collector = atom.instrumentation.TimingCollector(keep_timings=True)
+
+  def tearDown(self):
+    self.server.stop()
+
+  def get(self, client, path='/'):
+    response = client.request(atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri.parse_uri(self.server.url(path)),
+        method='GET'))
+    return response.read()
+
+  def test_phases_and_reuse(self):
+    client = atom.http_core.HttpClient()
+    client.connection_pool = atom.http_core.ConnectionPool()
+    client.observer = self.collector
+    for i in xrange(3):
+      self.assertEqual(self.get(client), 'OK')
+    first, second = self.collector.timings[:2]
+    self.assertEqual(first.reused, False)
+    self.assertEqual(second.reused, True)
+    for phase in ('dns', 'connect', 'send', 'wait', 'receive'):
+      self.assert_(first.phases[phase] >= 0)
+    self.assert_('connect' not in second.phases)
+    self.assert_(first.bytes_sent > len('GET / HTTP/1.1\r\n'))
+    self.assertEqual(first.bytes_received, 2)
+    self.assertEqual(first.status, 200)
+    summary = self.collector.to_dict()
+    self.assertEqual(summary['requests'], 3)
+    self.assertEqual(summary['reused_connections'], 2)
+    self.assertEqual(summary['status'], {'200': 3})
+    self.assertEqual(summary['phases']['wait']['count'], 3)
+    self.assertEqual(summary['hosts']['127.0.0.1']['requests'], 3)
+    decoded = atom.instrumentation.simplejson.loads(self.collector.to_json())
+    self.assertEqual(decoded['bytes_received'], 6)
+
+  def test_tls_phase(self):
+    secure_server = local_server.LocalServer(use_ssl=True).start()
+    try:
+      client = UnverifiedHttpClient()
+      client.observer = self.collector
+      client.request(atom.http_core.HttpRequest(
+          uri=atom.http_core.Uri.parse_uri(secure_server.url()),
+          method='GET')).read()
+    finally:
+      secure_server.stop()
+    self.assert_('tls' in self.collector.timings[0].phases)
+
+  def test_failed_request(self):
+    client = atom.http_core.HttpClient()
+    client.observer = self.collector
+    self.server.stop()
+    self.assertRaises(socket.error, self.get, client)
+    self.server = local_server.LocalServer().start()
+    timing = self.collector.timings[0]
+    self.assert_(isinstance(timing.error, socket.error))
+    self.assertEqual(timing.status, None)
+    self.assertEqual(self.collector.to_dict()['errors'], 1)
+
+  def test_v1_client(self):
+    client = atom.http.HttpClient()
+    client.observer = self.collector
+    response = client.request('GET', self.server.url('/v1'))
+    self.assertEqual(response.read(), 'OK')
+    timing = self.collector.timings[0]
+    self.assertEqual(timing.method, 'GET')
+    self.assertEqual(timing.url, self.server.url('/v1'))
+    self.assertEqual(timing.status, 200)
+    self.assertEqual(timing.reused, False)
+
+
+class TunnelTimingTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(use_ssl=True).start()
+    self.proxy = local_server.TunnelProxy().start()
+    self.collector = atom.instrumentation.TimingCollector(keep_timings=True)
+
+  def tearDown(self):
+    self.proxy.stop()
+    self.server.stop()
+
+  def get(self, client):
+    client.observer = self.collector
+    response = client.request(atom.http_core.HttpRequest(
+        uri=atom.http_core.Uri.parse_uri(self.server.url('/tunneled')),
+        method='GET'))
+    self.assertEqual(response.status, 200)
+    self.assertEqual(response.read(), 'OK')
+    self.assertEqual(self.proxy.connect_count, 1)
+    self.assertEqual(self.server.request_count, 1)
+    return self.collector.timings[0]
+
+  def test_proxied_client(self):
+    saved_environ = dict(os.environ)
+    os.environ['https_proxy'] = self.proxy.url()
+    try:
+      timing = self.get(atom.http_core.ProxiedHttpClient())
+    finally:
+      os.environ.clear()
+      os.environ.update(saved_environ)
+    self.assertEqual(timing.status, 200)
+    self.assert_('connect' in timing.phases)
+
+  def test_set_tunnel(self):
+    timing = self.get(SetTunnelHttpClient(self.proxy))
+    self.assertEqual(timing.status, 200)
+    for phase in ('dns', 'connect', 'tls'):
+      self.assert_(timing.phases[phase] >= 0)
+
+
+def suite():
+  return unittest.TestSuite((
+      unittest.makeSuite(TimingCollectorTest, 'test'),
+      unittest.makeSuite(TunnelTimingTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
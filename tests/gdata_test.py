@@ -354,10 +354,40 @@ class FeedLinkTest(unittest.TestCase):
     self.assertEqual(link.count_hint, '5')
 
 
+class RootRegistryTest(unittest.TestCase):
+
+  def testFeedsAndEntriesParsedOnce(self):
+    feed = gdata.GDataFromString(test_data.GBASE_FEED)
+    self.assert_(isinstance(feed, gdata.GDataFeed))
+    self.assertEqual(len(feed.entry), 3)
+    entry = gdata.GDataFromString(test_data.XML_ENTRY_1)
+    self.assert_(isinstance(entry, gdata.GDataEntry))
+    self.assertEqual(entry.id.text,
+                     gdata.GDataEntryFromString(test_data.XML_ENTRY_1).id.text)
+    self.assert_(gdata.GDataFromString('<html><body/></html>') is None)
+
+  def testKindChoosesClass(self):
+    class EventFeed(gdata.GDataFeed):
+      pass
+    registry = gdata.RootRegistry(parent=gdata.ROOT_REGISTRY)
+    registry.Register(EventFeed, kind='http://schemas.google.com/g/2005#event')
+    feed = registry.Parse(test_data.CALENDAR_FULL_EVENT_FEED)
+    self.assert_(isinstance(feed, EventFeed))
+    # Roots of other kinds fall back to the parent's classes.
+    feed = registry.Parse(test_data.GBASE_FEED)
+    self.assertEqual(feed.__class__, gdata.GDataFeed)
+    entry = registry.Parse(test_data.XML_ENTRY_1)
+    self.assertEqual(entry.__class__, gdata.GDataEntry)
+
+  def testUnicodeParsed(self):
+    entry = gdata.GDataFromString(unicode(test_data.XML_ENTRY_1))
+    self.assert_(isinstance(entry, gdata.GDataEntry))
+
+
 def suite():
   return conf.build_suite([StartIndexTest, StartIndexTest, GDataEntryTest,
       LinkFinderTest, GDataFeedTest, BatchEntryTest, BatchFeedTest,
-      ExtendedPropertyTest, FeedLinkTest])
+      ExtendedPropertyTest, FeedLinkTest, RootRegistryTest])
 
 
 if __name__ == '__main__':
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import time
+import unittest
+import atom
+import gdata
+import gdata.apps.crawl
+import gdata.apps.groups.service
+import gdata.apps.service
+import apps_server
+
+
+USERS = ['%s%s%02i' % (first, second, i)
+         for first in '0adkqz' for second in 'aj' for i in xrange(4)]
+GROUP_ID = 'staff@example.com'
+
+
+class FakeFeed(object):
+
+  def __init__(self, keys, next_href=None):
+    self.entry = [gdata.GDataEntry(atom_id=atom.Id(text=key)) for key in keys]
+    self.next_href = next_href
+
+  def GetNextLink(self):
+    if self.next_href is None:
+      return None
+    return atom.Link(href=self.next_href)
+
+
+class RangeCrawlerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.keys = ['a1', 'a2', 'b1', 'B2', 'c1', 'c2', 'd1']
+    self.page_size = 2
+    self.requested = []
+    self.server_order = lambda key: key.lower()
+
+  def page(self, position):
+    self.requested.append(position)
+    next_href = None
+    if position + self.page_size < len(self.keys):
+      next_href = str(position + self.page_size)
+    return FakeFeed(self.keys[position:position + self.page_size], next_href)
+
+  def first_page(self, start):
+    position = 0
+    while (start is not None and position < len(self.keys) and
+           self.server_order(self.keys[position]) < start):
+      position += 1
+    return self.page(position)
+
+  def crawler(self, boundaries, max_workers=4):
+    return gdata.apps.crawl.RangeCrawler(
+        self.first_page, lambda href: self.page(int(href)),
+        lambda entry: entry.id.text, boundaries=boundaries,
+        max_workers=max_workers)
+
+  def testMakeRanges(self):
+    self.assertEqual(gdata.apps.crawl.MakeRanges(['m', 'c', 'm']),
+                     [(None, 'c'), ('c', 'm'), ('m', None)])
+    self.assertEqual(gdata.apps.crawl.MakeRanges([]), [(None, None)])
+
+  def testRangeStopsAtNextBoundary(self):
+    crawler = self.crawler(['b', 'c'])
+    self.assertEqual([entry.id.text for entry in crawler.CrawlRange('b', 'c')],
+                     ['b1', 'B2'])
+    # The page holding c1 is read but the page after it is not.
+    self.assertEqual(self.requested, [2, 4])
+
+  def testEntriesMergedInOrder(self):
+    for boundaries in ([], ['b'], ['b', 'c', 'd'], ['a', 'b', 'x']):
+      keys = [entry.id.text for entry in self.crawler(boundaries).Crawl()]
+      self.assertEqual(keys, self.keys)
+
+  def testDuplicatesRemoved(self):
+    # The server ignores the underscore when ordering '_b0', so the page at
+    # b begins with it, but it comes before b in Python and so belongs to
+    # the first range as well.
+    self.keys.insert(2, '_b0')
+    self.server_order = lambda key: key.lower().lstrip('_')
+    crawler = self.crawler(['b', 'c'])
+    self.assertEqual([entry.id.text for entry in crawler.CrawlRange(None, 'b')],
+                     ['a1', 'a2', '_b0'])
+    self.assertEqual([entry.id.text for entry in crawler.CrawlRange('b', 'c')],
+                     ['_b0', 'b1', 'B2'])
+    self.assertEqual([entry.id.text for entry in crawler.Crawl()], self.keys)
+
+  def testErrorRaised(self):
+    def first_page(start):
+      if start == 'c':
+        raise ValueError('no pages')
+      return self.first_page(start)
+    crawler = self.crawler(['c'])
+    crawler.first_page = first_page
+    self.assertRaises(ValueError, list, crawler.Crawl())
+
+
+class SlowAppsServer(apps_server.AppsServer):
+
+  delay = 0.05
+
+  def __init__(self, *args, **kwargs):
+    apps_server.AppsServer.__init__(self, *args, **kwargs)
+    self.in_flight = 0
+    self.most_in_flight = 0
+
+  def respond(self, method, path, headers, body):
+    self.lock.acquire()
+    try:
+      self.in_flight += 1
+      self.most_in_flight = max(self.most_in_flight, self.in_flight)
+    finally:
+      self.lock.release()
+    try:
+      time.sleep(self.delay)
+      return apps_server.AppsServer.respond(self, method, path, headers, body)
+    finally:
+      self.lock.acquire()
+      try:
+        self.in_flight -= 1
+      finally:
+        self.lock.release()
+
+
+class CrawlServiceTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = SlowAppsServer(
+        'example.com', USERS,
+        nicknames=dict(('n-%s' % user, user) for user in USERS),
+        groups={GROUP_ID: ['%s@example.com' % user for user in USERS],
+                'all@example.com': [GROUP_ID]},
+        page_size=5).start()
+    self.apps = self.server.configure_service(
+        gdata.apps.service.AppsService())
+    self.groups = self.server.configure_service(
+        gdata.apps.groups.service.GroupsService())
+
+  def tearDown(self):
+    self.server.stop()
+
+  def testCrawlAllUsers(self):
+    feed = self.apps.CrawlAllUsers(max_workers=4)
+    self.assert_(isinstance(feed, gdata.apps.UserFeed))
+    self.assertEqual([entry.login.user_name for entry in feed.entry], USERS)
+    self.assert_(self.server.most_in_flight > 1)
+    self.assert_(self.server.most_in_flight <= 4)
+    self.assertEqual(
+        [entry.login.user_name for entry in self.apps.CrawlAllUsers(
+            boundaries=['d', 'q'], max_workers=1).entry],
+        [entry.login.user_name for entry in
+         self.apps.RetrieveAllUsers().entry])
+
+  def testCrawlAllNicknames(self):
+    feed = self.apps.CrawlAllNicknames(boundaries=['n-d', 'n-k'])
+    self.assert_(isinstance(feed, gdata.apps.NicknameFeed))
+    self.assertEqual([entry.nickname.name for entry in feed.entry],
+                     ['n-%s' % user for user in USERS])
+
+  def testCrawlGroupsAndMembers(self):
+    self.assertEqual(self.groups.CrawlAllGroups(),
+                     self.groups.RetrieveAllGroups())
+    members = self.groups.CrawlAllMembers(GROUP_ID)
+    self.assertEqual(members, self.groups.RetrieveAllMembers(GROUP_ID))
+    self.assertEqual(len(members), len(USERS))
+    self.assertRaises(gdata.apps.service.AppsForYourDomainException,
+                      self.groups.CrawlAllMembers, 'none@example.com')
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(RangeCrawlerTest, 'test'),
+                             unittest.makeSuite(CrawlServiceTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
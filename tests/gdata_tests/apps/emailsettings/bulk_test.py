@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urlparse
+import atom.http_core
+import gdata.apps
+import gdata.apps.emailsettings.bulk
+import gdata.apps.emailsettings.service
+import gdata.apps.service
+import gdata.throttle
+from gdata.apps.emailsettings.bulk import Setting
+import local_server
+
+
+USERS = ['user%02i' % i for i in xrange(12)]
+PREFIX = '/a/feeds/emailsettings/2.0/example.com/'
+ERROR = ('<?xml version="1.0" encoding="UTF-8"?>\n<AppsForYourDomainErrors>'
+         '<error errorCode="%i" invalidInput="" reason="%s" />'
+         '</AppsForYourDomainErrors>')
+
+
+class BulkUpdaterTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.journal_path = os.path.join(self.directory, 'journal')
+    self.server = local_server.LocalServer(self.respond).start()
+    self.service = gdata.apps.emailsettings.service.EmailSettingsService(
+        domain='example.com')
+    self.service.server = '%s:%i' % (self.server.host, self.server.port)
+    self.service.port = self.server.port
+    self.service.ssl = False
+    self.requests = []
+    self.labels = set()
+    # Maps usernames to the statuses of their next responses.
+    self.statuses = {}
+    self.in_flight = 0
+    self.most_in_flight = 0
+    self.lock = threading.Lock()
+    self.sleeps = []
+
+  def tearDown(self):
+    self.server.stop()
+    shutil.rmtree(self.directory)
+
+  def respond(self, method, path, headers, body):
+    path = urlparse.urlsplit(path)[2]
+    self.assert_(path.startswith(PREFIX))
+    username, setting = path[len(PREFIX):].split('/')
+    properties = gdata.apps.PropertyEntryFromString(body).property
+    self.lock.acquire()
+    try:
+      self.requests.append((method, username, setting))
+      self.in_flight += 1
+      self.most_in_flight = max(self.most_in_flight, self.in_flight)
+      statuses = self.statuses.get(username)
+      status = None
+      if statuses:
+        status = statuses.pop(0)
+      elif setting == 'label':
+        label = (username, properties[0].value)
+        if label in self.labels:
+          status = 400
+        self.labels.add(label)
+    finally:
+      self.lock.release()
+    time.sleep(0.01)
+    self.lock.acquire()
+    try:
+      self.in_flight -= 1
+    finally:
+      self.lock.release()
+    if status == 400:
+      return 400, {}, ERROR % (gdata.apps.service.ENTITY_EXISTS,
+                               'EntityExists')
+    if status == 403:
+      return 403, {}, ERROR % (gdata.apps.service.DOMAIN_USER_LIMIT_EXCEEDED,
+                               'DomainUserLimitExceeded')
+    if status is not None:
+      return status, {}, 'Try again later'
+    if method == 'POST':
+      status = 201
+    else:
+      status = 200
+    return status, {'Content-Type': 'application/atom+xml'}, body
+
+  def updater(self, **kwargs):
+    kwargs.setdefault('journal_path', self.journal_path)
+    kwargs.setdefault('max_workers', 4)
+    kwargs.setdefault('delay', 0.5)
+    updater = gdata.apps.emailsettings.bulk.BulkUpdater(self.service,
+                                                        **kwargs)
+    updater._sleep = self.sleeps.append
+    return updater
+
+  def changes(self):
+    signature = Setting('UpdateSignature', signature='Example Corp.')
+    label = Setting('CreateLabel', label='Announcements')
+    return [(user, setting) for user in USERS
+            for setting in (signature, label)]
+
+  def testSettingsApplied(self):
+    results = self.updater().Run(self.changes())
+    self.assertEqual([(result.username, result.setting.method_name)
+                      for result in results],
+                     [(user, name) for user in USERS
+                      for name in ('UpdateSignature', 'CreateLabel')])
+    for result in results:
+      self.assertEqual(result.status, gdata.apps.emailsettings.bulk.APPLIED)
+      self.assert_(result.Succeeded())
+      self.assertEqual(result.attempts, 1)
+    self.assertEqual(results[0].value, {'signature': 'Example Corp.'})
+    self.assertEqual(results[1].value, {'label': 'Announcements'})
+    self.assertEqual(sorted(self.requests),
+                     sorted([('PUT', user, 'signature') for user in USERS] +
+                            [('POST', user, 'label') for user in USERS]))
+    self.assert_(self.most_in_flight > 1)
+    self.assert_(self.most_in_flight <= 4)
+
+  def testServiceGivenPoolAndThrottler(self):
+    seen = []
+    def OnResult(result, progress):
+      seen.append((self.service.http_client.connection_pool,
+                   self.service.throttler))
+    self.updater(max_workers=6, on_result=OnResult).Run(self.changes()[:2])
+    connection_pool, throttler = seen[0]
+    self.assert_(isinstance(connection_pool, atom.http_core.ConnectionPool))
+    throttle = throttler.get(self.service.server)
+    self.assertEqual(throttle.concurrency.limit, 6)
+    self.assertEqual(throttle.concurrency.max_limit, 6)
+    # They are only installed for the length of the run.
+    self.assertEqual(self.service.http_client.connection_pool, None)
+    self.assertEqual(self.service.throttler, None)
+    # A throttler which was set already is kept.
+    throttler = gdata.throttle.Throttler()
+    self.service.throttler = throttler
+    self.updater(journal_path=None).Run(self.changes()[:2])
+    self.assert_(self.service.throttler is throttler)
+
+  def testRerunSkipsAppliedChanges(self):
+    self.updater().Run(self.changes())
+    del self.requests[:]
+    results = self.updater().Run(self.changes())
+    self.assertEqual(self.requests, [])
+    self.assertEqual(set([result.status for result in results]),
+                     set([gdata.apps.emailsettings.bulk.SKIPPED]))
+    # A different setting is not in the journal.
+    results = self.updater().Run([(USERS[0], Setting('UpdateSignature',
+                                                     signature='Other'))])
+    self.assertEqual(results[0].status, gdata.apps.emailsettings.bulk.APPLIED)
+
+  def testExistingEntityCountsAsApplied(self):
+    self.labels.add((USERS[0], 'Announcements'))
+    results = self.updater(journal_path=None).Run(self.changes())
+    self.assertEqual(results[1].status, gdata.apps.emailsettings.bulk.EXISTED)
+    self.assert_(results[1].Succeeded())
+    self.assertEqual(results[3].status, gdata.apps.emailsettings.bulk.APPLIED)
+
+  def testOverloadRetried(self):
+    self.statuses[USERS[0]] = [503, 503]
+    updater = self.updater(journal_path=None, num_retries=3, backoff=2)
+    result = updater.Run(self.changes()[:1])[0]
+    self.assertEqual(result.status, gdata.apps.emailsettings.bulk.APPLIED)
+    self.assertEqual(result.attempts, 3)
+    self.assertEqual(self.sleeps, [0.5, 1.0])
+    self.assertEqual(updater.progress.retries, 2)
+
+  def testFailuresReportedAndRetriedByNextRun(self):
+    self.statuses[USERS[1]] = [403]
+    self.statuses[USERS[2]] = [503, 503]
+    # One worker, so that each user's signature is requested first.
+    updater = self.updater(num_retries=1, max_workers=1)
+    results = updater.Run(self.changes()[:6])
+    self.assertEqual([result.status for result in results],
+                     ['applied', 'applied', 'failed', 'applied', 'failed',
+                      'applied'])
+    self.assert_(isinstance(results[2].error,
+                            gdata.apps.service.AppsForYourDomainException))
+    self.assertEqual(results[2].error.error_code,
+                     gdata.apps.service.DOMAIN_USER_LIMIT_EXCEEDED)
+    self.assertEqual(results[2].attempts, 1)
+    self.assertEqual(results[4].attempts, 2)
+    del self.requests[:]
+    results = self.updater().Run(self.changes()[:6])
+    self.assertEqual(sorted(self.requests),
+                     [('PUT', USERS[1], 'signature'),
+                      ('PUT', USERS[2], 'signature')])
+    self.assertEqual([result.Succeeded() for result in results], [True] * 6)
+
+  def testProgress(self):
+    self.statuses[USERS[0]] = [403]
+    reported = []
+    def OnResult(result, progress):
+      reported.append((result.username, progress.done))
+    updater = self.updater(journal_path=None, on_result=OnResult)
+    changes = self.changes()
+    for result in updater.Apply(iter(changes)):
+      self.assert_(updater.progress.done > 0)
+    progress = updater.progress
+    self.assertEqual(progress.ToDict()['done'], len(changes))
+    self.assertEqual(progress.total, None)
+    self.assertEqual((progress.applied, progress.failed),
+                     (len(changes) - 1, 1))
+    self.assertEqual(sorted([done for username, done in reported]),
+                     range(1, len(changes) + 1))
+    self.assert_(str(progress).startswith('24/? done: 23 applied'))
+    self.assert_(progress.Rate() > 0)
+    updater.Run(changes)
+    self.assertEqual(updater.progress.total, len(changes))
+
+  def testJournalClosedAfterRun(self):
+    updater = self.updater()
+    updater.Run(self.changes()[:2])
+    self.assertEqual(updater.journal, None)
+    # The journal is closed when a run stops early too.
+    results = updater.Apply(self.changes()[2:])
+    results.next()
+    journal = updater.journal
+    self.assertFalse(journal._file.closed)
+    results.close()
+    self.assert_(journal._file.closed)
+    self.assertEqual(updater.journal, None)
+    # Changes which were in flight when the run stopped were journaled, so
+    # a rerun applies each remaining change exactly once.
+    self.updater().Run(self.changes()[2:])
+    self.assertEqual(len(self.requests), len(self.changes()))
+
+  def testUnknownMethod(self):
+    self.assertRaises(ValueError, Setting, 'UpdateNothing', value=1)
+    self.assertRaises(ValueError, Setting, '_serviceUrl', setting_id='x')
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(BulkUpdaterTest, 'test'),))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import unittest
+import urlparse
+import gdata.apps.groups.graph
+import gdata.apps.groups.service
+import gdata.apps.service
+import apps_server
+
+
+GROUPS = {
+    'all@example.com': ['staff@example.com', 'Contractors@example.com'],
+    'staff@example.com': ['liz@example.com', 'joe@example.com',
+                          'sales@example.com'],
+    'sales@example.com': ['ann@example.com', 'liz@example.com'],
+    'contractors@example.com': ['bob@example.com'],
+}
+
+
+ENTITY_DOES_NOT_EXIST = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n<AppsForYourDomainErrors>'
+    '<error errorCode="1301" invalidInput="" reason="EntityDoesNotExist" />'
+    '</AppsForYourDomainErrors>')
+
+
+class GroupsServer(apps_server.AppsServer):
+  """Answers for a missing group with the error of the real service."""
+
+  def respond(self, method, path, headers, body):
+    status, headers, body = apps_server.AppsServer.respond(
+        self, method, path, headers, body)
+    if status == 404 and urlparse.urlsplit(path)[2].endswith('/member'):
+      return 400, {}, ENTITY_DOES_NOT_EXIST
+    return status, headers, body
+
+
+class MembershipGraphTest(unittest.TestCase):
+
+  def setUp(self):
+    self.graph = gdata.apps.groups.graph.MembershipGraph()
+    for group_id, member_ids in GROUPS.iteritems():
+      self.graph.SetMembers(group_id, member_ids)
+
+  def testDirectIndexes(self):
+    self.assertEqual(self.graph.GetGroupIds(), frozenset(GROUPS))
+    self.assertEqual(self.graph.GetMembers('Sales@example.com'),
+                     frozenset(['ann@example.com', 'liz@example.com']))
+    self.assertEqual(self.graph.GetGroups('liz@example.com'),
+                     frozenset(['staff@example.com', 'sales@example.com']))
+    self.assertEqual(self.graph.GetMembers('none@example.com'), frozenset())
+    self.assertEqual(self.graph.GetGroups('none@example.com'), frozenset())
+
+  def testNestedMembership(self):
+    self.assertEqual(self.graph.GetAllMembers('all@example.com'),
+                     frozenset(['liz@example.com', 'joe@example.com',
+                                'ann@example.com', 'bob@example.com']))
+    self.assertEqual(
+        self.graph.GetAllMembers('all@example.com', include_groups=True),
+        frozenset(['liz@example.com', 'joe@example.com', 'ann@example.com',
+                   'bob@example.com', 'staff@example.com',
+                   'sales@example.com', 'contractors@example.com']))
+    self.assertEqual(self.graph.GetAllGroups('ANN@example.com'),
+                     frozenset(['sales@example.com', 'staff@example.com',
+                                'all@example.com']))
+    self.assert_(self.graph.IsMember('ann@example.com', 'all@example.com'))
+    self.assertFalse(self.graph.IsMember('ann@example.com', 'all@example.com',
+                                         direct_only=True))
+    self.assert_(self.graph.IsMember('ann@example.com', 'sales@example.com',
+                                     direct_only=True))
+    self.assertFalse(self.graph.IsMember('bob@example.com',
+                                         'staff@example.com'))
+
+  def testClosuresRemembered(self):
+    first = self.graph.GetAllGroups('ann@example.com')
+    self.assert_(self.graph.GetAllGroups('ann@example.com') is first)
+    members = self.graph.GetAllMembers('staff@example.com')
+    self.assert_(self.graph.GetAllMembers('staff@example.com') is members)
+
+  def testChangesUpdateClosures(self):
+    # Ask first, so that the answers are remembered.
+    self.assert_(self.graph.IsMember('ann@example.com', 'all@example.com'))
+    self.assertFalse(self.graph.IsMember('bob@example.com',
+                                         'staff@example.com'))
+    unrelated = self.graph.GetAllGroups('joe@example.com')
+    contractors = self.graph.GetAllMembers('contractors@example.com')
+    self.graph.SetMembers('staff@example.com',
+                          ['joe@example.com', 'contractors@example.com'])
+    self.assertFalse(self.graph.IsMember('ann@example.com', 'all@example.com'))
+    self.assert_(self.graph.IsMember('ann@example.com', 'sales@example.com'))
+    self.assert_(self.graph.IsMember('bob@example.com', 'staff@example.com'))
+    self.assertEqual(self.graph.GetAllMembers('all@example.com'),
+                     frozenset(['joe@example.com', 'bob@example.com']))
+    # Answers which the change could not affect are kept.
+    self.assert_(self.graph.GetAllMembers('contractors@example.com') is
+                 contractors)
+    self.assertEqual(self.graph.GetAllGroups('joe@example.com'), unrelated)
+    self.assertEqual(self.graph.GetGroups('liz@example.com'),
+                     frozenset(['sales@example.com']))
+
+  def testGroupRemoved(self):
+    self.assertEqual(len(self.graph.GetAllMembers('staff@example.com')), 3)
+    self.assert_('sales@example.com' in self.graph.GetAllMembers(
+        'all@example.com', include_groups=True))
+    self.assert_(self.graph.IsMember('sales@example.com', 'all@example.com'))
+    self.graph.RemoveGroup('sales@example.com')
+    # The group is taken out of the groups it was in, and their nested
+    # members are worked out again.
+    self.assertEqual(self.graph.GetMembers('staff@example.com'),
+                     frozenset(['liz@example.com', 'joe@example.com']))
+    self.assertEqual(self.graph.GetAllMembers('staff@example.com'),
+                     frozenset(['liz@example.com', 'joe@example.com']))
+    self.assertFalse('sales@example.com' in self.graph.GetAllMembers(
+        'all@example.com', include_groups=True))
+    self.assertEqual(self.graph.GetGroups('sales@example.com'), frozenset())
+    self.assertFalse(self.graph.IsMember('sales@example.com',
+                                         'all@example.com'))
+    self.assertFalse(self.graph.IsMember('ann@example.com',
+                                         'staff@example.com'))
+    self.assertFalse('sales@example.com' in self.graph.GetGroupIds())
+
+  def testCycles(self):
+    self.graph.SetMembers('contractors@example.com',
+                          ['bob@example.com', 'all@example.com'])
+    self.assertEqual(self.graph.GetAllGroups('bob@example.com'),
+                     frozenset(['contractors@example.com', 'all@example.com']))
+    self.assert_('all@example.com' in self.graph.GetAllMembers(
+        'all@example.com', include_groups=True))
+    self.assertEqual(len(self.graph.GetAllMembers('contractors@example.com')),
+                     4)
+
+
+class LoadTest(unittest.TestCase):
+
+  def setUp(self):
+    self.groups = dict((group_id.lower(), member_ids)
+                       for group_id, member_ids in GROUPS.iteritems())
+    self.server = GroupsServer('example.com', [], groups=self.groups,
+                               page_size=2).start()
+    self.service = self.server.configure_service(
+        gdata.apps.groups.service.GroupsService())
+    self.graph = gdata.apps.groups.graph.MembershipGraph(self.service,
+                                                         max_workers=4)
+
+  def tearDown(self):
+    self.server.stop()
+
+  def testLoad(self):
+    self.graph.Load()
+    self.assertEqual(self.graph.GetGroupIds(), frozenset(self.groups))
+    self.assertEqual(self.graph.GetAllGroups('ann@example.com'),
+                     frozenset(['sales@example.com', 'staff@example.com',
+                                'all@example.com']))
+    # Answers come from memory once the graph is loaded.
+    requests = len(self.server.paths)
+    for i in xrange(100):
+      self.graph.IsMember('liz@example.com', 'all@example.com')
+    self.assertEqual(len(self.server.paths), requests)
+
+  def testRefreshGroup(self):
+    self.graph.Load()
+    self.groups['sales@example.com'] = ['bob@example.com']
+    self.graph.RefreshGroup('sales@example.com')
+    self.assert_(self.graph.IsMember('bob@example.com', 'staff@example.com'))
+    self.assertFalse(self.graph.IsMember('ann@example.com', 'all@example.com'))
+    del self.groups['sales@example.com']
+    self.graph.RefreshGroup('sales@example.com')
+    self.assertFalse('sales@example.com' in self.graph.GetGroupIds())
+    self.assertFalse(self.graph.IsMember('bob@example.com',
+                                         'staff@example.com'))
+
+  def testErrorRaised(self):
+    self.service.domain = 'other.example.com'
+    self.assertRaises(gdata.apps.service.AppsForYourDomainException,
+                      self.graph.Load)
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(MembershipGraphTest, 'test'),
+                             unittest.makeSuite(LoadTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
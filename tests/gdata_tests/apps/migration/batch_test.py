@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import base64
+import threading
+import unittest
+import gdata
+import gdata.apps.migration.service
+import gdata.apps.service
+from gdata.apps import migration
+import local_server
+
+
+MESSAGE = """From: joe@example.com
+To: jane@example.com
+Subject: Message %i
+
+%s"""
+
+
+class MailBatchBuilderTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(self.respond).start()
+    self.service = gdata.apps.migration.service.MigrationService(
+        domain='example.com')
+    self.service.server = '%s:%i' % (self.server.host, self.server.port)
+    self.service.port = self.server.port
+    self.service.ssl = False
+    self.batches = []
+    self.status = 200
+    self.release = None
+
+  def tearDown(self):
+    if self.release is not None:
+      self.release.set()
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    if self.release is not None:
+      self.release.wait()
+    if self.status != 200:
+      return self.status, {}, 'Server error'
+    self.assert_(path.endswith('/a/feeds/migration/2.0/example.com/'
+                               'jane/mail/batch'))
+    batch = migration.BatchMailEventFeedFromString(body)
+    self.batches.append((len(body), batch))
+    result = migration.BatchMailEventFeed()
+    for entry in batch.entry:
+      result.entry.append(migration.BatchMailEntry(
+          batch_id=gdata.BatchId(text=entry.batch_id.text),
+          batch_status=gdata.BatchStatus(code='201', reason='Created')))
+    return 200, {'Content-Type': 'application/atom+xml'}, str(result)
+
+  def add_messages(self, builder, count, body='Hello'):
+    return [builder.AddMail(MESSAGE % (i, body), ['IS_INBOX'], ['Imported'])
+            for i in xrange(count)]
+
+  def submitted_messages(self):
+    return [base64.b64decode(entry.rfc822_msg.text)
+            for size, batch in self.batches for entry in batch.entry]
+
+  def testSplitsByEntryCount(self):
+    builder = self.service.CreateBatchBuilder('jane', max_entries=4)
+    batch_ids = self.add_messages(builder, 10)
+    results = builder.Close()
+    self.assertEqual(batch_ids, [str(i) for i in xrange(10)])
+    self.assertEqual([len(batch.entry) for size, batch in self.batches],
+                     [4, 4, 2])
+    self.assertEqual(self.submitted_messages(),
+                     [MESSAGE % (i, 'Hello') for i in xrange(10)])
+    self.assertEqual(len(results), 3)
+    self.assertEqual([entry.batch_id.text for entry in results[2].entry],
+                     ['8', '9'])
+    self.assertEqual(results[0].entry[0].batch_status.code, '201')
+    entry = self.batches[0][1].entry[0]
+    self.assertEqual(entry.rfc822_msg.encoding, 'base64')
+    self.assertEqual(entry.mail_item_property[0].value, 'IS_INBOX')
+    self.assertEqual(entry.label[0].label_name, 'Imported')
+
+  def testSplitsBySize(self):
+    builder = self.service.CreateBatchBuilder('jane', max_bytes=4000)
+    self.add_messages(builder, 12, body='x' * 500)
+    self.assert_(builder.size <= 4000)
+    builder.Close()
+    self.assert_(len(self.batches) > 1)
+    for size, batch in self.batches:
+      self.assert_(size <= 4000)
+    # Each batch is filled until the next message would not fit.
+    first_size, first = self.batches[0]
+    self.assert_(first_size + first_size / len(first.entry) > 4000)
+    self.assertEqual(len(self.submitted_messages()), 12)
+
+  def testSizeMatchesRequest(self):
+    builder = self.service.CreateBatchBuilder('jane')
+    self.add_messages(builder, 3)
+    size = builder.size
+    self.assertEqual(len(builder), 3)
+    builder.Close()
+    self.assertEqual(self.batches[0][0], size)
+    self.assertEqual(len(builder), 0)
+
+  def testMessageTooLarge(self):
+    builder = self.service.CreateBatchBuilder('jane', max_bytes=1000)
+    self.assertRaises(gdata.apps.service.Error, builder.AddMail,
+                      'x' * 1000, [], [])
+
+  def testNextBatchBuiltWhileSubmitting(self):
+    self.release = threading.Event()
+    builder = self.service.CreateBatchBuilder('jane', max_entries=2)
+    # The first batch is sent when it fills up, and is held by the server
+    # while the second is built.
+    self.add_messages(builder, 3)
+    self.assertEqual(len(builder), 1)
+    self.assertEqual(self.batches, [])
+    self.release.set()
+    builder.Close()
+    self.assertEqual([len(batch.entry) for size, batch in self.batches],
+                     [2, 1])
+
+  def testWithoutPipeline(self):
+    builder = self.service.CreateBatchBuilder('jane', max_entries=2,
+                                              pipeline=False)
+    self.add_messages(builder, 3)
+    self.assertEqual(len(self.batches), 1)
+    self.assertEqual(len(builder.Close()), 2)
+
+  def testErrorRaisedOnNextFlush(self):
+    self.status = 503
+    builder = self.service.CreateBatchBuilder('jane', max_entries=2)
+    self.add_messages(builder, 2)
+    builder.AddMail(MESSAGE % (2, 'Hello'), [], [])
+    self.assertRaises(gdata.apps.service.AppsForYourDomainException,
+                      builder.Close)
+    # The failed batch and the one which was being built are kept and can
+    # be sent again.
+    self.status = 200
+    self.assertEqual(len(builder), 1)
+    results = builder.Close()
+    self.assertEqual(self.submitted_messages(),
+                     [MESSAGE % (i, 'Hello') for i in xrange(3)])
+    self.assertEqual([[entry.batch_id.text for entry in result.entry]
+                      for result in results], [['0', '1'], ['2']])
+
+  def testFailedAddMailNotAdded(self):
+    self.status = 503
+    builder = self.service.CreateBatchBuilder('jane', max_entries=1)
+    # Adding the second message sends the first, without waiting for it,
+    # and the third raises its error without being added.
+    self.add_messages(builder, 2)
+    self.assertRaises(gdata.apps.service.AppsForYourDomainException,
+                      builder.AddMail, MESSAGE % (2, 'Hello'), [], [])
+    self.assertEqual((builder.added, len(builder)), (2, 1))
+    self.status = 200
+    self.assertEqual(builder.AddMail(MESSAGE % (2, 'Hello'), [], []), '2')
+    builder.Close()
+    self.assertEqual(self.submitted_messages(),
+                     [MESSAGE % (i, 'Hello') for i in xrange(3)])
+
+  def testAbandonDropsFailedBatch(self):
+    self.status = 503
+    builder = self.service.CreateBatchBuilder('jane', max_entries=2)
+    self.add_messages(builder, 3)
+    self.assertRaises(gdata.apps.service.AppsForYourDomainException,
+                      builder.Abandon)
+    self.status = 200
+    self.assertEqual(builder.Close(), [None])
+    self.assertEqual(self.batches, [])
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(MailBatchBuilderTest,
+                                                'test'),))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import base64
+import mailbox
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import gdata
+import gdata.apps.migration.importer
+import gdata.apps.migration.service
+import gdata.throttle
+from gdata.apps import migration
+import local_server
+
+
+MESSAGE = """From: joe@example.com
+To: %s@example.com
+Subject: Message %i
+
+Body of message %i.
+"""
+
+
+class CountingLimiter(object):
+
+  def __init__(self):
+    self.count = 0
+
+  def acquire(self):
+    self.count += 1
+
+
+class MailImporterTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.server = local_server.LocalServer(self.respond).start()
+    self.service = gdata.apps.migration.service.MigrationService(
+        domain='example.com')
+    self.service.server = '%s:%i' % (self.server.host, self.server.port)
+    self.service.port = self.server.port
+    self.service.ssl = False
+    self.received = {}
+    self.fail_after = None
+    self.reject = set()
+    self.in_flight = 0
+    self.most_in_flight = 0
+    self.lock = threading.Lock()
+
+  def tearDown(self):
+    self.server.stop()
+    shutil.rmtree(self.directory)
+
+  def respond(self, method, path, headers, body):
+    user_name = path.split('/')[-3]
+    batch = migration.BatchMailEventFeedFromString(body)
+    self.lock.acquire()
+    try:
+      if self.fail_after is not None:
+        if self.fail_after == 0:
+          return 503, {}, 'Try again later'
+        self.fail_after -= 1
+      self.in_flight += 1
+      self.most_in_flight = max(self.most_in_flight, self.in_flight)
+    finally:
+      self.lock.release()
+    time.sleep(0.02)
+    result = migration.BatchMailEventFeed()
+    messages = []
+    for entry in batch.entry:
+      message = base64.b64decode(entry.rfc822_msg.text)
+      code = '201'
+      if message in self.reject:
+        code = '400'
+      else:
+        messages.append(message)
+      result.entry.append(migration.BatchMailEntry(
+          batch_id=gdata.BatchId(text=entry.batch_id.text),
+          batch_status=gdata.BatchStatus(code=code)))
+    self.lock.acquire()
+    try:
+      self.received.setdefault(user_name, []).extend(messages)
+      self.in_flight -= 1
+    finally:
+      self.lock.release()
+    return 200, {'Content-Type': 'application/atom+xml'}, str(result)
+
+  def make_mbox(self, user_name, count):
+    path = os.path.join(self.directory, '%s.mbox' % user_name)
+    box = mailbox.mbox(path)
+    for i in xrange(count):
+      box.add(MESSAGE % (user_name, i, i))
+    box.close()
+    return path
+
+  def make_maildir(self, user_name, count):
+    path = os.path.join(self.directory, user_name)
+    box = mailbox.Maildir(path)
+    for i in xrange(count):
+      key = box.add(MESSAGE % (user_name, i, i))
+      # Give the messages names in delivery order.
+      os.rename(os.path.join(path, 'new', key),
+                os.path.join(path, 'new', '%04i.%s' % (i, key)))
+    return path
+
+  def messages(self, user_name, count):
+    return [MESSAGE % (user_name, i, i) for i in xrange(count)]
+
+  def importer(self, **kwargs):
+    kwargs.setdefault('max_entries', 3)
+    return gdata.apps.migration.importer.MailImporter(self.service, **kwargs)
+
+  def testImportsMboxAndMaildir(self):
+    jobs = [gdata.apps.migration.importer.ImportJob(
+                'liz', self.make_mbox('liz', 7), mail_labels=['Old mail']),
+            gdata.apps.migration.importer.ImportJob(
+                'joe', self.make_maildir('joe', 5))]
+    results = self.importer().Import(jobs)
+    self.assertEqual([result.user_name for result in results],
+                     ['liz', 'joe'])
+    self.assertEqual([result.imported for result in results], [7, 5])
+    for result in results:
+      self.assert_(result.Succeeded())
+      self.assertEqual(result.error, None)
+    self.assertEqual(self.received['liz'], self.messages('liz', 7))
+    self.assertEqual(self.received['joe'], self.messages('joe', 5))
+
+  def testUsersImportedInParallel(self):
+    jobs = [gdata.apps.migration.importer.ImportJob(
+                'user%i' % i, self.make_mbox('user%i' % i, 6))
+            for i in xrange(4)]
+    importer = self.importer(max_workers=4)
+    importer.rate_limiter = CountingLimiter()
+    results = importer.Import(jobs)
+    self.assertEqual([result.imported for result in results], [6] * 4)
+    self.assert_(self.most_in_flight > 1)
+    # Two batches for each user.
+    self.assertEqual(importer.rate_limiter.count, 8)
+
+  def testRateLimit(self):
+    importer = self.importer(rate=100)
+    self.assert_(isinstance(importer.rate_limiter,
+                            gdata.throttle.TokenBucket))
+    self.assertEqual(importer.rate_limiter.rate, 100)
+
+  def testRejectedMessagesCounted(self):
+    self.reject.add(MESSAGE % ('liz', 1, 1))
+    result = self.importer().Import([gdata.apps.migration.importer.ImportJob(
+        'liz', self.make_mbox('liz', 4))])[0]
+    self.assertEqual((result.imported, result.failed), (3, 1))
+
+  def testResumesFromCheckpoint(self):
+    checkpoint_path = os.path.join(self.directory, 'import.checkpoint')
+    job = gdata.apps.migration.importer.ImportJob(
+        'liz', self.make_mbox('liz', 10))
+    # The third batch is refused, so the first six messages are recorded.
+    self.fail_after = 2
+    result = self.importer(checkpoint_path=checkpoint_path).Import([job])[0]
+    self.assertFalse(result.Succeeded())
+    self.assert_(isinstance(result.error,
+                            gdata.apps.service.AppsForYourDomainException))
+    self.assertEqual(result.imported, 6)
+    self.assertEqual(len(self.received['liz']), 6)
+    self.fail_after = None
+    result = self.importer(checkpoint_path=checkpoint_path).Import([job])[0]
+    self.assert_(result.Succeeded())
+    self.assertEqual((result.skipped, result.imported), (6, 4))
+    self.assertEqual(self.received['liz'], self.messages('liz', 10))
+    # A finished job sends nothing when it is run again.
+    result = self.importer(checkpoint_path=checkpoint_path).Import([job])[0]
+    self.assertEqual((result.skipped, result.imported), (10, 0))
+    self.assertEqual(len(self.received['liz']), 10)
+
+  def testMissingMailbox(self):
+    result = self.importer().Import([gdata.apps.migration.importer.ImportJob(
+        'liz', os.path.join(self.directory, 'missing'))])[0]
+    self.assert_(isinstance(result.error, IOError))
+
+
+class CheckpointTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+    self.path = os.path.join(self.directory, 'checkpoint')
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def testSavedAndLoaded(self):
+    job = gdata.apps.migration.importer.ImportJob('liz', '/mail/a\tb.mbox')
+    other = gdata.apps.migration.importer.ImportJob('liz', '/mail/other')
+    checkpoint = gdata.apps.migration.importer.Checkpoint(self.path)
+    self.assertEqual(checkpoint.Get(job), 0)
+    checkpoint.Set(job, 12)
+    checkpoint.Set(other, 3)
+    loaded = gdata.apps.migration.importer.Checkpoint(self.path)
+    self.assertEqual(loaded.Get(job), 12)
+    self.assertEqual(loaded.Get(other), 3)
+    self.assertEqual(os.listdir(self.directory), ['checkpoint'])
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(MailImporterTest, 'test'),
+                             unittest.makeSuite(CheckpointTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
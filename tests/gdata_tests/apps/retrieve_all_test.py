@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import time
+import unittest
+import gdata.apps.groups.service
+import gdata.apps.service
+import gdata.service
+import apps_server
+
+
+USERS = ['user%03i' % i for i in xrange(25)]
+GROUP_ID = 'staff@example.com'
+MEMBERS = ['%s@example.com' % user for user in USERS[:12]]
+
+
+class FailingServer(apps_server.AppsServer):
+  """Answers every request after the first with a server error."""
+
+  def respond(self, method, path, headers, body):
+    status, headers, body = apps_server.AppsServer.respond(
+        self, method, path, headers, body)
+    if len(self.paths) > 1:
+      return 503, {}, 'Service unavailable'
+    return status, headers, body
+
+
+class RetrieveAllTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = apps_server.AppsServer(
+        'example.com', USERS,
+        nicknames=dict(('nick-%s' % user, user) for user in USERS[:15]),
+        email_lists=['list%02i' % i for i in xrange(11)],
+        groups={GROUP_ID: MEMBERS}, page_size=10).start()
+    self.apps = self.server.configure_service(
+        gdata.apps.service.AppsService())
+    self.groups = self.server.configure_service(
+        gdata.apps.groups.service.GroupsService())
+
+  def tearDown(self):
+    self.server.stop()
+
+  def wait_for_requests(self, count):
+    for i in xrange(100):
+      if self.server.request_count >= count:
+        return
+      time.sleep(0.01)
+
+  def testRetrieveAllUsersMatchesGenerator(self):
+    feed = self.apps.RetrieveAllUsers()
+    self.assert_(isinstance(feed, gdata.apps.UserFeed))
+    self.assertEqual([entry.login.user_name for entry in feed.entry], USERS)
+    for prefetch in (0, 1, 3):
+      entries = self.apps.GetEntryGeneratorForAllUsers(prefetch=prefetch)
+      self.assertEqual([entry.login.user_name for entry in entries], USERS)
+
+  def testOtherFeeds(self):
+    nicknames = [entry.nickname.name
+                 for entry in self.apps.GetEntryGeneratorForAllNicknames()]
+    self.assertEqual(len(nicknames), 15)
+    self.assertEqual(nicknames, [entry.nickname.name for entry in
+                                 self.apps.RetrieveAllNicknames().entry])
+    lists = [entry.email_list.name
+             for entry in self.apps.GetEntryGeneratorForAllEmailLists()]
+    self.assertEqual(lists, ['list%02i' % i for i in xrange(11)])
+    self.assertEqual(len(self.apps.RetrieveAllEmailLists().entry), 11)
+
+  def testGroupMembers(self):
+    members = self.groups.GetGeneratorForAllMembers(GROUP_ID, prefetch=0)
+    self.assertEqual(members.next()['memberId'], MEMBERS[0])
+    self.assertEqual(self.server.request_count, 1)
+    self.assertEqual([member['memberId'] for member in members], MEMBERS[1:])
+    self.assertEqual(self.server.request_count, 2)
+    self.assertEqual([member['memberId'] for member in
+                      self.groups.RetrieveAllMembers(GROUP_ID)], MEMBERS)
+    self.assertEqual(self.groups.RetrieveAllGroups()[0]['groupId'], GROUP_ID)
+
+  def testPagesFetchedOnDemand(self):
+    entries = self.apps.GetEntryGeneratorForAllUsers(prefetch=0)
+    self.assertEqual(self.server.request_count, 1)
+    for i in xrange(10):
+      entries.next()
+    self.assertEqual(self.server.request_count, 1)
+    entries.next()
+    self.assertEqual(self.server.request_count, 2)
+
+  def testPrefetchIsBounded(self):
+    entries = self.apps.GetEntryGeneratorForAllUsers(prefetch=1)
+    self.assertEqual(entries.next().login.user_name, USERS[0])
+    self.wait_for_requests(2)
+    time.sleep(0.1)
+    # Only one page is downloaded ahead of the page being read.
+    self.assertEqual(self.server.request_count, 2)
+    self.assertEqual(len(list(entries)), 24)
+    self.assertEqual(self.server.request_count, 3)
+
+  def testClosedGeneratorStopsFetching(self):
+    entries = self.apps.GetEntryGeneratorForAllUsers(prefetch=1)
+    entries.next()
+    entries.close()
+    time.sleep(0.1)
+    self.assert_(self.server.request_count <= 2)
+
+  def testErrorOnLaterPageIsRaised(self):
+    for prefetch in (0, 1):
+      self.server.groups[GROUP_ID] = MEMBERS
+      members = self.groups.GetGeneratorForAllMembers(GROUP_ID,
+                                                      prefetch=prefetch)
+      del self.server.groups[GROUP_ID]
+      try:
+        list(members)
+        self.fail('The missing second page should raise RequestError')
+      except gdata.service.RequestError, e:
+        self.assertEqual(e.args[0]['status'], 404)
+
+
+class RetrieveAllErrorTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = FailingServer('example.com', USERS,
+                                groups={GROUP_ID: MEMBERS},
+                                page_size=10).start()
+    self.apps = self.server.configure_service(
+        gdata.apps.service.AppsService())
+    self.groups = self.server.configure_service(
+        gdata.apps.groups.service.GroupsService())
+
+  def tearDown(self):
+    self.server.stop()
+
+  def assertFailsOnce(self, service, retrieve_all):
+    prefetched = []
+    service._FetchPages = lambda *args: prefetched.append(args)
+    start = time.time()
+    try:
+      retrieve_all()
+      self.fail('The second page should raise RequestError')
+    except gdata.service.RequestError, e:
+      self.assertEqual(e.args[0]['status'], 503)
+    # The page is not retried after a wait, or fetched on another thread.
+    self.assertEqual(len(self.server.paths), 2)
+    self.assert_(time.time() - start < 0.5)
+    self.assertEqual(prefetched, [])
+
+  def testRetrieveAllUsers(self):
+    self.assertFailsOnce(self.apps, self.apps.RetrieveAllUsers)
+
+  def testRetrieveAllMembers(self):
+    self.assertFailsOnce(self.groups,
+                         lambda: self.groups.RetrieveAllMembers(GROUP_ID))
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(RetrieveAllTest, 'test'),
+                             unittest.makeSuite(RetrieveAllErrorTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+# This module is used for version 2 of the Google Data APIs.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import shutil
+import tempfile
+import time
+import unittest
+import atom.data
+import atom.http_core
+import gdata.cache
+import gdata.client
+import gdata.data
+import gdata.gauth
+import local_server
+
+
+class MemoryStorageTest(unittest.TestCase):
+
+  def make_storage(self, max_entries=3, max_bytes=1000):
+    return gdata.cache.MemoryStorage(max_entries=max_entries,
+                                     max_bytes=max_bytes)
+
+  def entry(self, body):
+    return gdata.cache.CacheEntry('"%s"' % body, body,
+                                  {'Content-Type': 'text/plain'})
+
+  def test_round_trip(self):
+    storage = self.make_storage()
+    storage.put('a', self.entry('alpha'))
+    entry = storage.get('a')
+    self.assertEqual(entry.etag, '"alpha"')
+    self.assertEqual(entry.body, 'alpha')
+    self.assertEqual(entry.headers, {'Content-Type': 'text/plain'})
+    self.assertEqual(storage.get('b'), None)
+    storage.delete('a')
+    self.assertEqual(storage.get('a'), None)
+
+  def test_least_recently_used_evicted(self):
+    storage = self.make_storage()
+    for key in ('a', 'b', 'c'):
+      storage.put(key, self.entry(key))
+      time.sleep(0.01)
+    storage.get('a')
+    time.sleep(0.01)
+    storage.put('d', self.entry('d'))
+    self.assertEqual(storage.get('b'), None)
+    for key in ('a', 'c', 'd'):
+      self.assertEqual(storage.get(key).body, key)
+
+  def test_size_bound(self):
+    storage = self.make_storage(max_entries=10, max_bytes=25)
+    storage.put('a', self.entry('x' * 10))
+    time.sleep(0.01)
+    storage.put('b', self.entry('y' * 10))
+    time.sleep(0.01)
+    storage.put('c', self.entry('z' * 10))
+    self.assertEqual(storage.get('a'), None)
+    self.assertEqual(storage.get('c').body, 'z' * 10)
+
+
+class DirectoryStorageTest(MemoryStorageTest):
+
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.path)
+
+  def make_storage(self, max_entries=3, max_bytes=1000):
+    # Allow for the line of metadata stored with each body.
+    return gdata.cache.DirectoryStorage(self.path, max_entries=max_entries,
+                                        max_bytes=max_bytes + 70)
+
+
+class SqliteStorageTest(MemoryStorageTest):
+
+  def make_storage(self, max_entries=3, max_bytes=1000):
+    return gdata.cache.SqliteStorage(':memory:', max_entries=max_entries,
+                                     max_bytes=max_bytes)
+
+
+class AnonymousToken(object):
+  """An auth token with no secret to identify its user."""
+
+  def modify_request(self, http_request):
+    return http_request
+
+
+class ResponseCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.version = 1
+    self.full_responses = 0
+    self.server = local_server.LocalServer(self.respond).start()
+    self.client = gdata.client.GDClient()
+    self.client.http_client = atom.http_core.HttpClient()
+    self.client.response_cache = gdata.cache.ResponseCache()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    etag = '"v%i"' % self.version
+    if headers.getheader('If-None-Match') == etag:
+      return 304, {'ETag': etag}, ''
+    self.full_responses += 1
+    feed = gdata.data.GDFeed(id=atom.data.Id('%s v%i' % (path,
+                                                         self.version)))
+    return 200, {'ETag': etag, 'Content-Type': 'application/atom+xml'}, (
+        feed.to_string())
+
+  def test_not_modified_served_from_cache(self):
+    url = self.server.url('/feed')
+    for i in xrange(3):
+      feed = self.client.get_feed(url)
+      self.assertEqual(feed.id.text, '/feed v1')
+    self.assertEqual(self.full_responses, 1)
+    self.assertEqual(self.client.response_cache.hits, 2)
+    self.version = 2
+    self.assertEqual(self.client.get_feed(url).id.text, '/feed v2')
+    self.assertEqual(self.full_responses, 2)
+
+  def test_users_do_not_share_responses(self):
+    url = self.server.url('/feed')
+    self.client.get_feed(url, auth_token=gdata.gauth.ClientLoginToken('a'))
+    self.client.get_feed(url, auth_token=gdata.gauth.ClientLoginToken('b'))
+    self.assertEqual(self.full_responses, 2)
+    self.client.get_feed(url, auth_token=gdata.gauth.ClientLoginToken('a'))
+    self.assertEqual(self.full_responses, 2)
+
+  def test_token_without_identity_not_cached(self):
+    url = self.server.url('/feed')
+    for i in xrange(2):
+      self.client.get_feed(url, auth_token=AnonymousToken())
+    self.assertEqual(self.full_responses, 2)
+    self.assertEqual(self.client.response_cache.stores, 0)
+
+  def test_token_cache_scope(self):
+    url = self.server.url('/feed')
+    for user in ('a', 'b', 'a'):
+      token = AnonymousToken()
+      token.cache_scope = user
+      self.client.get_feed(url, auth_token=token)
+    self.assertEqual(self.full_responses, 2)
+    self.assertEqual(self.client.response_cache.hits, 1)
+    two_legged = [gdata.gauth.TwoLeggedOAuthHmacToken('key', 'secret', user)
+                  for user in ('a', 'b', 'a')]
+    scopes = [gdata.cache.get_auth_scope(token) for token in two_legged]
+    self.assertNotEqual(scopes[0], scopes[1])
+    self.assertEqual(scopes[0], scopes[2])
+
+  def test_explicit_etag_bypasses_cache(self):
+    url = self.server.url('/entry')
+    self.client.get_feed(url)
+    self.assertRaises(gdata.client.NotModified, self.client.get_entry, url,
+                      etag='"v1"')
+
+
+def suite():
+  return unittest.TestSuite((
+      unittest.makeSuite(MemoryStorageTest, 'test'),
+      unittest.makeSuite(DirectoryStorageTest, 'test'),
+      unittest.makeSuite(SqliteStorageTest, 'test'),
+      unittest.makeSuite(ResponseCacheTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -24,9 +24,11 @@ try:
 except ImportError:
   from elementtree import ElementTree
 import atom 
+import atom.mock_http_core
 import gdata
 from gdata import test_data
 import gdata.calendar
+import gdata.calendar.service
 
 
 class CalendarFeedTest(unittest.TestCase):
@@ -900,6 +902,21 @@ class ExtendedPropertyTest(unittest.TestCase):
     ep2 = gdata.ExtendedPropertyFromString(xml_string)
     self.assertEquals(ep.name, ep2.name)
     self.assertEquals(ep.value, ep2.value)
+
+
+class CalendarServiceParseTest(unittest.TestCase):
+
+  def testEventFeedParsedAsCalendarClass(self):
+    client = gdata.calendar.service.CalendarService()
+    client.http_client.v2_http_client = atom.mock_http_core.SettableHttpClient(
+        200, 'OK', test_data.CALENDAR_FULL_EVENT_FEED, {})
+    feed = client.Get('http://www.google.com/calendar/feeds/default/full')
+    self.assert_(isinstance(feed, gdata.calendar.CalendarEventFeed))
+    self.assert_(isinstance(feed.entry[0], gdata.calendar.CalendarEventEntry))
+    client.http_client.v2_http_client = atom.mock_http_core.SettableHttpClient(
+        200, 'OK', test_data.CALENDAR_FEED, {})
+    feed = client.Get('http://www.google.com/calendar/feeds/default')
+    self.assertEqual(feed.__class__, gdata.GDataFeed)
       
 
 if __name__ == '__main__':
@@ -21,12 +21,23 @@
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
+import cgi
+import itertools
+import re
 import unittest
+import urlparse
 import gdata.client
+import gdata.executor
 import gdata.gauth
 import gdata.data
+import atom.core
+import atom.data
 import atom.mock_http_core
+import socket
 import StringIO
+import threading
+import time
+import local_server
 
 
 class ClientLoginTest(unittest.TestCase):
@@ -309,6 +320,604 @@ class RequestTest(unittest.TestCase):
     self.assert_(isinstance(result, TestClass))
 
 
+class AsyncGDClientTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(self.respond).start()
+    self.client = gdata.client.AsyncGDClient()
+
+  def tearDown(self):
+    self.client.async_http_client.close()
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    if path.startswith('/redirect') and 'gsessionid' not in path:
+      return 302, {'Location': self.server.url(path + '?gsessionid=42')}, ''
+    elif path.startswith('/missing'):
+      return 404, {}, 'Not here'
+    elif path.startswith('/feed'):
+      feed = gdata.data.GDFeed()
+      feed.entry.append(gdata.data.GDEntry(id=atom.data.Id(path)))
+      if 'start=2' not in path:
+        feed.link.append(atom.data.Link(
+            rel='next', href=self.server.url('/feed?start=2')))
+      return 200, {'Content-Type': 'application/atom+xml'}, feed.to_string()
+    entry = gdata.data.GDEntry(id=atom.data.Id(path))
+    return 200, {'Content-Type': 'application/atom+xml'}, entry.to_string()
+
+  def test_concurrent_get_entry(self):
+    pending = [self.client.get_entry(self.server.url('/entry/%i' % i))
+               for i in xrange(20)]
+    self.client.run()
+    for i in xrange(20):
+      entry = pending[i].result()
+      self.assert_(isinstance(entry, gdata.data.GDEntry))
+      self.assertEqual(entry.id.text, '/entry/%i' % i)
+
+  def test_redirect_and_errors(self):
+    entry = self.client.get_entry(self.server.url('/redirect')).result()
+    self.assertEqual(entry.id.text, '/redirect?gsessionid=42')
+    missing = self.client.get_entry(self.server.url('/missing'))
+    self.assertRaises(gdata.client.RequestError, missing.result)
+    self.assertEqual(missing.exception().status, 404)
+
+  def test_iter_entries(self):
+    ids = [entry.id.text for entry in
+           self.client.iter_entries(self.server.url('/feed'))]
+    self.assertEqual(ids, ['/feed', '/feed?start=2'])
+
+  def test_thread_based_helpers_not_supported(self):
+    uris = [self.server.url('/feed')]
+    self.assertRaises(NotImplementedError, self.client.request_many, uris)
+    self.assertRaises(NotImplementedError, self.client.RequestMany, uris)
+    self.assertRaises(NotImplementedError, self.client.get_feeds, uris)
+    self.assertRaises(NotImplementedError, self.client.batch, [], uris[0])
+    self.assertRaises(NotImplementedError,
+                      self.client.get_entries_parallel, uris[0])
+    self.assertEqual(self.server.request_count, 0)
+
+  def test_unsupported_members_raise(self):
+    self.client.retry_policy = gdata.client.RetryPolicy()
+    self.assertRaises(NotImplementedError, self.client.get_entry,
+                      self.server.url('/entry'))
+    self.assertEqual(self.server.request_count, 0)
+
+
+class RequestManyTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(self.respond).start()
+    self.client = gdata.client.GDClient()
+    self.client.http_client = atom.http_core.HttpClient()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    if path.startswith('/missing'):
+      return 404, {}, 'Not here'
+    feed = gdata.data.GDFeed(id=atom.data.Id(path))
+    return 200, {'Content-Type': 'application/atom+xml'}, feed.to_string()
+
+  def test_get_feeds_in_order(self):
+    uris = [self.server.url('/feed/%i' % i) for i in xrange(30)]
+    results = list(self.client.get_feeds(uris, max_workers=4))
+    self.assertEqual([r.item for r in results], uris)
+    for i, result in enumerate(results):
+      self.assert_(result.succeeded())
+      self.assert_(isinstance(result.value, gdata.data.GDFeed))
+      self.assertEqual(result.value.id.text, '/feed/%i' % i)
+    self.assert_(len(self.server.connections) <= 4)
+
+  def test_connection_pool_only_for_call(self):
+    uris = [self.server.url('/feed/%i' % i) for i in xrange(5)]
+    list(self.client.get_feeds(uris, max_workers=2))
+    self.assertEqual(self.client.http_client.connection_pool, None)
+    # A pool which the caller set up is kept.
+    connection_pool = self.client.use_connection_pool()
+    list(self.client.get_feeds(uris, max_workers=2))
+    self.assert_(self.client.http_client.connection_pool is connection_pool)
+
+  def test_errors_captured_per_item(self):
+    uris = [self.server.url('/feed/1'), self.server.url('/missing'),
+            self.server.url('/feed/2')]
+    results = list(self.client.get_feeds(uris, ordered=False))
+    self.assertEqual(sorted([r.index for r in results]), [0, 1, 2])
+    failed = [r for r in results if not r.succeeded()]
+    self.assertEqual(len(failed), 1)
+    self.assertEqual(failed[0].item, uris[1])
+    self.assert_(isinstance(failed[0].exception, gdata.client.RequestError))
+    self.assertEqual(failed[0].exception.status, 404)
+    self.assertRaises(gdata.client.RequestError, failed[0].get)
+
+
+class GetEntriesTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(self.respond).start()
+    self.client = gdata.client.GDClient()
+    self.client.http_client = atom.http_core.HttpClient()
+    self.pages = 5
+    self.requested = []
+    # If True the last page links to a page which fails.
+    self.fail_at_end = False
+
+  def tearDown(self):
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    page = int(path.split('/')[-1])
+    self.requested.append(page)
+    if page == 99:
+      return 500, {}, 'Server error'
+    feed = gdata.data.GDFeed()
+    for i in xrange(3):
+      feed.entry.append(
+          gdata.data.GDEntry(id=atom.data.Id('%i.%i' % (page, i))))
+    if page < self.pages:
+      feed.link.append(atom.data.Link(
+          rel='next', href=self.server.url('/feed/%i' % (page + 1))))
+    elif page == self.pages and self.fail_at_end:
+      feed.link.append(atom.data.Link(rel='next',
+                                      href=self.server.url('/feed/99')))
+    return 200, {'Content-Type': 'application/atom+xml'}, feed.to_string()
+
+  def expected_ids(self):
+    return ['%i.%i' % (page, i) for page in xrange(1, self.pages + 1)
+            for i in xrange(3)]
+
+  def test_all_pages_in_order(self):
+    for prefetch in (0, 1, 3):
+      entries = list(self.client.get_entries(self.server.url('/feed/1'),
+                                             prefetch=prefetch))
+      self.assertEqual([e.id.text for e in entries], self.expected_ids())
+
+  def test_next_page_fetched_in_background(self):
+    entries = self.client.get_entries(self.server.url('/feed/1'), prefetch=2)
+    entries.next()
+    # While the first page is being read, two more are downloaded and no
+    # further.
+    deadline = time.time() + 5
+    while len(self.requested) < 3 and time.time() < deadline:
+      time.sleep(0.01)
+    time.sleep(0.1)
+    self.assertEqual(self.requested, [1, 2, 3])
+    entries.close()
+    time.sleep(0.1)
+    self.assertEqual(self.requested, [1, 2, 3])
+
+  def test_error_raised_after_earlier_pages(self):
+    self.fail_at_end = True
+    ids = []
+    try:
+      for entry in self.client.get_entries(self.server.url('/feed/1')):
+        ids.append(entry.id.text)
+      self.fail('Expected a RequestError')
+    except gdata.client.RequestError, error:
+      self.assertEqual(error.status, 500)
+    self.assertEqual(ids, self.expected_ids())
+
+
+class GetEntriesParallelTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(self.respond).start()
+    self.client = gdata.client.GDClient()
+    self.client.http_client = atom.http_core.HttpClient()
+    self.ids = ['entry%i' % i for i in xrange(23)]
+    self.requested = []
+    # Ids inserted at the front of the feed after the first request.
+    self.inserted = []
+    self.send_totals = True
+
+  def tearDown(self):
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    query = cgi.parse_qs(urlparse.urlparse(path)[4])
+    start = int(query.get('start-index', ['1'])[0])
+    per_page = int(query.get('max-results', ['5'])[0])
+    self.requested.append(start)
+    ids = self.ids
+    if len(self.requested) > 1:
+      ids = self.inserted + ids
+    feed = gdata.data.GDFeed()
+    for entry_id in ids[start - 1:start - 1 + per_page]:
+      feed.entry.append(gdata.data.GDEntry(id=atom.data.Id(entry_id)))
+    if self.send_totals:
+      feed.total_results = gdata.data.TotalResults(text=str(len(ids)))
+      feed.start_index = gdata.data.StartIndex(text=str(start))
+      feed.items_per_page = gdata.data.ItemsPerPage(text=str(per_page))
+    if start + per_page <= len(ids):
+      feed.link.append(atom.data.Link(rel='next', href=self.server.url(
+          '/feed?start-index=%i&max-results=%i' % (start + per_page,
+                                                   per_page))))
+    return 200, {'Content-Type': 'application/atom+xml'}, feed.to_string()
+
+  def test_pages_requested_by_index(self):
+    entries = list(self.client.get_entries_parallel(
+        self.server.url('/feed'), max_workers=3))
+    self.assertEqual([e.id.text for e in entries], self.ids)
+    self.assertEqual(sorted(self.requested), [1, 6, 11, 16, 21])
+
+  def test_page_size_from_uri(self):
+    entries = list(self.client.get_entries_parallel(
+        self.server.url('/feed?max-results=10')))
+    self.assertEqual([e.id.text for e in entries], self.ids)
+    self.assertEqual(sorted(self.requested), [1, 11, 21])
+
+  def test_shifted_feed_deduplicated(self):
+    self.inserted = ['new0', 'new1', 'new2']
+    entries = list(self.client.get_entries_parallel(
+        self.server.url('/feed')))
+    # Every original entry is returned once, and the feed grew so the last
+    # page's next link is followed.
+    self.assertEqual([e.id.text for e in entries], self.ids)
+    self.assertEqual(sorted(self.requested), [1, 6, 11, 16, 21, 26])
+
+  def test_next_links_without_totals(self):
+    self.send_totals = False
+    entries = list(self.client.get_entries_parallel(
+        self.server.url('/feed')))
+    self.assertEqual([e.id.text for e in entries], self.ids)
+    self.assertEqual(self.requested, [1, 6, 11, 16, 21])
+
+  def test_query_applied_to_first_page_only(self):
+    # Applied to the next links, start-index=1 would ask for the first
+    # page again and again.
+    self.send_totals = False
+    query = gdata.client.Query(start_index=1, max_results=10)
+    for entries in (self.client.get_entries(self.server.url('/feed'),
+                                            prefetch=0, q=query),
+                    self.client.get_entries(self.server.url('/feed'),
+                                            prefetch=1, q=query),
+                    self.client.get_entries_parallel(self.server.url('/feed'),
+                                                     q=query)):
+      del self.requested[:]
+      ids = [entry.id.text for entry in itertools.islice(entries, 30)]
+      self.assertEqual(ids, self.ids)
+      self.assertEqual(self.requested, [1, 11, 21])
+
+
+class SingleFlightTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(self.respond).start()
+    self.client = gdata.client.GDClient()
+    self.client.http_client = atom.http_core.HttpClient()
+    self.client.single_flight = gdata.executor.SingleFlight()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    time.sleep(0.3)
+    return (200, {'Content-Type': 'application/atom+xml'},
+            gdata.data.GDFeed(id=atom.data.Id(path)).to_string())
+
+  def run_threads(self, function, count):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(function()))
+               for i in xrange(count)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    return results
+
+  def test_identical_gets_share_one_request(self):
+    url = self.server.url('/feed')
+    feeds = self.run_threads(lambda: self.client.get_feed(url), 8)
+    self.assertEqual(len(feeds), 8)
+    self.assertEqual(self.server.request_count, 1)
+    self.assert_(all([feed is feeds[0] for feed in feeds]))
+    self.assertEqual(self.client.single_flight.shared, 7)
+
+  def test_different_users_not_shared(self):
+    url = self.server.url('/feed')
+    tokens = [gdata.gauth.ClientLoginToken('token%i' % (i % 2))
+              for i in xrange(6)]
+    self.run_threads(lambda: self.client.get_feed(url,
+                                                  auth_token=tokens.pop()), 6)
+    self.assertEqual(self.server.request_count, 2)
+
+  def test_posts_not_shared(self):
+    url = self.server.url('/feed')
+    self.run_threads(lambda: self.client.post(gdata.data.GDEntry(), url), 3)
+    self.assertEqual(self.server.request_count, 3)
+    self.assertEqual(self.client.single_flight.calls, 0)
+
+
+class ThreadSafetyTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(self.respond).start()
+    self.client = gdata.client.GDClient()
+    self.client.http_client = atom.http_core.HttpClient()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    # Each user's feed has its own session, as in Google Calendar.
+    user = path.split('/')[3]
+    if not path.endswith('?gsessionid=s' + user):
+      return 302, {'Location': self.server.url(
+          path.split('?')[0] + '?gsessionid=s' + user)}, ''
+    entry = gdata.data.GDEntry(id=atom.data.Id(
+        '%s %s %s' % (method, path, headers.get('X-Worker'))))
+    return 200, {'Content-Type': 'application/atom+xml'}, entry.to_string()
+
+  def test_one_client_serves_many_threads(self):
+    self.client.use_connection_pool(16)
+    failures = []
+
+    def work(worker):
+      url = self.server.url('/calendar/feeds/user%i/full' % (worker % 4))
+      expected = '/calendar/feeds/user%i/full?gsessionid=suser%i %i' % (
+          worker % 4, worker % 4, worker)
+      for i in xrange(10):
+        try:
+          if i % 2:
+            entry = self.client.post(gdata.data.GDEntry(), url,
+                                     headers={'X-Worker': str(worker)})
+          else:
+            entry = self.client.get_entry(url,
+                                          headers={'X-Worker': str(worker)})
+        except Exception, error:
+          failures.append(error)
+          continue
+        if not entry.id.text.endswith(expected):
+          failures.append(entry.id.text)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in xrange(16)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(failures, [])
+    # Only a thread's first request can be redirected to its feed's session.
+    self.assert_(4 <= self.client.session_ids.redirects <= 16)
+    self.assertEqual(self.server.request_count,
+                     160 + self.client.session_ids.redirects)
+    self.assert_(len(self.server.connections) <= 16)
+    self.assert_(self.client.use_connection_pool() is
+                 self.client.http_client.connection_pool)
+
+  def test_request_headers_not_kept(self):
+    url = self.server.url('/calendar/feeds/user1/full')
+    entry = self.client.get_entry(url, headers={'X-Worker': '7'})
+    self.assert_(entry.id.text.endswith(' 7'))
+    entry = self.client.get_entry(url)
+    self.assert_(entry.id.text.endswith(' None'))
+
+  def test_shared_uri_not_changed(self):
+    uri = atom.http_core.Uri.parse_uri(
+        self.server.url('/calendar/feeds/user2/full'))
+    self.client.get_entry(uri)
+    self.client.get_entry(uri)
+    self.assertEqual(uri.query, {})
+    self.assertEqual(self.client.session_ids.redirects, 1)
+
+
+class BatchTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(self.respond).start()
+    self.client = gdata.client.GDClient()
+    self.client.http_client = atom.http_core.HttpClient()
+    self.batches = []
+    # The number of entries the server processes before interrupting the
+    # next batch, None to process every entry.
+    self.interrupt_after = None
+
+  def tearDown(self):
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    request = atom.core.parse(body, gdata.data.BatchFeed)
+    self.batches.append(request)
+    response = gdata.data.BatchFeed()
+    entries = request.entry
+    if self.interrupt_after is not None:
+      entries = entries[:self.interrupt_after]
+      response.interrupted = gdata.data.BatchInterrupted(
+          reason='quota', parsed=str(len(request.entry)),
+          success=str(len(entries)), failures='0')
+      self.interrupt_after = None
+    for entry in entries:
+      if entry.title is not None and entry.title.text == 'bad':
+        code, reason = '400', 'Bad Request'
+      else:
+        code, reason = '201', 'Created'
+      response.entry.append(gdata.data.BatchEntry(
+          id=entry.id, title=entry.title, batch_id=entry.batch_id,
+          batch_status=gdata.data.BatchStatus(code=code, reason=reason)))
+    return 200, {'Content-Type': 'application/atom+xml'}, response.to_string()
+
+  def operations(self, count):
+    return [(gdata.data.BATCH_INSERT,
+             gdata.data.GDEntry(title=atom.data.Title('entry %i' % i)))
+            for i in xrange(count)]
+
+  def test_chunks_and_correlates(self):
+    operations = self.operations(250)
+    operations[7] = (gdata.data.BATCH_INSERT,
+                     gdata.data.GDEntry(title=atom.data.Title('bad')))
+    results = self.client.batch(operations, self.server.url('/batch'),
+                                max_workers=3)
+    self.assertEqual(sorted([len(b.entry) for b in self.batches]),
+                     [50, 100, 100])
+    self.assertEqual(len(results), 250)
+    for i, result in enumerate(results):
+      self.assertEqual(result.index, i)
+      self.assert_(result.entry is operations[i][1])
+      self.assertEqual(result.response.title.text,
+                       operations[i][1].title.text)
+    self.assertEqual(results[7].code, 400)
+    self.assert_(not results[7].succeeded())
+    self.assertEqual(results[8].code, 201)
+    self.assert_(results[8].succeeded())
+    # The entries passed in are not modified.
+    self.assert_(getattr(operations[0][1], 'batch_id', None) is None)
+
+  def test_byte_limit(self):
+    self.client.batch(self.operations(20), self.server.url('/batch'),
+                      max_bytes=2000)
+    sizes = [len(b.entry) for b in self.batches]
+    self.assertEqual(sum(sizes), 20)
+    self.assert_(len(sizes) > 1)
+
+  def test_delete_by_url_and_feed_batch_link(self):
+    feed = gdata.data.BatchFeed()
+    feed.link.append(atom.data.Link(
+        rel='http://schemas.google.com/g/2005#batch',
+        href=self.server.url('/batch')))
+    results = self.client.batch(
+        [(gdata.data.BATCH_DELETE, 'http://example.com/entry/1')], feed)
+    self.assertEqual(results[0].response.id.text,
+                     'http://example.com/entry/1')
+    sent = self.batches[0].entry[0]
+    self.assertEqual(sent.batch_operation.type, gdata.data.BATCH_DELETE)
+    self.assertRaises(gdata.client.Error, self.client.batch, [],
+                      gdata.data.BatchFeed())
+
+  def test_interrupted_batch_resubmitted(self):
+    self.interrupt_after = 3
+    results = self.client.batch(self.operations(10),
+                                self.server.url('/batch'))
+    self.assertEqual([len(b.entry) for b in self.batches], [10, 7])
+    self.assert_(all([result.succeeded() for result in results]))
+
+  def test_request_error_recorded(self):
+    self.server.stop()
+    results = self.client.batch(self.operations(3),
+                                self.server.url('/batch'))
+    self.server = local_server.LocalServer(self.respond).start()
+    for result in results:
+      self.assert_(not result.succeeded())
+      self.assert_(result.exception is not None)
+
+
+class SequenceHttpClient(object):
+  """Returns the given responses, or raises the given errors, in order."""
+
+  def __init__(self, *outcomes):
+    self.outcomes = list(outcomes)
+    self.requests = []
+
+  def request(self, http_request):
+    self.requests.append(http_request)
+    outcome = self.outcomes.pop(0)
+    if isinstance(outcome, Exception):
+      raise outcome
+    return outcome
+
+
+def mock_response(status, headers=None, body=''):
+  return atom.mock_http_core.MockHttpResponse(status=status, reason='',
+                                              headers=headers, body=body)
+
+
+class AttemptLog(object):
+
+  def __init__(self):
+    self.attempts = []
+
+  def attempt_finished(self, attempt):
+    self.attempts.append(attempt)
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+  def setUp(self):
+    self.sleeps = []
+    self.now = [1000.0]
+    self.log = AttemptLog()
+    self.policy = gdata.client.RetryPolicy(observer=self.log)
+    self.policy._random = lambda: 1.0
+    self.policy._time = lambda: self.now[0]
+    self.policy._sleep = self.sleep
+    self.client = gdata.client.GDClient()
+    self.client.retry_policy = self.policy
+
+  def sleep(self, seconds):
+    self.sleeps.append(seconds)
+    self.now[0] += seconds
+
+  def test_get_retried_with_backoff(self):
+    self.client.http_client = SequenceHttpClient(
+        mock_response(503), socket.error('reset'),
+        mock_response(200, body='ok'))
+    response = self.client.request('GET', 'http://example.com/feed')
+    self.assertEqual(response.read(), 'ok')
+    self.assertEqual(self.sleeps, [0.5, 1.0])
+    self.assertEqual([a.status for a in self.log.attempts], [503, None, 200])
+    self.assert_(isinstance(self.log.attempts[1].error, socket.error))
+    self.assertEqual(self.log.attempts[2].delay, None)
+    self.assertEqual((self.policy.attempts, self.policy.retries,
+                      self.policy.exhausted), (3, 2, 0))
+
+  def test_full_jitter(self):
+    self.policy._random = lambda: 0.25
+    self.assertEqual(self.policy.get_delay(1), 0.125)
+    self.assertEqual(self.policy.get_delay(4), 1.0)
+    self.policy._random = lambda: 1.0
+    self.assertEqual(self.policy.get_delay(20), self.policy.max_delay)
+
+  def test_retry_after(self):
+    self.client.http_client = SequenceHttpClient(
+        mock_response(503, {'Retry-After': '7'}), mock_response(200))
+    self.client.request('GET', 'http://example.com/feed')
+    self.assertEqual(self.sleeps, [7.0])
+
+  def test_time_budget(self):
+    self.policy.time_budget = 5
+    self.client.http_client = SequenceHttpClient(
+        mock_response(503, {'Retry-After': '10'}, 'busy'))
+    self.assertRaises(gdata.client.RequestError, self.client.request,
+                      'GET', 'http://example.com/feed')
+    self.assertEqual(self.sleeps, [])
+    self.assertEqual(self.policy.exhausted, 1)
+
+  def test_post_not_retried(self):
+    self.client.http_client = SequenceHttpClient(mock_response(503))
+    self.assertRaises(gdata.client.RequestError, self.client.request,
+                      'POST', 'http://example.com/feed')
+    self.assertEqual(len(self.log.attempts), 1)
+
+  def test_conditional_put_retried(self):
+    entry = gdata.data.GDEntry(etag='"abc"')
+    entry.link.append(atom.data.Link(rel='edit',
+                                     href='http://example.com/e/1'))
+    self.client.http_client = SequenceHttpClient(
+        mock_response(500), mock_response(200, body=entry.to_string()))
+    self.client.update(entry)
+    self.assertEqual(len(self.log.attempts), 2)
+    # Forcing the update removes the precondition, so it is not retried.
+    self.client.http_client = SequenceHttpClient(mock_response(500))
+    self.assertRaises(gdata.client.RequestError, self.client.update, entry,
+                      force=True)
+    self.assertEqual(len(self.log.attempts), 3)
+
+  def test_oauth_retry_signed_again(self):
+    http_client = SequenceHttpClient(mock_response(503), mock_response(200))
+    self.client.http_client = http_client
+    token = gdata.gauth.TwoLeggedOAuthHmacToken('example.com', 'secret',
+                                                'user@example.com')
+    self.client.request('GET', 'http://example.com/feed', auth_token=token)
+    first, second = http_client.requests
+    self.assert_(first is not second)
+    # Each attempt has its own nonce and signature.
+    nonces = [re.search('oauth_nonce="([^"]+)"',
+                        request.headers['Authorization']).group(1)
+              for request in (first, second)]
+    self.assertNotEqual(nonces[0], nonces[1])
+    self.assertNotEqual(first.headers['Authorization'],
+                        second.headers['Authorization'])
+    self.assertEqual(str(first.uri), str(second.uri))
+
+
 class QueryTest(unittest.TestCase):
 
   def test_query_modifies_request(self):
@@ -329,6 +938,75 @@ class QueryTest(unittest.TestCase):
     self.assertEqual(
         client.http_client.last_request.uri.query['max-results'], '7')
 
+  def test_fields(self):
+    request = atom.http_core.HttpRequest()
+    gdata.client.Query(fields='entry(title)').modify_request(request)
+    self.assertEqual(request.uri.query, {'fields': 'entry(title)'})
+    client = gdata.client.GDClient()
+    client.http_client = atom.mock_http_core.SettableHttpClient(
+        200, 'OK', gdata.data.GDFeed().to_string(), {})
+    client.get_feed('http://example.com/feed?a=b', fields='entry(title)')
+    self.assertEqual(client.http_client.last_request.uri.query,
+                     {'a': 'b', 'fields': 'entry(title)'})
+
+
+class PatchTest(unittest.TestCase):
+
+  def setUp(self):
+    self.client = gdata.client.GDClient()
+    self.client.api_version = '2'
+    self.original = gdata.data.GDEntry(
+        etag='"abc"', id=atom.data.Id('http://example.com/1'),
+        title=atom.data.Title('old'), content=atom.data.Content('body'),
+        link=[atom.data.Link(rel='edit', href='http://example.com/1')])
+    self.entry = atom.core.parse(self.original.to_string(), gdata.data.GDEntry)
+    self.client.http_client = atom.mock_http_core.SettableHttpClient(
+        200, 'OK', self.entry.to_string(), {})
+
+  def sent_entry(self):
+    request = self.client.http_client.last_request
+    self.assertEqual(request.method, 'PATCH')
+    self.assertEqual(str(request.uri), 'http://example.com/1')
+    return atom.core.parse(request._body_parts[0], gdata.data.GDEntry)
+
+  def test_changed_members_sent(self):
+    self.entry.title.text = 'new'
+    self.entry.category.append(atom.data.Category(term='x'))
+    result = self.client.patch(self.entry, self.original)
+    self.assert_(isinstance(result, gdata.data.GDEntry))
+    sent = self.sent_entry()
+    self.assertEqual(sent.title.text, 'new')
+    self.assertEqual(sent.category[0].term, 'x')
+    self.assert_(sent.content is None)
+    self.assert_(sent.id is None)
+    self.assertEqual(
+        sent._other_attributes['{http://schemas.google.com/g/2005}fields'],
+        'category,title')
+    self.assertEqual(
+        self.client.http_client.last_request.headers['If-Match'], '"abc"')
+
+  def test_removed_member_named_in_fields(self):
+    self.entry.content = None
+    self.client.patch(self.entry, self.original, force=True)
+    sent = self.sent_entry()
+    self.assert_(sent.content is None)
+    self.assertEqual(
+        sent._other_attributes['{http://schemas.google.com/g/2005}fields'],
+        'content')
+    self.assertEqual(
+        self.client.http_client.last_request.headers['If-Match'], '*')
+
+  def test_explicit_fields(self):
+    self.client.patch(self.entry, fields=['title'])
+    self.assertEqual(self.sent_entry().title.text, 'old')
+    self.assertRaises(ValueError, self.client.patch, self.entry,
+                      fields=['nothing'])
+    self.assertRaises(gdata.client.Error, self.client.patch, self.entry)
+
+  def test_unchanged_entry_not_sent(self):
+    self.assert_(self.client.patch(self.entry, self.original) is self.entry)
+    self.assert_(self.client.http_client.last_request is None)
+
 
 class VersionConversionTest(unittest.TestCase):
 
@@ -343,12 +1021,22 @@ class VersionConversionTest(unittest.TestCase):
 
 
 def suite():
-  return unittest.TestSuite((unittest.makeSuite(ClientLoginTest, 'test'),
-                             unittest.makeSuite(AuthSubTest, 'test'),
-                             unittest.makeSuite(OAuthTest, 'test'),
-                             unittest.makeSuite(RequestTest, 'test'),
-                             unittest.makeSuite(VersionConversionTest, 'test'),
-                             unittest.makeSuite(QueryTest, 'test')))
+  return unittest.TestSuite((
+      unittest.makeSuite(ClientLoginTest, 'test'),
+      unittest.makeSuite(AuthSubTest, 'test'),
+      unittest.makeSuite(OAuthTest, 'test'),
+      unittest.makeSuite(RequestTest, 'test'),
+      unittest.makeSuite(AsyncGDClientTest, 'test'),
+      unittest.makeSuite(RequestManyTest, 'test'),
+      unittest.makeSuite(GetEntriesTest, 'test'),
+      unittest.makeSuite(GetEntriesParallelTest, 'test'),
+      unittest.makeSuite(BatchTest, 'test'),
+      unittest.makeSuite(SingleFlightTest, 'test'),
+      unittest.makeSuite(ThreadSafetyTest, 'test'),
+      unittest.makeSuite(RetryPolicyTest, 'test'),
+      unittest.makeSuite(VersionConversionTest, 'test'),
+      unittest.makeSuite(QueryTest, 'test'),
+      unittest.makeSuite(PatchTest, 'test')))
 
 
 if __name__ == '__main__':
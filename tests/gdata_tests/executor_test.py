@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+# This module is used for version 2 of the Google Data APIs.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import threading
+import time
+import unittest
+import gdata.executor
+
+
+class ThreadPoolTest(unittest.TestCase):
+
+  def setUp(self):
+    self.pool = gdata.executor.ThreadPool(max_workers=3)
+
+  def tearDown(self):
+    self.pool.shutdown()
+
+  def test_shutdown_waits_for_queued_tasks(self):
+    finished = []
+    def slow(x):
+      time.sleep(0.01)
+      finished.append(x)
+    results = self.pool.map(slow, range(3))
+    results.next()
+    results.close()
+    self.pool.shutdown(wait=True)
+    self.assertEqual(sorted(finished), [0, 1, 2])
+
+  def test_ordered_results(self):
+    def slow_square(x):
+      # Later items finish first.
+      time.sleep(0.01 * (10 - x))
+      return x * x
+    results = list(self.pool.map(slow_square, range(10)))
+    self.assertEqual([r.value for r in results], [x * x for x in range(10)])
+    self.assertEqual([r.index for r in results], range(10))
+
+  def test_concurrency_is_bounded(self):
+    lock = threading.Lock()
+    state = {'running': 0, 'most': 0}
+    def task(x):
+      lock.acquire()
+      state['running'] += 1
+      state['most'] = max(state['most'], state['running'])
+      lock.release()
+      time.sleep(0.01)
+      lock.acquire()
+      state['running'] -= 1
+      lock.release()
+      return x
+    results = list(self.pool.map(task, xrange(20), ordered=False))
+    self.assertEqual(sorted([r.value for r in results]), range(20))
+    self.assert_(state['most'] <= 3)
+
+  def test_ordered_look_ahead_is_bounded(self):
+    release = threading.Event()
+    started = []
+    def task(x):
+      started.append(x)
+      if x == 0:
+        release.wait()
+      return x
+    results = []
+    reader = threading.Thread(target=lambda: results.extend(
+        self.pool.map(task, xrange(20))))
+    reader.start()
+    try:
+      time.sleep(0.1)
+      # While the first item is held, only the two after it are started.
+      self.assertEqual(sorted(started), [0, 1, 2])
+    finally:
+      release.set()
+      reader.join()
+    self.assertEqual([r.value for r in results], range(20))
+
+  def test_exceptions_captured(self):
+    def task(x):
+      if x == 2:
+        raise ValueError('bad item')
+      return x
+    results = list(self.pool.map(task, range(4)))
+    self.assertEqual([r.succeeded() for r in results],
+                     [True, True, False, True])
+    self.assert_(isinstance(results[2].exception, ValueError))
+    self.assertRaises(ValueError, results[2].get)
+    self.assertEqual(results[3].get(), 3)
+
+
+class SingleFlightTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flight = gdata.executor.SingleFlight()
+    self.release = threading.Event()
+    self.calls = []
+
+  def slow_call(self, value):
+    def call():
+      self.calls.append(value)
+      self.release.wait()
+      if isinstance(value, Exception):
+        raise value
+      return value
+    return call
+
+  def run_callers(self, key, value, count):
+    outcomes = []
+    def caller():
+      try:
+        outcomes.append(self.flight.do(key, self.slow_call(value)))
+      except Exception, error:
+        outcomes.append(error)
+    threads = [threading.Thread(target=caller) for i in xrange(count)]
+    for thread in threads:
+      thread.start()
+    # Wait until every caller has joined the flight.
+    deadline = time.time() + 5
+    while self.flight.shared < count - 1 and time.time() < deadline:
+      time.sleep(0.01)
+    self.release.set()
+    for thread in threads:
+      thread.join()
+    return outcomes
+
+  def test_concurrent_calls_shared(self):
+    outcomes = self.run_callers('key', 42, 5)
+    self.assertEqual(outcomes, [42] * 5)
+    self.assertEqual(self.calls, [42])
+    self.assertEqual(self.flight.calls, 1)
+    self.assertEqual(self.flight.shared, 4)
+    # Later calls are made again.
+    self.assertEqual(self.flight.do('key', self.slow_call(7)), 7)
+    self.assertEqual(self.flight.calls, 2)
+
+  def test_exception_shared(self):
+    error = ValueError('bad')
+    outcomes = self.run_callers('key', error, 3)
+    self.assertEqual(outcomes, [error] * 3)
+    self.assertEqual(len(self.calls), 1)
+
+  def test_different_keys_not_shared(self):
+    self.release.set()
+    self.assertEqual(self.flight.do('a', self.slow_call(1)), 1)
+    self.assertEqual(self.flight.do('b', self.slow_call(2)), 2)
+    self.assertEqual(self.flight.calls, 2)
+    self.assertEqual(self.flight.shared, 0)
+
+  def test_reentrant_call(self):
+    def outer():
+      return self.flight.do('key', lambda: 'inner') + ' outer'
+    self.assertEqual(self.flight.do('key', outer), 'inner outer')
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(ThreadPoolTest, 'test'),
+                             unittest.makeSuite(SingleFlightTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -21,8 +21,14 @@
 __author__ = 'j.s@google.com (Jeff Scudder)'
 
 
+import base64
+import threading
 import unittest
 import gdata.gauth
+import gdata.oauth
+import gdata.oauth.rsa
+from gdata.tlslite.utils import cryptomath
+from gdata.tlslite.utils import keyfactory
 import atom.http_core
 import gdata.test_config as conf
 
@@ -433,6 +439,129 @@ class OAuthRsaTokenTests(unittest.TestCase):
         'knwPZH1sKK46Y0ePJvEIDI3JDd7pRZuMM2sN8=')
 
 
+class RsaKeyCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.cache = gdata.gauth.RsaKeyCache(max_keys=2)
+    self.public_key = keyfactory.parsePrivateKey(PRIVATE_TEST_KEY)
+
+  def test_key_parsed_once(self):
+    key = self.cache.get(PRIVATE_TEST_KEY)
+    self.assert_(key.hasPrivateKey())
+    self.assert_(self.cache.get(PRIVATE_TEST_KEY) is key)
+    self.cache.sign(PRIVATE_TEST_KEY, 'data')
+    self.assertEqual((self.cache.misses, self.cache.hits), (1, 2))
+
+  def test_least_recently_used_key_dropped(self):
+    # Equivalent keys which differ in their whitespace.
+    keys = [PRIVATE_TEST_KEY + '\n' * i for i in xrange(3)]
+    first = self.cache.get(keys[0])
+    self.cache.get(keys[1])
+    self.assert_(self.cache.get(keys[0]) is first)
+    self.cache.get(keys[2])
+    self.assert_(self.cache.get(keys[0]) is first)
+    self.assertEqual(self.cache.misses, 3)
+    self.cache.get(keys[1])
+    self.assertEqual(self.cache.misses, 4)
+    self.cache.clear()
+    self.assert_(self.cache.get(keys[0]) is not first)
+
+  def test_signatures_from_many_threads(self):
+    signatures = {}
+    def sign(i):
+      data = 'request %i' % i
+      signatures[data] = self.cache.sign(PRIVATE_TEST_KEY, data)
+    threads = [threading.Thread(target=sign, args=(i,)) for i in xrange(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(len(signatures), 8)
+    for data, signature in signatures.iteritems():
+      self.assert_(self.public_key.hashAndVerify(signature, data))
+    self.assertEqual(self.cache.misses + self.cache.hits, 8)
+
+  def test_shared_by_signature_functions(self):
+    gdata.gauth.rsa_key_cache.clear()
+    misses = gdata.gauth.rsa_key_cache.misses
+    signature = gdata.gauth.generate_signature('data', PRIVATE_TEST_KEY)
+    self.assert_(self.public_key.hashAndVerify(
+        _decode(signature), 'data'))
+    request = atom.http_core.HttpRequest('http://example.com/feed', 'GET')
+    gdata.gauth.generate_rsa_signature(request, 'anonymous', PRIVATE_TEST_KEY,
+                                       '1246491360', 'nonce', '1.0')
+
+    class Method(gdata.oauth.rsa.OAuthSignatureMethod_RSA_SHA1):
+      def _fetch_private_cert(self, oauth_request):
+        return PRIVATE_TEST_KEY
+
+    oauth_request = gdata.oauth.OAuthRequest(
+        http_method='GET', http_url='http://example.com/feed',
+        parameters={'oauth_nonce': 'nonce'})
+    signature = Method().build_signature(oauth_request, None, None)
+    self.assert_(self.public_key.hashAndVerify(
+        _decode(signature),
+        Method().build_signature_base_string(oauth_request, None, None)[1]))
+    self.assertEqual(gdata.gauth.rsa_key_cache.misses, misses + 1)
+
+
+class PowModTest(unittest.TestCase):
+
+  def tearDown(self):
+    cryptomath.setPowMod(self.chosen)
+
+  def setUp(self):
+    self.chosen = cryptomath.powModName
+
+  def test_backends_agree(self):
+    modulus = 2 ** 127 - 1
+    names = [name for name, function in cryptomath.powModBackends]
+    if cryptomath.gmpyLoaded:
+      self.assertEqual(names[:2], ['gmpy', 'pow'])
+    else:
+      self.assertEqual(names[0], 'pow')
+    self.assertEqual(names[-1], 'legacy')
+    self.assert_(self.chosen in names)
+    for name, function in cryptomath.powModBackends:
+      self.assertEqual(function(12345, 678901, modulus),
+                       pow(12345, 678901, modulus))
+      self.assertEqual(function(7, -5, 1000003), 148153)
+
+  def test_set_pow_mod(self):
+    key = keyfactory.parsePrivateKey(PRIVATE_TEST_KEY)
+    signatures = []
+    for name, function in cryptomath.powModBackends:
+      cryptomath.setPowMod(name)
+      self.assertEqual(cryptomath.powModName, name)
+      signatures.append(key.hashAndSign('data'))
+      self.assert_(key.hashAndVerify(signatures[-1], 'data'))
+    # PKCS #1 signatures do not depend on the blinding values.
+    self.assertEqual(signatures, [signatures[0]] * len(signatures))
+    self.assertRaises(ValueError, cryptomath.setPowMod, 'none')
+    self.assertEqual(cryptomath.powModName, name)
+
+  def test_choice_needs_clear_margin(self):
+    timings = {'first': 1.0, 'second': 0.95, 'third': 0.8}
+    backends = cryptomath.powModBackends
+    time_pow_mod = cryptomath.timePowMod
+    try:
+      cryptomath.powModBackends = [(name, name) for name in
+                                   ('first', 'second', 'third')]
+      cryptomath.timePowMod = timings.get
+      # 5% faster is within the noise, 20% faster is not.
+      self.assertEqual(cryptomath.choosePowMod(), 'third')
+      timings['third'] = 0.95
+      self.assertEqual(cryptomath.choosePowMod(), 'first')
+      self.assertEqual(cryptomath.choosePowMod(margin=0.01), 'second')
+    finally:
+      cryptomath.powModBackends = backends
+      cryptomath.timePowMod = time_pow_mod
+
+
+def _decode(signature):
+  return cryptomath.stringToBytes(base64.b64decode(signature))
+
+
 class OAuthHeaderTest(unittest.TestCase):
 
   def test_generate_auth_header(self):
@@ -563,6 +692,7 @@ class FindScopesForService(unittest.TestCase):
 def suite():
   return conf.build_suite([AuthSubTest, TokensToAndFromBlobsTest,
                            OAuthHmacTokenTests, OAuthRsaTokenTests,
+                           RsaKeyCacheTest, PowModTest,
                            OAuthHeaderTest, OAuthGetRequestToken,
                            OAuthAuthorizeToken, FindScopesForService])
 
@@ -33,6 +33,7 @@ import os.path
 from gdata import test_data
 import atom.mock_http
 import atom.mock_http_core
+import local_server
 
 
 username = ''
@@ -416,6 +417,18 @@ class DeleteWithUrlParamsTest(unittest.TestCase):
     self.assertEqual(request.uri.path, '/test')
     self.assertEqual(request.uri.query, {'urlParam1': 'a', 
         'urlParam2': 'test', 'gsessionid': 'test_session_id'})
+
+  def testCallerDictsNotChanged(self):
+    self.gd_client._SetSessionId('test_session_id')
+    headers = {'TestHeader': '123'}
+    url_params = {'urlParam1': 'a'}
+    self.gd_client.Delete('http://example.com/test', headers, url_params)
+    self.gd_client.Post('<entry/>', 'http://example.com/test', headers,
+                        url_params, converter=str)
+    self.assertEqual(headers, {'TestHeader': '123'})
+    self.assertEqual(url_params, {'urlParam1': 'a'})
+    request = self.gd_client.http_client.v2_http_client.last_request
+    self.assertEqual(request.uri.query['gsessionid'], 'test_session_id')
       
 
 class QueryTest(unittest.TestCase):
@@ -505,6 +518,63 @@ class GetNextPageInFeedTest(unittest.TestCase):
     self.assert_(feed2.__class__ == feed.__class__)
 
 
+class PaginationTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = local_server.LocalServer(self.respond).start()
+    self.gd_client = gdata.service.GDataService()
+    self.conversions = 0
+
+  def tearDown(self):
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    page = int(path.split('page=')[1])
+    feed = gdata.GDataFeed(entry=[
+        gdata.GDataEntry(atom_id=atom.Id(text='%i.%i' % (page, i)))
+        for i in xrange(2)])
+    if page < 3:
+      feed.link.append(atom.Link(rel='next', link_type='application/atom+xml',
+          href=self.server.url('/feed?page=%i' % (page + 1))))
+    return 200, {'Content-Type': 'application/atom+xml'}, str(feed)
+
+  def convert(self, xml_string):
+    self.conversions += 1
+    return gdata.base.GBaseItemFeedFromString(xml_string)
+
+  def testEachPageParsedOnce(self):
+    first = self.gd_client.Get(self.server.url('/feed?page=1'),
+                               converter=self.convert)
+    pages = list(self.gd_client.GetGeneratorFromLinkFinder(first,
+                                                           self.convert))
+    self.assertEqual(len(pages), 3)
+    self.assertEqual(self.conversions, 3)
+    for page in pages:
+      self.assert_(isinstance(page, gdata.base.GBaseItemFeed))
+
+  def testEntriesStreamed(self):
+    first = self.gd_client.Get(self.server.url('/feed?page=1'),
+                               converter=self.convert)
+    entries = self.gd_client.GetEntryGeneratorFromLinkFinder(first,
+                                                             self.convert)
+    self.assertEqual(entries.next().id.text, '1.0')
+    self.assertEqual(entries.next().id.text, '1.1')
+    # The next page is only requested once its entries are needed.
+    self.assertEqual(self.server.request_count, 1)
+    rest = [entry.id.text for entry in entries]
+    self.assertEqual(rest, ['2.0', '2.1', '3.0', '3.1'])
+    self.assertEqual(self.server.request_count, 3)
+    for entry in first.entry:
+      self.assert_(isinstance(entry, gdata.base.GBaseItem))
+
+  def testPrivateNameStillWorks(self):
+    first = self.gd_client.Get(self.server.url('/feed?page=2'),
+                               converter=self.convert)
+    entries = list(self.gd_client._GetElementGeneratorFromLinkFinder(
+        first, self.convert))
+    self.assertEqual(len(entries), 4)
+
+
 class ScopeLookupTest(unittest.TestCase):
 
   def testLookupScopes(self):
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import cgi
+import unittest
+import urlparse
+import atom.http
+import atom.http_core
+import gdata.client
+import gdata.data
+import gdata.service
+import gdata.sessions
+import local_server
+
+
+class SessionIdCacheTest(unittest.TestCase):
+
+  def test_find_session_id(self):
+    self.assertEqual(gdata.sessions.find_session_id(
+        'http://example.com/feed?a=b&gsessionid=xyz'), 'xyz')
+    self.assertEqual(gdata.sessions.find_session_id(
+        'http://example.com/feed?a=b'), None)
+
+  def test_ids_by_host_and_prefix(self):
+    cache = gdata.sessions.SessionIdCache()
+    cache.put('example.com', '/calendar/feeds/a/private/full', '1')
+    cache.put('example.com', '/calendar/feeds/b/private/full', '2')
+    cache.put('example.org', '/calendar/feeds/a/private/full', '3')
+    self.assertEqual(cache.get('example.com', '/calendar/feeds/a/acl/full'),
+                     '1')
+    self.assertEqual(cache.get('example.com', '/calendar/feeds/b'), '2')
+    self.assertEqual(cache.get('example.org', '/calendar/feeds/a/x'), '3')
+    # Unknown prefixes use the host's latest session id.
+    self.assertEqual(cache.get('example.com', '/calendar/feeds/c'), '2')
+    self.assertEqual(cache.get('example.net', '/calendar/feeds/a'), None)
+    cache.default = '0'
+    self.assertEqual(cache.get('example.net', '/calendar/feeds/a'), '0')
+
+  def test_redirects_counted(self):
+    cache = gdata.sessions.SessionIdCache()
+    cache.redirected('example.com', '/calendar/feeds/a', '1')
+    self.assertEqual(cache.redirects, 1)
+    self.assertEqual(cache.get('example.com', '/calendar/feeds/a'), '1')
+    cache.clear()
+    self.assertEqual(cache.get('example.com', '/calendar/feeds/a'), None)
+
+
+class CalendarSessionTest(unittest.TestCase):
+  """Two calendars with different sessions, read alternately."""
+
+  def setUp(self):
+    self.server = local_server.LocalServer(self.respond).start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def respond(self, method, path, headers, body):
+    url = urlparse.urlparse(path)
+    calendar = url[2].split('/')[3]
+    session_id = cgi.parse_qs(url[4]).get('gsessionid', [None])[0]
+    if session_id != 'session' + calendar:
+      return 302, {'Location': self.server.url(
+          '%s?gsessionid=session%s' % (url[2], calendar))}, ''
+    if method == 'POST':
+      return 201, {'Content-Type': 'application/atom+xml'}, body
+    return (200, {'Content-Type': 'application/atom+xml'},
+            gdata.data.GDFeed().to_string())
+
+  def feed_urls(self):
+    return [self.server.url('/calendar/feeds/%s/private/full' % calendar)
+            for calendar in ('a', 'b', 'a', 'b', 'a', 'b')]
+
+  def test_client_redirected_once_per_calendar(self):
+    client = gdata.client.GDClient()
+    client.http_client = atom.http_core.HttpClient()
+    for url in self.feed_urls():
+      client.get_feed(url)
+    self.assertEqual(client.session_ids.redirects, 2)
+    self.assertEqual(self.server.request_count, 8)
+
+  def test_service_redirected_once_per_calendar(self):
+    service = gdata.service.GDataService(http_client=atom.http.HttpClient())
+    for url in self.feed_urls():
+      service.Get(url)
+    self.assertEqual(service.session_ids.redirects, 2)
+    self.assertEqual(self.server.request_count, 8)
+
+  def test_client_posts(self):
+    client = gdata.client.GDClient()
+    client.http_client = atom.http_core.HttpClient()
+    for url in self.feed_urls():
+      client.post(gdata.data.GDEntry(), url)
+    self.assertEqual(client.session_ids.redirects, 2)
+    self.assertEqual(self.server.request_count, 8)
+
+  def test_service_posts(self):
+    service = gdata.service.GDataService(http_client=atom.http.HttpClient())
+    for url in self.feed_urls():
+      service.Post(gdata.data.GDEntry().to_string(), url)
+    self.assertEqual(service.session_ids.redirects, 2)
+    self.assertEqual(self.server.request_count, 8)
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(SessionIdCacheTest, 'test'),
+                             unittest.makeSuite(CalendarSessionTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
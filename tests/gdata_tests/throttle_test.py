@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import threading
+import time
+import unittest
+import atom.http
+import atom.http_core
+import gdata.client
+import gdata.service
+import gdata.throttle
+import local_server
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.now = 1000.0
+    self.sleeps = []
+
+  def time(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.sleeps.append(seconds)
+    self.now += seconds
+
+
+class TokenBucketTest(unittest.TestCase):
+
+  def setUp(self):
+    self.clock = FakeClock()
+    gdata.throttle.TokenBucket._time = self.clock.time
+    gdata.throttle.TokenBucket._sleep = self.clock.sleep
+
+  def tearDown(self):
+    gdata.throttle.TokenBucket._time = staticmethod(time.time)
+    gdata.throttle.TokenBucket._sleep = staticmethod(time.sleep)
+
+  def test_rate_and_burst(self):
+    bucket = gdata.throttle.TokenBucket(rate=2, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    self.assertEqual(self.clock.sleeps, [])
+    self.assert_(not bucket.try_acquire())
+    bucket.acquire()
+    self.assertEqual(self.clock.sleeps, [0.5])
+    self.clock.now += 10
+    # Tokens do not accumulate beyond the burst size.
+    self.assert_(bucket.try_acquire())
+    self.assert_(bucket.try_acquire())
+    self.assert_(not bucket.try_acquire())
+
+
+class AimdControllerTest(unittest.TestCase):
+
+  def test_additive_increase(self):
+    controller = gdata.throttle.AimdController(initial_limit=2, max_limit=3)
+    controller.release(controller.acquire())
+    self.assertEqual(controller.limit, 2.5)
+    controller.release(controller.acquire())
+    self.assertAlmostEqual(controller.limit, 2.9)
+    controller.release(controller.acquire())
+    self.assertEqual(controller.limit, 3.0)
+
+  def test_one_decrease_per_round(self):
+    controller = gdata.throttle.AimdController(initial_limit=8)
+    starts = [controller.acquire() for i in xrange(4)]
+    controller.release(starts[0], failed=True)
+    self.assertEqual(controller.limit, 4.0)
+    # These were sent before the limit was lowered.
+    controller.release(starts[1], failed=True)
+    controller.release(starts[2], failed=True)
+    self.assertEqual(controller.limit, 4.0)
+    controller.release(starts[3])
+    self.assertEqual(controller.limit, 4.25)
+    time.sleep(0.01)
+    controller.release(controller.acquire(), failed=True)
+    self.assertEqual(controller.limit, 2.125)
+    self.assertEqual(controller.in_flight, 0)
+
+  def test_slow_response_counts_as_failure(self):
+    controller = gdata.throttle.AimdController(initial_limit=4,
+                                               max_latency=0.01)
+    start = controller.acquire()
+    time.sleep(0.02)
+    controller.release(start)
+    self.assertEqual(controller.limit, 2.0)
+
+
+class ThrottleTest(unittest.TestCase):
+
+  def setUp(self):
+    self.clock = FakeClock()
+    gdata.throttle.TokenBucket._time = self.clock.time
+    gdata.throttle.TokenBucket._sleep = self.clock.sleep
+    gdata.throttle.AimdController._time = self.clock.time
+
+  def tearDown(self):
+    gdata.throttle.TokenBucket._time = staticmethod(time.time)
+    gdata.throttle.TokenBucket._sleep = staticmethod(time.sleep)
+    gdata.throttle.AimdController._time = staticmethod(time.time)
+
+  def test_rate_limit_wait_is_not_latency(self):
+    throttle = gdata.throttle.Throttle(rate=10, burst=1,
+                                       initial_concurrency=4,
+                                       max_latency=0.05)
+    for i in xrange(20):
+      start = throttle.start()
+      self.clock.now += 0.01
+      throttle.finish(start, status=200)
+    # Each request waited longer than max_latency for the bucket.
+    self.assert_(min(self.clock.sleeps) > throttle.concurrency.max_latency)
+    self.assert_(throttle.concurrency.limit >= 4)
+
+  def test_slot_freed_if_rate_limit_wait_fails(self):
+    throttle = gdata.throttle.Throttle(rate=10, burst=1)
+    def interrupted(seconds):
+      raise KeyboardInterrupt()
+    gdata.throttle.TokenBucket._sleep = staticmethod(interrupted)
+    throttle.finish(throttle.start())
+    self.assertRaises(KeyboardInterrupt, throttle.start)
+    self.assertEqual(throttle.concurrency.in_flight, 0)
+
+
+class ThrottlingServer(local_server.LocalServer):
+  """Serves capacity requests at a time and rejects the rest with 503."""
+
+  capacity = 4
+  service_time = 0.01
+
+  def __init__(self):
+    local_server.LocalServer.__init__(self)
+    self.in_flight = 0
+    self.rejected = 0
+    self.served = 0
+    self.in_flight_lock = threading.Lock()
+
+  def respond(self, method, path, headers, body):
+    self.in_flight_lock.acquire()
+    self.in_flight += 1
+    overloaded = self.in_flight > self.capacity
+    if overloaded:
+      self.rejected += 1
+      self.in_flight -= 1
+    self.in_flight_lock.release()
+    if overloaded:
+      return 503, {}, 'Quota exceeded'
+    time.sleep(self.service_time)
+    self.in_flight_lock.acquire()
+    self.in_flight -= 1
+    self.served += 1
+    self.in_flight_lock.release()
+    return 200, {}, 'OK'
+
+
+class ThrottleSimulationTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = ThrottlingServer().start()
+
+  def tearDown(self):
+    self.server.stop()
+
+  def run_clients(self, throttler, count=300, workers=16):
+    client = gdata.client.GDClient()
+    client.http_client = atom.http_core.HttpClient()
+    client.throttler = throttler
+    uris = [self.server.url('/item/%i' % i) for i in xrange(count)]
+    return list(client.request_many(uris, max_workers=workers,
+                                    ordered=False))
+
+  def test_settles_near_capacity(self):
+    self.run_clients(None)
+    unthrottled_rejected = self.server.rejected
+    self.server.rejected = 0
+    throttler = gdata.throttle.Throttler(default={'initial_concurrency': 1})
+    results = self.run_clients(throttler)
+    self.assertEqual(len(results), 300)
+    # Without a throttler most requests are rejected, with it few are.
+    self.assert_(unthrottled_rejected > 100)
+    self.assert_(self.server.rejected < 60)
+    controller = throttler.get('127.0.0.1').concurrency
+    self.assert_(1 <= controller.limit <= 2 * self.server.capacity + 1)
+    self.assertEqual(controller.in_flight, 0)
+
+  def test_v1_service(self):
+    service = gdata.service.GDataService(http_client=atom.http.HttpClient())
+    service.throttler = gdata.throttle.Throttler(
+        default={'initial_concurrency': 4})
+    self.server.capacity = 0
+    self.assertRaises(gdata.service.RequestError, service.Get,
+                      self.server.url('/v1'))
+    controller = service.throttler.get('127.0.0.1').concurrency
+    self.assertEqual(controller.limit, 2.0)
+    self.assertEqual(controller.in_flight, 0)
+
+
+def suite():
+  return unittest.TestSuite((unittest.makeSuite(TokenBucketTest, 'test'),
+                             unittest.makeSuite(AimdControllerTest, 'test'),
+                             unittest.makeSuite(ThrottleTest, 'test'),
+                             unittest.makeSuite(ThrottleSimulationTest, 'test')))
+
+
+if __name__ == '__main__':
+  unittest.main()
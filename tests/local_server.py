@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""A local HTTP server which stands in for Google Data API servers.
+
+Used by tests and benchmarks which need real sockets, for example to
+exercise connection reuse or concurrency, without contacting Google.
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import BaseHTTPServer
+import os
+import select
+import socket
+import SocketServer
+import ssl
+import sys
+import threading
+
+
+# A self-signed certificate and key for 127.0.0.1, used when serving HTTPS.
+TEST_CERT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'files', 'local_server_cert.pem')
+
+
+# How often, in seconds, a server checks whether stop has been called.
+POLL_INTERVAL = 0.01
+
+
+class _ThreadedHttpServer(SocketServer.ThreadingMixIn,
+                          BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+  request_queue_size = 128
+
+  def handle_error(self, request, client_address):
+    # Clients which drop their connection are expected in tests.
+    if not isinstance(sys.exc_info()[1], socket.error):
+      BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  # Buffer each response so that it is sent in as few packets as possible.
+  wbufsize = -1
+
+  def _respond(self):
+    length = int(self.headers.getheader('Content-Length') or 0)
+    body = ''
+    if length:
+      body = self.rfile.read(length)
+    self.server.stand_in._record(self)
+    status, headers, response_body = self.server.stand_in.respond(
+        self.command, self.path, self.headers, body)
+    self.send_response(status)
+    headers = dict(headers or {})
+    headers['Content-Length'] = str(len(response_body))
+    for name, value in headers.iteritems():
+      self.send_header(name, value)
+    self.end_headers()
+    if self.command != 'HEAD':
+      self.wfile.write(response_body)
+
+  do_GET = _respond
+  do_POST = _respond
+  do_PUT = _respond
+  do_DELETE = _respond
+  do_HEAD = _respond
+
+  def log_message(self, format, *args):
+    pass
+
+
+class LocalServer(object):
+  """Runs an HTTP/1.1 server on localhost in a background thread.
+
+  Responses are produced by the respond function which is called with the
+  method, path, headers and body of each request and returns a tuple of
+  (status, headers dict, body string). Subclasses may override respond.
+  If use_ssl is True the server speaks HTTPS using TEST_CERT_FILE.
+  """
+
+  def __init__(self, respond=None, port=0, use_ssl=False):
+    if respond is not None:
+      self.respond = respond
+    self.lock = threading.Lock()
+    self.request_count = 0
+    self.connections = set()
+    self._server = _ThreadedHttpServer(('127.0.0.1', port), _Handler)
+    self._server.stand_in = self
+    self.host, self.port = self._server.server_address
+    self.scheme = 'http'
+    if use_ssl:
+      self.scheme = 'https'
+      self._server.socket = ssl.wrap_socket(
+          self._server.socket, certfile=TEST_CERT_FILE, server_side=True)
+    self._thread = None
+
+  def respond(self, method, path, headers, body):
+    return 200, {'Content-Type': 'text/plain'}, 'OK'
+
+  def _record(self, handler):
+    self.lock.acquire()
+    try:
+      self.request_count += 1
+      self.connections.add(handler.client_address)
+    finally:
+      self.lock.release()
+
+  def url(self, path='/'):
+    return '%s://%s:%s%s' % (self.scheme, self.host, self.port, path)
+
+  def start(self):
+    self._thread = threading.Thread(target=self._server.serve_forever,
+                                    args=(POLL_INTERVAL,))
+    self._thread.setDaemon(True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._server.shutdown()
+    self._server.server_close()
+    self._thread.join()
+
+
+class _TunnelHandler(SocketServer.StreamRequestHandler):
+
+  def handle(self):
+    request_line = self.rfile.readline()
+    headers = {}
+    while True:
+      line = self.rfile.readline()
+      if line in ('\r\n', '\n', ''):
+        break
+      name, value = line.split(':', 1)
+      headers[name.strip().lower()] = value.strip()
+    method, target = request_line.split()[:2]
+    proxy = self.server.stand_in
+    proxy._record(target, headers)
+    if method != 'CONNECT' or (proxy.required_auth and
+        headers.get('proxy-authorization') != proxy.required_auth):
+      self.wfile.write('HTTP/1.0 407 Proxy Authentication Required\r\n\r\n')
+      return
+    host, port = target.rsplit(':', 1)
+    upstream = socket.create_connection((host, int(port)))
+    self.wfile.write('HTTP/1.0 200 Connection established\r\n\r\n')
+    self.wfile.flush()
+    sockets = [self.connection, upstream]
+    try:
+      while True:
+        readable = select.select(sockets, [], [], 5)[0]
+        if not readable:
+          continue
+        for sock in readable:
+          data = sock.recv(65536)
+          if not data:
+            return
+          if sock is upstream:
+            self.connection.sendall(data)
+          else:
+            upstream.sendall(data)
+    finally:
+      upstream.close()
+
+
+class _ThreadedTcpServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+  daemon_threads = True
+  allow_reuse_address = True
+
+
+class TunnelProxy(object):
+  """A proxy on localhost which only supports CONNECT tunnels.
+
+  Records the number of tunnels opened in connect_count and the headers of
+  each CONNECT request in connect_headers. If required_auth is set, tunnels
+  are refused unless the Proxy-Authorization header has this value.
+  """
+
+  def __init__(self, required_auth=None):
+    self.required_auth = required_auth
+    self.lock = threading.Lock()
+    self.connect_count = 0
+    self.connect_headers = []
+    self._server = _ThreadedTcpServer(('127.0.0.1', 0), _TunnelHandler)
+    self._server.stand_in = self
+    self.host, self.port = self._server.server_address
+    self._thread = None
+
+  def _record(self, target, headers):
+    self.lock.acquire()
+    try:
+      self.connect_count += 1
+      self.connect_headers.append(headers)
+    finally:
+      self.lock.release()
+
+  def url(self):
+    return 'http://%s:%s' % (self.host, self.port)
+
+  def start(self):
+    self._thread = threading.Thread(target=self._server.serve_forever,
+                                    args=(POLL_INTERVAL,))
+    self._thread.setDaemon(True)
+    self._thread.start()
+    return self
+
+  def stop(self):
+    self._server.shutdown()
+    self._server.server_close()
+    self._thread.join()
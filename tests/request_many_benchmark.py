@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Measures GDClient.get_feeds throughput against a local stand-in server.
+
+The server waits before each response to simulate network and server
+latency, so throughput should grow with the number of workers until the
+latency is hidden. Run from the tests directory:
+
+  PYTHONPATH=../src python request_many_benchmark.py [requests] [latency_ms]
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import sys
+import time
+import atom.data
+import atom.http_core
+import gdata.client
+import gdata.data
+import local_server
+
+
+class SlowServer(local_server.LocalServer):
+
+  latency = 0.02
+
+  def respond(self, method, path, headers, body):
+    time.sleep(self.latency)
+    feed = gdata.data.GDFeed(id=atom.data.Id(path))
+    for i in xrange(10):
+      feed.entry.append(gdata.data.GDEntry(id=atom.data.Id('%s/%i' % (path, i))))
+    return 200, {'Content-Type': 'application/atom+xml'}, feed.to_string()
+
+
+def new_client():
+  client = gdata.client.GDClient()
+  client.http_client = atom.http_core.HttpClient()
+  return client
+
+
+def time_serial(uris):
+  client = new_client()
+  start = time.time()
+  for uri in uris:
+    client.get_feed(uri)
+  return time.time() - start
+
+
+def time_concurrent(uris, max_workers):
+  client = new_client()
+  start = time.time()
+  for result in client.get_feeds(uris, max_workers=max_workers):
+    result.get()
+  return time.time() - start
+
+
+def main():
+  count = 200
+  if len(sys.argv) > 1:
+    count = int(sys.argv[1])
+  server = SlowServer()
+  if len(sys.argv) > 2:
+    server.latency = float(sys.argv[2]) / 1000
+  server.start()
+  try:
+    uris = [server.url('/feeds/%i' % i) for i in xrange(count)]
+    print '%i requests, %ims simulated latency' % (count,
+                                                   server.latency * 1000)
+    elapsed = time_serial(uris)
+    print '%-16s %8.2fs %8.1f req/s' % ('get_feed loop', elapsed,
+                                         count / elapsed)
+    for workers in (1, 2, 4, 8, 16, 32):
+      elapsed = time_concurrent(uris, workers)
+      print '%-16s %8.2fs %8.1f req/s' % ('%i workers' % workers, elapsed,
+                                           count / elapsed)
+  finally:
+    server.stop()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Measures how many RSA-signed requests per second the token classes sign.
+
+Compares parsing the private key for every signature, as the token classes
+did before gdata.gauth.rsa_key_cache, with signing through the cache, for a
+2-legged OAuth RSA token and a secure AuthSub token. Then measures signing
+with each modular exponentiation backend of cryptomath.powMod, which the
+pure-Python keys use. Run from the tests directory:
+
+  PYTHONPATH=../src python rsa_signing_benchmark.py [seconds]
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import sys
+import time
+import atom.http_core
+import gdata.gauth
+from gdata.tlslite.utils import cryptomath
+from gdata.tlslite.utils import keyfactory
+from gdata_tests.gauth_test import PRIVATE_TEST_KEY
+
+
+def sign_without_cache(rsa_key, data):
+  return keyfactory.parsePrivateKey(rsa_key).hashAndSign(data)
+
+
+def oauth_token():
+  return gdata.gauth.TwoLeggedOAuthRsaToken(
+      'example.com', PRIVATE_TEST_KEY, 'admin@example.com')
+
+
+def auth_sub_token():
+  return gdata.gauth.SecureAuthSubToken('token', PRIVATE_TEST_KEY)
+
+
+def measure(make_token, seconds):
+  token = make_token()
+  count = 0
+  start = time.time()
+  while time.time() - start < seconds:
+    request = atom.http_core.HttpRequest(
+        'https://apps-apis.google.com/a/feeds/example.com/user/2.0/%i' % count,
+        'GET')
+    token.modify_request(request)
+    count += 1
+  return count / (time.time() - start)
+
+
+def main():
+  seconds = 2.0
+  if len(sys.argv) > 1:
+    seconds = float(sys.argv[1])
+  print '%-26s %14s %14s %8s' % ('', 'parse each', 'cached', 'speedup')
+  for name, make_token in (('TwoLeggedOAuthRsaToken', oauth_token),
+                           ('SecureAuthSubToken', auth_sub_token)):
+    cache = gdata.gauth.rsa_key_cache
+    try:
+      cache.sign = sign_without_cache
+      uncached = measure(make_token, seconds)
+    finally:
+      del cache.sign
+    cached = measure(make_token, seconds)
+    print '%-26s %12.1f/s %12.1f/s %7.1fx' % (name, uncached, cached,
+                                              cached / uncached)
+  print
+  print 'powMod backends (%s was chosen at import)' % cryptomath.powModName
+  chosen = cryptomath.powModName
+  try:
+    for name, function in cryptomath.powModBackends:
+      cryptomath.setPowMod(name)
+      print '%-26s %12.1f/s' % (name, measure(oauth_token, seconds))
+  finally:
+    cryptomath.setPowMod(chosen)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+#    Copyright (C) 2010 Google Inc.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+
+"""Compares the ways GDataService turns response bodies into objects.
+
+Before gdata.RootRegistry, a response was parsed as a feed and, if it was
+not one, parsed again as an entry, so each entry was parsed twice. Run from
+the tests directory:
+
+  PYTHONPATH=../src python v1_parse_benchmark.py [documents]
+"""
+
+
+__author__ = 'j.s@google.com (Jeff Scudder)'
+
+
+import sys
+import time
+import gdata
+import gdata.contacts
+from gdata import test_data
+
+
+def parse_twice(xml_string):
+  feed = gdata.GDataFeedFromString(xml_string)
+  if not feed:
+    return gdata.GDataEntryFromString(xml_string)
+  return feed
+
+
+def time_parse(parse, documents):
+  start = time.time()
+  for document in documents:
+    parse(document)
+  return time.time() - start
+
+
+def main():
+  count = 2000
+  if len(sys.argv) > 1:
+    count = int(sys.argv[1])
+  workloads = [
+      ('entries', [test_data.XML_ENTRY_1, test_data.NEW_CONTACT] * (count / 2)),
+      ('feeds', [test_data.GBASE_FEED] * (count / 10))]
+  parsers = [
+      ('feed then entry', parse_twice),
+      ('GDataFromString', gdata.GDataFromString),
+      ('contacts registry', gdata.contacts.ROOT_REGISTRY.Parse)]
+  for name, documents in workloads:
+    print '%i %s' % (len(documents), name)
+    for parser_name, parse in parsers:
+      elapsed = time_parse(parse, documents)
+      print '  %-18s %8.2fs %8.1f docs/s' % (parser_name, elapsed,
+                                              len(documents) / elapsed)
+
+
+if __name__ == '__main__':
+  main()